@@ -0,0 +1,74 @@
+"""Benchmark dell'estrazione .docx: lettura a flusso dell'XML contro python-docx.
+
+Uso:
+    python benchmarks/bench_docx_extractors.py [documento.docx]
+
+Senza argomenti genera un documento sintetico di circa 1000 pagine con paragrafi e tabelle.
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import docx
+from main import DocxStreamExtractor
+
+
+def build_sample(path, pages=1000):
+    """Crea un .docx con circa 6 paragrafi e una piccola tabella per pagina"""
+    document = docx.Document()
+    document.sections[0].header.paragraphs[0].text = "Intestazione del documento di prova"
+    document.sections[0].footer.paragraphs[0].text = "Piè di pagina del documento di prova"
+    sentence = "Questo è un paragrafo di prova con qualche parola accentata: perché, città, più. "
+    for page in range(pages):
+        for _ in range(6):
+            document.add_paragraph(sentence * 4)
+        table = document.add_table(rows=3, cols=3)
+        for row_index, row in enumerate(table.rows):
+            for col_index, cell in enumerate(row.cells):
+                cell.text = f"Cella {page}.{row_index}.{col_index}"
+        document.add_page_break()
+    document.save(path)
+
+
+def python_docx_text(path):
+    """Percorso precedente: albero python-docx, solo i paragrafi del corpo"""
+    doc = docx.Document(path)
+    return '\n'.join(paragraph.text for paragraph in doc.paragraphs if paragraph.text)
+
+
+def measure(label, function, path, repeat=3):
+    """Miglior tempo su più esecuzioni; il picco di memoria Python è misurato a parte"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = function(path)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    elapsed = min(timings)
+    print(f"{label:<14}{elapsed:>9.2f} s{peak / 1024 / 1024:>10.1f} MB{len(text):>12} caratteri")
+    return elapsed
+
+
+def main(path=None):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if path is None:
+            path = os.path.join(tmp_dir, "campione.docx")
+            print("Generazione del documento di prova...")
+            build_sample(path)
+
+        print(f"{'estrattore':<14}{'tempo':>11}{'memoria':>13}{'testo':>22}")
+        legacy = measure("python-docx", python_docx_text, path)
+        streaming = measure("a flusso", DocxStreamExtractor.extract_text, path)
+        print(f"Accelerazione: {legacy / streaming:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -0,0 +1,164 @@
+"""Benchmark dei preset OCR: pagine al secondo e accuratezza sui caratteri.
+
+Uso:
+    python benchmarks/bench_ocr_presets.py [cartella_scansioni/] [--solo-preparazione]
+
+Per ogni file .pdf della cartella deve esistere un file .txt con lo stesso nome
+contenente la trascrizione di riferimento del documento. Senza cartella genera
+scansioni sintetiche (pagine di testo rasterizzate, ruotate e con rumore) con la loro
+trascrizione. Con --solo-preparazione misura solo rasterizzazione e preparazione
+delle pagine, le fasi che cambiano con il preset, senza caricare il modello OCR.
+"""
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from pdf2image import convert_from_path, pdfinfo_from_path
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from main import OCRPreprocessor, TextProcessor
+
+
+def build_sample(scan_dir, name="scansione", pages=4, dpi=300, seed=1):
+    """Scrive un PDF di sole immagini simile a una scansione e la sua trascrizione.
+
+    Il testo usa il font incluso in Pillow e parole senza accenti, così il campione
+    è identico su ogni macchina; ogni pagina è ruotata di un piccolo angolo casuale,
+    sfocata e con rumore, come un foglio passato allo scanner.
+    """
+    rnd = random.Random(seed)
+    words = ("il la di che e un per con non una sono del testo documento pagina analisi "
+             "risultati della ricerca tabella capitolo secondo anno valore numero 2024 15").split()
+    font = ImageFont.load_default(size=dpi * 10 // 72)
+    line_height = dpi * 16 // 72
+    margin = dpi
+
+    images = []
+    reference = []
+    for _ in range(pages):
+        page = Image.new('L', (dpi * 827 // 100, dpi * 1169 // 100), 255)
+        draw = ImageDraw.Draw(page)
+        lines = []
+        for row in range((page.height - 2 * margin) // line_height):
+            line = " ".join(rnd.choice(words) for _ in range(9)).capitalize() + "."
+            draw.text((margin, margin + row * line_height), line, font=font, fill=0)
+            lines.append(line)
+        reference.append("\n".join(lines))
+
+        page = page.rotate(rnd.uniform(-1.5, 1.5), resample=Image.Resampling.BILINEAR, fillcolor=255)
+        page = page.filter(ImageFilter.GaussianBlur(dpi / 300))
+        noise = np.random.default_rng(rnd.randrange(1 << 30)).normal(0, 18, (page.height, page.width))
+        images.append(Image.fromarray(np.clip(np.asarray(page, dtype=np.float64) + noise, 0, 255).astype(np.uint8)))
+
+    images[0].save(os.path.join(scan_dir, f"{name}.pdf"), "PDF", resolution=dpi,
+                   save_all=True, append_images=images[1:])
+    with open(os.path.join(scan_dir, f"{name}.txt"), 'w', encoding='utf-8') as f:
+        f.write("\n".join(reference))
+
+
+def normalize(text):
+    """Riduce gli spazi per confrontare il testo indipendentemente dall'impaginazione"""
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def edit_distance(a, b):
+    """Distanza di Levenshtein tra due stringhe (programmazione dinamica su due righe)"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def character_accuracy(reference, hypothesis):
+    reference, hypothesis = normalize(reference), normalize(hypothesis)
+    if not reference:
+        return 1.0 if not hypothesis else 0.0
+    return max(0.0, 1.0 - edit_distance(reference, hypothesis) / len(reference))
+
+
+def measure_preparation(pdf_path, preset):
+    """Risoluzione scelta e secondi per rasterizzare e preparare tutte le pagine"""
+    total_pages = pdfinfo_from_path(pdf_path)["Pages"]
+    start = time.perf_counter()
+    dpi = OCRPreprocessor.estimate_dpi(pdf_path, total_pages, preset)
+    for page_number in range(1, total_pages + 1):
+        img = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number, grayscale=True)[0]
+        OCRPreprocessor.preprocess(img, preset)
+    return dpi, total_pages, time.perf_counter() - start
+
+
+def load_samples(scan_dir):
+    samples = []
+    for name in sorted(os.listdir(scan_dir)):
+        if name.lower().endswith('.pdf'):
+            reference_path = os.path.join(scan_dir, os.path.splitext(name)[0] + '.txt')
+            if os.path.exists(reference_path):
+                with open(reference_path, encoding='utf-8') as f:
+                    samples.append((os.path.join(scan_dir, name), f.read()))
+    return samples
+
+
+def run(samples, preparation_only):
+    reader = None
+    if not preparation_only:
+        import easyocr
+        # Un solo lettore per tutti i preset, così si misura solo il costo della pipeline
+        reader = easyocr.Reader(['it', 'en'], gpu=False)
+
+    print(f"{'preset':<12}{'dpi':>6}{'pagine':>8}{'prep. s/pag':>13}" +
+          ("" if preparation_only else f"{'pagine/s':>10}{'accuratezza':>13}"))
+    for name, preset in OCRPreprocessor.PRESETS.items():
+        dpis = []
+        pages = 0
+        preparation = 0.0
+        for pdf_path, _ in samples:
+            dpi, page_count, elapsed = measure_preparation(pdf_path, preset)
+            dpis.append(dpi)
+            pages += page_count
+            preparation += elapsed
+        row = f"{name:<12}{'/'.join(map(str, sorted(set(dpis)))):>6}{pages:>8}{preparation / pages:>13.2f}"
+        if preparation_only:
+            print(row)
+            continue
+
+        accuracies = []
+        start = time.perf_counter()
+        for pdf_path, reference in samples:
+            page_texts = list(TextProcessor.ocr_pages(pdf_path, name, reader=reader))
+            accuracies.append(character_accuracy(reference, '\n'.join(page_texts)))
+        elapsed = time.perf_counter() - start
+        print(f"{row}{pages / elapsed:>10.2f}{sum(accuracies) / len(accuracies):>12.1%}")
+
+
+def main(scan_dir=None, preparation_only=False):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if scan_dir is None:
+            print("Generazione delle scansioni sintetiche...")
+            scan_dir = tmp_dir
+            build_sample(scan_dir)
+
+        samples = load_samples(scan_dir)
+        if not samples:
+            print("Nessun PDF con trascrizione di riferimento trovato.")
+            return 1
+        run(samples, preparation_only)
+    return 0
+
+
+if __name__ == "__main__":
+    arguments = [argument for argument in sys.argv[1:] if argument != "--solo-preparazione"]
+    if len(arguments) > 1:
+        print(__doc__)
+        sys.exit(2)
+    sys.exit(main(arguments[0] if arguments else None, "--solo-preparazione" in sys.argv[1:]))
@@ -0,0 +1,93 @@
+"""Benchmark dell'estrazione pdfminer divisa per intervalli di pagine, al variare dei processi.
+
+Uso:
+    python benchmarks/bench_pdfminer_parallel.py [documento.pdf] [--layout]
+
+Senza documento genera un PDF digitale sintetico di 600 pagine. Con --layout usa l'analisi
+del layout di pdfminer (il percorso dei documenti a più colonne), più lenta.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PyPDF2
+from main import PDFRangeExtractor
+
+
+def build_sample(path, pages=600, lines=50):
+    """Scrive un PDF minimale con un font standard e circa 50 righe di testo per pagina"""
+    rnd = random.Random(1)
+    words = "il la di che e un per con non una sono del testo documento pagina analisi perché città più".split()
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    # Ogni pagina aggiunge due oggetti (contenuto e pagina): l'albero delle pagine viene subito dopo
+    pages_id = len(objects) + 2 * pages + 1
+    page_ids = []
+    for page in range(pages):
+        operators = ["BT /F1 10 Tf 12 TL 1 0 0 1 50 780 Tm"]
+        for _ in range(lines):
+            line = " ".join(rnd.choice(words) for _ in range(12)).capitalize() + "."
+            operators.append(f"({line}) Tj T*")
+        operators.append(f"1 0 0 1 280 30 Tm (Pagina {page + 1}) Tj ET")
+        data = "\n".join(operators).encode("cp1252")
+        content = add(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+        page_ids.append(add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] /Contents %d 0 R "
+                            b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, content, font)))
+    add(b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % i for i in page_ids) + b"] /Count %d >>" % pages)
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    with open(path, "wb") as f:
+        f.write(output)
+
+
+def measure(workers, path, total_pages, use_layout):
+    """Tempo di un'estrazione completa, avvio dei processi compreso"""
+    start = time.perf_counter()
+    text = PDFRangeExtractor.extract_text(path, use_layout=use_layout, total_pages=total_pages, workers=workers)
+    return time.perf_counter() - start, text
+
+
+def main(path=None, use_layout=False):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if path is None:
+            path = os.path.join(tmp_dir, "campione.pdf")
+            print("Generazione del documento di prova...")
+            build_sample(path)
+        total_pages = len(PyPDF2.PdfReader(path).pages)
+
+        cores = os.cpu_count() or 1
+        counts = sorted({1, *[n for n in (2, 4, 8, 16, 32) if n <= cores], cores})
+        print(f"{total_pages} pagine, {cores} core, layout: {'sì' if use_layout else 'no'}")
+        print(f"{'processi':<10}{'tempo':>9}{'pagine/s':>11}{'accelerazione':>15}")
+        serial_time, serial_text = measure(1, path, total_pages, use_layout)
+        for workers in counts:
+            elapsed, text = (serial_time, serial_text) if workers == 1 else measure(workers, path, total_pages, use_layout)
+            if text != serial_text:
+                print(f"Testo diverso dall'estrazione seriale con {workers} processi")
+                return 1
+            print(f"{workers:<10}{elapsed:>7.2f} s{total_pages / elapsed:>11.1f}{serial_time / elapsed:>14.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    arguments = [argument for argument in sys.argv[1:] if argument != "--layout"]
+    sys.exit(main(arguments[0] if arguments else None, "--layout" in sys.argv[1:]))
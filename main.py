@@ -1,33 +1,53 @@
 import sys
 import os
 import re
+import string
 import logging
 import json
+import math
+import bisect
+import difflib
+import hashlib
+import zlib
+import mmap
+import zipfile
+from array import array
+import io
+import shutil
+from xml.sax.saxutils import escape as xml_escape
+from xml.parsers import expat
 import chardet
 import codecs
 import unicodedata
-from functools import partial
+from functools import partial, wraps
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                            QPushButton, QTextEdit, QLabel, QFileDialog, QProgressBar,
                            QSplitter, QMessageBox, QFrame, QStackedWidget, QGraphicsDropShadowEffect,
                            QButtonGroup, QLineEdit, QCheckBox, QTabWidget, QDialog, QFormLayout,
-                           QGroupBox, QScrollArea)
-from PyQt6.QtCore import Qt, QMimeData, pyqtSignal, QThread, QObject, QPropertyAnimation, QEasingCurve, QSize
-from PyQt6.QtGui import QDragEnterEvent, QDropEvent, QAction, QColor, QIcon, QFont, QPalette, QLinearGradient, QPixmap
+                           QGroupBox, QScrollArea, QComboBox, QSpinBox, QDoubleSpinBox)
+from PyQt6.QtCore import Qt, QMimeData, pyqtSignal, QThread, QObject, QPropertyAnimation, QEasingCurve, QSize, QTimer, QPoint
+from PyQt6.QtGui import QDragEnterEvent, QDropEvent, QAction, QActionGroup, QColor, QIcon, QFont, QPalette, QLinearGradient, QPixmap, QTextCursor
 
 # Librerie per l'estrazione del testo
 import docx  # Per file .docx
 import PyPDF2  # Per file .pdf 
-from pdfminer.high_level import extract_text as pdfminer_extract_text
-from pdfminer.layout import LAParams
-from openai import OpenAI  # Per API OpenAI
+from openai import OpenAI, APIConnectionError, RateLimitError, InternalServerError  # Per API OpenAI
 
 # Nuove librerie per OCR
 import easyocr
-from pdf2image import convert_from_path
-import numpy as np
+from pdf2image import pdfinfo_from_path
 import tempfile
 import time
+import threading
+import subprocess
+import multiprocessing.connection
+from collections import deque, OrderedDict
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+# Estrazione e OCR condivisi con i processi di lavoro, che non importano questo modulo
+from ocr_pipeline import OCRPreprocessor, DiskCache, OCRPageCache, PageOCR
+from workers import extract_range
 
 # Dizionario dei prompt predefiniti
 default_prompts = {
@@ -42,17 +62,86 @@ default_prompts = {
     "personalizzato": "L'utente può scrivere qui la sua richiesta di elaborazione"
 }
 
+# Instradamento per modalità: modello, token massimi della risposta e temperatura.
+# Le modalità meccaniche usano temperature basse e risposte brevi, quelle creative più margine.
+default_routing = {
+    "rifacimento": {"modello": "gpt-4o-mini", "max_token": 1024, "temperatura": 0.8},
+    "correzione": {"modello": "gpt-4o-mini", "max_token": 512, "temperatura": 0.0},
+    "miglioramento": {"modello": "gpt-4o-mini", "max_token": 1024, "temperatura": 0.5},
+    "umanizzazione": {"modello": "gpt-4o-mini", "max_token": 1024, "temperatura": 0.9},
+    "riassunto": {"modello": "gpt-4o-mini", "max_token": 1024, "temperatura": 0.3},
+    "ampliamento": {"modello": "gpt-4o-mini", "max_token": 2048, "temperatura": 0.8},
+    "semplificazione": {"modello": "gpt-4o-mini", "max_token": 768, "temperatura": 0.3},
+    "formalizzazione": {"modello": "gpt-4o-mini", "max_token": 768, "temperatura": 0.3},
+    "personalizzato": {"modello": "gpt-4o-mini", "max_token": 2048, "temperatura": 0.7},
+}
+
+# Modelli proposti nelle impostazioni di instradamento
+available_models = ["gpt-4o-mini", "gpt-4.1-mini", "gpt-4.1-nano", "gpt-4o", "gpt-4.1"]
+
+# Impostazioni predefinite dell'applicazione
+default_settings = {
+    # Rimuove intestazioni, piè di pagina e disclaimer ripetuti su ogni pagina
+    "rimozione_boilerplate": True,
+    # Ripulisce il testo dei PDF: parole divise dal trattino, righe spezzate nelle frasi, righe di rumore
+    "pulizia_testo": True,
+    # Riassunto map-reduce: lunghezza obiettivo, fan-out dell'albero e chiamate parallele
+    "riassunto_parole_max": 400,
+    "riassunto_fan_out": 4,
+    "riassunto_thread": 8,
+    # Preset OCR: "veloce", "bilanciato" o "qualita" (vedi OCRPreprocessor.PRESETS)
+    "ocr_preset": "bilanciato",
+    # Cache su disco del testo OCR per pagina, con limiti di dimensione ed età
+    "cache_ocr": True,
+    "cache_ocr_mb": 200,
+    "cache_ocr_giorni": 90,
+    # Cache del testo estratto dai documenti già aperti
+    "cache_estrazione": True,
+    "cache_estrazione_mb": 500,
+    "cache_estrazione_giorni": 90,
+    # OCR in processi separati dalla GUI: numero di processi e pagine prima di sostituire un processo
+    "ocr_processo_separato": True,
+    "ocr_processi": 1,
+    "ocr_pagine_per_processo": 200,
+    # Processi per l'estrazione pdfminer dei PDF digitali lunghi (0 = uno per core, 1 = solo seriale)
+    "pdf_processi": 0,
+    # I file .txt oltre questa dimensione vengono letti a flusso dal disco
+    "soglia_file_grandi_mb": 50,
+    # Richieste contemporanee massime per modello, condivise dalle modalità che lo usano
+    "pool_modelli": {"gpt-4o-mini": 8, "gpt-4.1-mini": 8, "gpt-4.1-nano": 8, "gpt-4o": 4, "gpt-4.1": 4},
+    # Elaborazione batch: sostituto locale dell'endpoint (per le prove) e intervallo di controllo in secondi
+    "batch_locale": False,
+    "batch_intervallo_s": 60,
+    # Istruzioni comuni a tutte le modalità (stile, glossario...), inviate come prefisso stabile delle richieste
+    "istruzioni_comuni": "",
+    # Scadenza di ogni richiesta API e duplicazione delle richieste più lente del 95° percentile,
+    # con un limite alle richieste aggiuntive in percentuale su quelle inviate
+    "timeout_richiesta_s": 120,
+    "richieste_ridondanti": True,
+    "ridondanza_max_percento": 5,
+}
+
+# Cartella dei dati locali dell'applicazione (cache)
+app_data_dir = os.path.join(os.path.expanduser("~"), ".textlab_pro")
+
+# Prompt usato per unire i riassunti parziali nella fase di reduce
+merge_summary_prompt = ("Unisci i seguenti riassunti parziali, separati da righe vuote, in un unico "
+                        "riassunto coerente. Elimina le ripetizioni, mantieni i punti chiave e l'ordine "
+                        "in cui compaiono. Non superare {max_words} parole.")
+
 # Configurazione logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class PromptSettingsDialog(QDialog):
     """Dialog per la modifica dei prompt"""
-    def __init__(self, prompts, parent=None):
+    def __init__(self, prompts, parent=None, shared_instructions="", routing=None, pools=None):
         super().__init__(parent)
         self.setWindowTitle("Impostazioni Prompt")
         self.setMinimumWidth(600)
         self.prompts = prompts.copy()  # Copia del dizionario dei prompt
+        self.routing = routing if routing is not None else default_routing
+        self.pools = pools if pools is not None else default_settings["pool_modelli"]
         
         # Layout principale
         main_layout = QVBoxLayout(self)
@@ -63,8 +152,16 @@ class PromptSettingsDialog(QDialog):
         scroll_content = QWidget()
         form_layout = QFormLayout(scroll_content)
         
-        # Creazione di campi di testo per ogni prompt
+        # Istruzioni comuni: precedono il prompt di ogni modalità, quindi il fornitore può tenerle in cache
+        self.shared_instructions_field = QTextEdit()
+        self.shared_instructions_field.setPlainText(shared_instructions)
+        self.shared_instructions_field.setPlaceholderText("Istruzioni valide per tutte le modalità (stile, glossario...)")
+        self.shared_instructions_field.setMinimumHeight(120)
+        form_layout.addRow(QLabel("Istruzioni comuni"), self.shared_instructions_field)
+        
+        # Creazione di campi di testo per ogni prompt, con modello e parametri di generazione
         self.prompt_fields = {}
+        self.routing_fields = {}
         for key, value in self.prompts.items():
             if key != "personalizzato":
                 label = QLabel(key.capitalize())
@@ -73,6 +170,20 @@ class PromptSettingsDialog(QDialog):
                 text_edit.setMinimumHeight(80)
                 form_layout.addRow(label, text_edit)
                 self.prompt_fields[key] = text_edit
+            routing_label = "" if key != "personalizzato" else key.capitalize()
+            form_layout.addRow(routing_label, self.create_routing_row(key))
+        
+        # Richieste contemporanee per modello
+        self.pool_fields = {}
+        pools_group = QGroupBox("Richieste contemporanee per modello")
+        pools_layout = QFormLayout(pools_group)
+        for model in dict.fromkeys(available_models + list(self.pools)):
+            spin_box = QSpinBox()
+            spin_box.setRange(1, 64)
+            spin_box.setValue(int(self.pools.get(model, ModelRouter.DEFAULT_POOL_SIZE)))
+            pools_layout.addRow(model, spin_box)
+            self.pool_fields[model] = spin_box
+        form_layout.addRow(pools_group)
         
         scroll_area.setWidget(scroll_content)
         main_layout.addWidget(scroll_area)
@@ -91,217 +202,2449 @@ class PromptSettingsDialog(QDialog):
         
         main_layout.addLayout(buttons_layout)
     
+    def create_routing_row(self, option):
+        """Riga con modello, token massimi della risposta e temperatura di una modalità"""
+        route = {**ModelRouter.DEFAULT_ROUTE, **self.routing.get(option, {})}
+        row = QWidget()
+        row_layout = QHBoxLayout(row)
+        row_layout.setContentsMargins(0, 0, 0, 0)
+        
+        model_box = QComboBox()
+        model_box.setEditable(True)
+        model_box.addItems(available_models)
+        model_box.setCurrentText(route["modello"])
+        
+        max_tokens_box = QSpinBox()
+        max_tokens_box.setRange(16, 32768)
+        max_tokens_box.setSingleStep(128)
+        max_tokens_box.setValue(route["max_token"])
+        max_tokens_box.setPrefix("max token ")
+        
+        temperature_box = QDoubleSpinBox()
+        temperature_box.setRange(0.0, 2.0)
+        temperature_box.setSingleStep(0.1)
+        temperature_box.setDecimals(1)
+        temperature_box.setValue(route["temperatura"])
+        temperature_box.setPrefix("temperatura ")
+        
+        row_layout.addWidget(model_box, 1)
+        row_layout.addWidget(max_tokens_box)
+        row_layout.addWidget(temperature_box)
+        self.routing_fields[option] = (model_box, max_tokens_box, temperature_box)
+        return row
+    
     def get_updated_prompts(self):
         """Restituisce i prompt aggiornati"""
         updated_prompts = self.prompts.copy()
         for key, field in self.prompt_fields.items():
             updated_prompts[key] = field.toPlainText()
         return updated_prompts
+    
+    def get_updated_routing(self):
+        """Restituisce l'instradamento aggiornato delle modalità"""
+        return {option: {"modello": model_box.currentText().strip() or ModelRouter.DEFAULT_ROUTE["modello"],
+                         "max_token": max_tokens_box.value(),
+                         "temperatura": round(temperature_box.value(), 1)}
+                for option, (model_box, max_tokens_box, temperature_box) in self.routing_fields.items()}
+    
+    def get_updated_pools(self):
+        """Restituisce il numero di richieste contemporanee per modello"""
+        return {model: spin_box.value() for model, spin_box in self.pool_fields.items()}
+    
+    def get_shared_instructions(self):
+        """Restituisce le istruzioni comuni a tutte le modalità"""
+        return self.shared_instructions_field.toPlainText().strip()
+
+class Tracer:
+    """Tracciamento a intervalli (span) della pipeline, esportabile in formato Chrome trace / Perfetto.
+
+    Disattivato, span() restituisce sempre lo stesso contesto vuoto e traced() aggiunge solo un
+    controllo di un attributo: il costo è trascurabile. Attivato, ogni span registra inizio e durata
+    con il thread che l'ha eseguito; gli eventi si aprono in chrome://tracing o ui.perfetto.dev.
+    """
+    enabled = False
+    # Limite di eventi in memoria: oltre, i nuovi span vengono scartati
+    MAX_EVENTS = 1000000
+    _events = []
+    _threads = {}
+    _lock = threading.Lock()
+
+    class _Span:
+        __slots__ = ("name", "args", "start")
+
+        def __init__(self, name, args):
+            self.name = name
+            self.args = args
+
+        def __enter__(self):
+            self.start = time.monotonic_ns()
+            return self
+
+        def __exit__(self, *exc_info):
+            Tracer.record(self.name, self.start, time.monotonic_ns(), **self.args)
+            return False
+
+    class _NullSpan:
+        __slots__ = ()
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            return False
+
+    _NULL_SPAN = _NullSpan()
+
+    @staticmethod
+    def start():
+        """Azzera gli eventi raccolti e attiva il tracciamento"""
+        with Tracer._lock:
+            Tracer._events = []
+            Tracer._threads = {}
+        Tracer.enabled = True
+
+    @staticmethod
+    def stop():
+        Tracer.enabled = False
+
+    @staticmethod
+    def span(name, **args):
+        """Contesto che registra un intervallo; name è "categoria.operazione" """
+        if not Tracer.enabled:
+            return Tracer._NULL_SPAN
+        return Tracer._Span(name, args)
+
+    @staticmethod
+    def traced(name):
+        """Decoratore: registra uno span per ogni chiamata della funzione"""
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not Tracer.enabled:
+                    return function(*args, **kwargs)
+                with Tracer._Span(name, {}):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def record(name, start_ns, end_ns, thread=None, **args):
+        """Registra un intervallo già misurato (time.monotonic_ns).
+
+        thread è un'etichetta per il lavoro svolto fuori da questo processo (es. i processi OCR);
+        in sua assenza l'intervallo appartiene al thread corrente.
+        """
+        if not Tracer.enabled:
+            return
+        if thread is None:
+            tid = threading.get_ident()
+            thread = threading.current_thread().name
+        else:
+            tid = zlib.crc32(thread.encode('utf-8'))
+        with Tracer._lock:
+            if len(Tracer._events) >= Tracer.MAX_EVENTS:
+                return
+            Tracer._threads.setdefault(tid, thread)
+            Tracer._events.append({
+                "name": name,
+                "cat": name.split('.', 1)[0],
+                "ph": "X",
+                "ts": start_ns / 1000,
+                "dur": (end_ns - start_ns) / 1000,
+                "pid": os.getpid(),
+                "tid": tid,
+                "args": args,
+            })
+
+    @staticmethod
+    def export(path):
+        """Scrive gli eventi raccolti in JSON (formato Trace Event); restituisce il numero di eventi"""
+        with Tracer._lock:
+            events = list(Tracer._events)
+            threads = dict(Tracer._threads)
+        pid = os.getpid()
+        metadata = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": "TextLab Pro"}}]
+        metadata.extend({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                        for tid, name in threads.items())
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+        return len(events)
+
+class ProgressTracker:
+    """Avanzamento condiviso tra worker e interfaccia, per fase e per elemento, con stima del tempo residuo.
+
+    I worker aggiornano solo dei contatori protetti da lock; l'interfaccia legge uno snapshot
+    a intervalli regolari, quindi il costo lato GUI non dipende dalla frequenza degli eventi.
+    Allo stesso modo i risultati parziali (es. il testo delle pagine OCR già pronte) vengono
+    accodati dai worker e ritirati a gruppi dall'interfaccia.
+    """
+    # Fasi della pipeline
+    STAGE_EXTRACTION = "estrazione"
+    STAGE_OCR = "ocr"
+    STAGE_API = "api"
+    # Peso dell'ultima misura nella media mobile esponenziale della velocità
+    RATE_SMOOTHING = 0.3
+    # Intervallo minimo (secondi) tra due misure di velocità
+    RATE_SAMPLE_INTERVAL = 1.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._rates = {}
+        self._samples = {}
+        self._partials = {}
+
+    def reset(self, stage):
+        """Azzera una fase prima di un nuovo lavoro"""
+        with self._lock:
+            self._counters = {key: value for key, value in self._counters.items() if key[0] != stage}
+            self._rates.pop(stage, None)
+            self._samples.pop(stage, None)
+            self._partials.pop(stage, None)
+
+    def add_partial(self, stage, item, result):
+        """Accoda un risultato parziale di un elemento, nell'ordine in cui è prodotto"""
+        with self._lock:
+            self._partials.setdefault(stage, []).append((item, result))
+
+    def take_partials(self, stage):
+        """Ritira i risultati parziali accodati dall'ultima chiamata"""
+        with self._lock:
+            return self._partials.pop(stage, [])
+
+    def set_total(self, stage, item, total):
+        """Imposta il totale di unità di lavoro per un elemento (modalità, file) di una fase"""
+        with self._lock:
+            counter = self._counters.setdefault((stage, item), [0, 0])
+            counter[1] = total
+
+    def advance(self, stage, item, amount=1):
+        with self._lock:
+            counter = self._counters.setdefault((stage, item), [0, 0])
+            counter[0] += amount
+
+    def snapshot(self):
+        """Stato di ogni fase: completati, totale, dettaglio per elemento, velocità e secondi residui"""
+        now = time.monotonic()
+        with self._lock:
+            counters = {key: tuple(value) for key, value in self._counters.items()}
+
+        stages = {}
+        for (stage, item), (done, total) in counters.items():
+            info = stages.setdefault(stage, {"done": 0, "total": 0, "items": {}})
+            info["done"] += done
+            info["total"] += total
+            info["items"][item] = (done, total)
+
+        for stage, info in stages.items():
+            # Velocità come media mobile esponenziale delle misure su intervalli di almeno un secondo
+            last_time, last_done = self._samples.get(stage, (now, 0))
+            if stage not in self._samples:
+                self._samples[stage] = (now, info["done"])
+            elif now - last_time >= self.RATE_SAMPLE_INTERVAL:
+                rate = (info["done"] - last_done) / (now - last_time)
+                previous = self._rates.get(stage)
+                self._rates[stage] = rate if previous is None else (
+                    self.RATE_SMOOTHING * rate + (1 - self.RATE_SMOOTHING) * previous)
+                self._samples[stage] = (now, info["done"])
+
+            rate = self._rates.get(stage)
+            remaining = info["total"] - info["done"]
+            info["rate"] = rate
+            info["eta"] = remaining / rate if rate and remaining > 0 else None
+        return stages
+
+    @staticmethod
+    def format_eta(seconds):
+        if seconds is None:
+            return "stima in corso"
+        seconds = int(seconds)
+        if seconds >= 3600:
+            return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+        return f"{seconds // 60}:{seconds % 60:02d}"
+
+class RequestBuilder:
+    """Costruisce i messaggi delle richieste con un prefisso stabile, riutilizzabile dalla cache del fornitore.
+
+    La cache dei prompt vale per prefissi identici di almeno 1024 token: le istruzioni comuni e il
+    prompt della modalità vengono prima e non cambiano tra i blocchi, il blocco di testo va in coda.
+    """
+
+    @staticmethod
+    def system_prompt(prompt, shared_instructions=""):
+        """Testo di sistema completo, usato anche per capire se i risultati precedenti sono riutilizzabili"""
+        return f"{shared_instructions}\n\n{prompt}" if shared_instructions else prompt
+
+    @staticmethod
+    def build_messages(prompt, text_block, shared_instructions=""):
+        messages = []
+        if shared_instructions:
+            # Prima le istruzioni comuni, identiche per tutte le modalità
+            messages.append({"role": "system", "content": shared_instructions})
+        messages.append({"role": "system", "content": prompt})
+        messages.append({"role": "user", "content": text_block})
+        return messages
+
+    @staticmethod
+    def cache_key(prompt, shared_instructions=""):
+        """Chiave che indirizza le richieste con lo stesso prefisso verso la stessa cache"""
+        prefix = shared_instructions or prompt
+        return "textlab-" + hashlib.blake2b(prefix.encode('utf-8'), digest_size=8).hexdigest()
+
+class TokenUsage:
+    """Conteggio dei token di un'elaborazione, aggiornato dai thread delle richieste"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+
+    def add(self, usage):
+        """Somma l'usage di una risposta chat completions (può mancare)"""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.cached_tokens += (getattr(details, "cached_tokens", 0) or 0) if details else 0
+            self.completion_tokens += usage.completion_tokens or 0
+
+    @property
+    def cached_ratio(self):
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def summary(self):
+        uncached = self.prompt_tokens - self.cached_tokens
+        return (f"{self.requests} richieste · token prompt {self.prompt_tokens} "
+                f"(in cache {self.cached_tokens}, non in cache {uncached}, {self.cached_ratio:.0%}) · "
+                f"token risposta {self.completion_tokens}")
+
+class ModelRouter:
+    """Instradamento delle modalità: modello e parametri di generazione per modalità,
+    con un limite di richieste contemporanee per ciascun modello.
+
+    I limiti sono condivisi da tutte le modalità che usano lo stesso modello durante un'elaborazione.
+    """
+    # Parametri usati per le modalità senza una configurazione
+    DEFAULT_ROUTE = {"modello": "gpt-4o-mini", "max_token": 2048, "temperatura": 0.7}
+    DEFAULT_POOL_SIZE = 4
+
+    def __init__(self, routing=None, pools=None):
+        self.routing = routing if routing is not None else default_routing
+        self.pools = pools if pools is not None else default_settings["pool_modelli"]
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def route(self, option):
+        return {**self.DEFAULT_ROUTE, **self.routing.get(option, {})}
+
+    def pool_size(self, model):
+        return max(1, int(self.pools.get(model, self.DEFAULT_POOL_SIZE)))
+
+    def slot(self, model):
+        """Semaforo da tenere durante una richiesta al modello"""
+        with self._lock:
+            if model not in self._semaphores:
+                self._semaphores[model] = threading.BoundedSemaphore(self.pool_size(model))
+            return self._semaphores[model]
+
+class HedgedRequests:
+    """Richieste API con scadenza e duplicazione (hedging) di quelle più lente.
+
+    Se una richiesta supera il 95° percentile delle latenze osservate per il suo modello, ne viene
+    inviata una copia e si usa la prima risposta arrivata. Le copie sono limitate a una percentuale
+    delle richieste inviate e, oltre il pool del modello, a max_parallel_hedges contemporanee.
+    Una richiesta sincrona già partita non si può interrompere: quella perdente viene abbandonata,
+    il suo risultato scartato, e termina al più alla scadenza.
+    La scadenza parte dalla chiamata a call(): comprende anche l'attesa di un thread libero
+    nell'executor. request riceve l'istante di scadenza (time.monotonic()) e deve rispettarlo,
+    tentativi ripetuti compresi.
+    """
+    # Latenze necessarie per stimare il percentile e finestra delle latenze considerate, per modello
+    MIN_SAMPLES = 20
+    WINDOW = 200
+    PERCENTILE = 0.95
+
+    def __init__(self, executor, timeout=120, enabled=True, max_extra_percent=5, max_parallel_hedges=1):
+        self.executor = executor
+        self.timeout = timeout
+        self.enabled = enabled
+        self.max_extra_percent = max_extra_percent
+        self._hedge_slots = threading.BoundedSemaphore(max(1, max_parallel_hedges))
+        self._lock = threading.Lock()
+        self._latencies = {}
+        # Contatori: richieste, scadenze superate, copie inviate e copie arrivate per prime
+        self.requests = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def threshold(self, model):
+        """Latenza oltre la quale duplicare una richiesta al modello, o None con troppe poche misure"""
+        with self._lock:
+            samples = sorted(self._latencies.get(model, ()))
+        if len(samples) < self.MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * self.PERCENTILE))]
+
+    def _timed(self, request, model, deadline, slot=None):
+        start = time.monotonic()
+        try:
+            result = request(deadline)
+        finally:
+            if slot is not None:
+                slot.release()
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=self.WINDOW)).append(time.monotonic() - start)
+        return result
+
+    def _take_hedge_budget(self):
+        with self._lock:
+            if (self.hedges + 1) * 100 > self.max_extra_percent * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def call(self, request, model):
+        """Esegue request(scadenza) entro la scadenza, con una copia se supera la soglia di latenza del modello"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        with self._lock:
+            self.requests += 1
+        primary = self.executor.submit(self._timed, request, model, deadline)
+        pending = {primary}
+        hedge = None
+        
+        threshold = self.threshold(model) if self.enabled else None
+        if threshold is not None and threshold < self.timeout:
+            done, _ = wait(pending, timeout=threshold)
+            if not done and self._hedge_slots.acquire(blocking=False):
+                if self._take_hedge_budget():
+                    hedge = self.executor.submit(self._timed, request, model, deadline, self._hedge_slots)
+                    pending.add(hedge)
+                else:
+                    self._hedge_slots.release()
+        
+        error = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            done, pending = wait(pending, timeout=max(0.0, remaining), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    # Prima risposta valida: l'altra richiesta viene abbandonata
+                    for other in pending:
+                        other.cancel()
+                    if future is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        
+        if error is not None and not pending:
+            raise error
+        with self._lock:
+            self.timeouts += 1
+        for future in pending:
+            future.cancel()
+        raise TimeoutError(f"nessuna risposta entro {self.timeout} s")
+
+    def summary(self):
+        return (f"{self.requests} richieste · {self.timeouts} scadute · {self.hedges} copie inviate, "
+                f"{self.hedge_wins} arrivate per prime")
+
+class ResultStore:
+    """Testo dei risultati su un file temporaneo a sola aggiunta, con in memoria solo i più recenti.
+
+    Ogni risultato è scritto una volta in coda al file (i testi identici una sola volta) e identificato
+    dal numero del record; una cache LRU di al più hot_chars caratteri evita di rileggere dal disco i
+    risultati appena scritti o mostrati. Il file viene eliminato alla chiusura.
+    """
+    HOT_CHARS = 8 * 1024 * 1024
+
+    def __init__(self, hot_chars=HOT_CHARS):
+        self._file = tempfile.TemporaryFile(prefix="textlab_risultati_")
+        self._lock = threading.Lock()
+        # Per record: posizione e lunghezza in byte nel file
+        self._offsets = array('q')
+        self._lengths = array('q')
+        self._records = {}
+        self._end = 0
+        self._hot = OrderedDict()
+        self._hot_chars = 0
+        self.hot_chars = hot_chars
+
+    def __len__(self):
+        return len(self._offsets)
+
+    @property
+    def size_bytes(self):
+        return self._end
+
+    def put(self, text):
+        """Scrive il testo (se non già presente) e restituisce il numero del record"""
+        data = text.encode('utf-8', errors='surrogatepass')
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        with self._lock:
+            record = self._records.get(digest)
+            if record is None:
+                record = len(self._offsets)
+                self._file.seek(self._end)
+                self._file.write(data)
+                self._offsets.append(self._end)
+                self._lengths.append(len(data))
+                self._end += len(data)
+                self._records[digest] = record
+            self._keep_hot(record, text)
+        return record
+
+    def get(self, record):
+        with self._lock:
+            text = self._hot.get(record)
+            if text is not None:
+                self._hot.move_to_end(record)
+                return text
+            self._file.seek(self._offsets[record])
+            text = self._file.read(self._lengths[record]).decode('utf-8', errors='surrogatepass')
+            self._keep_hot(record, text)
+        return text
+
+    def _keep_hot(self, record, text):
+        if record in self._hot:
+            self._hot.move_to_end(record)
+            return
+        if len(text) > self.hot_chars:
+            return
+        self._hot[record] = text
+        self._hot_chars += len(text)
+        while self._hot_chars > self.hot_chars:
+            _, evicted = self._hot.popitem(last=False)
+            self._hot_chars -= len(evicted)
+
+    def close(self):
+        with self._lock:
+            self._hot.clear()
+            self._hot_chars = 0
+            self._file.close()
+
+class ResultList:
+    """Risultati per blocco di una modalità, in ordine, con il testo nel ResultStore.
+
+    Si usa come una lista: in memoria resta solo il numero del record di ogni blocco (None se il
+    risultato non è ancora arrivato) e la lettura in sequenza rilegge i testi uno alla volta.
+    """
+
+    def __init__(self, store, length=0):
+        self.store = store
+        self._records = array('q', [-1]) * length
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._text(record) for record in self._records[index]]
+        return self._text(self._records[index])
+
+    def __setitem__(self, index, text):
+        self._records[index] = -1 if text is None else self.store.put(text)
+
+    def __iter__(self):
+        for record in self._records:
+            yield self._text(record)
+
+    def append(self, text):
+        self._records.append(-1 if text is None else self.store.put(text))
+
+    def _text(self, record):
+        return None if record < 0 else self.store.get(record)
+
+class StoredResults(MutableMapping):
+    """Dizionario hash del blocco -> risultato con il testo nel ResultStore"""
+
+    def __init__(self, store, results=None):
+        self.store = store
+        self._records = {}
+        if results:
+            self.update(results)
+
+    def __getitem__(self, key):
+        return self.store.get(self._records[key])
+
+    def __setitem__(self, key, text):
+        self._records[key] = self.store.put(text)
+
+    def __delitem__(self, key):
+        del self._records[key]
+
+    def __contains__(self, key):
+        return key in self._records
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def update(self, other=(), **kwargs):
+        # Tra due dizionari sullo stesso store bastano i numeri dei record, senza rileggere i testi
+        if isinstance(other, StoredResults) and other.store is self.store and not kwargs:
+            self._records.update(other._records)
+        else:
+            super().update(other, **kwargs)
+
+class ParallelBlockProcessor:
+    """Elabora i blocchi di una modalità in parallelo mantenendo l'ordine dei risultati.
+
+    I blocchi identici, o già elaborati in un'esecuzione precedente con la stessa richiesta,
+    sono inviati una sola volta.
+    """
+
+    def __init__(self, call_api, prompt, max_workers=8, previous_results=None, store=None):
+        self.call_api = call_api
+        self.prompt = prompt
+        self.max_workers = max(1, max_workers)
+        # Risultati di un'esecuzione precedente (hash dell'input -> risultato) da non richiedere di nuovo
+        self.previous_results = previous_results or {}
+        # Con uno store i testi dei risultati restano su disco e in memoria solo i riferimenti
+        self.store = store
+        # Risultati validi usati in questa esecuzione, riutilizzabili alla successiva
+        self.block_results = self._new_results()
+
+    def _new_results(self):
+        return StoredResults(self.store) if self.store is not None else {}
+
+    def _remember(self, key, result):
+        if not APIWorker.is_error_result(result):
+            self.block_results[key] = result
+
+    def map_blocks(self, executor, blocks, on_block_done=None, output=None):
+        """Elabora i blocchi, anche letti a flusso, con al più 2 * max_workers richieste in volo.
+
+        on_block_done viene chiamato nel thread chiamante dopo ogni blocco, nell'ordine dei blocchi.
+        I risultati sono aggiunti a output (una lista se non indicato) appena pronti, nell'ordine dei blocchi.
+        """
+        output = [] if output is None else output
+        results = self._new_results()
+        futures = {}
+        # Blocchi il cui risultato non è ancora stato aggiunto a output
+        order = deque()
+        in_flight = deque()
+
+        def complete_oldest():
+            block_key = in_flight.popleft()
+            result = futures.pop(block_key).result()
+            results[block_key] = result
+            self._remember(block_key, result)
+            if on_block_done:
+                on_block_done()
+
+        def flush():
+            while order and order[0] not in futures:
+                output.append(results[order.popleft()])
+
+        for block in blocks:
+            block_key = TextProcessor.block_hash(block)
+            order.append(block_key)
+            if block_key not in results and block_key not in futures and block_key in self.previous_results:
+                result = self.previous_results[block_key]
+                results[block_key] = result
+                self._remember(block_key, result)
+            if block_key in results or block_key in futures:
+                if on_block_done:
+                    on_block_done()
+            else:
+                futures[block_key] = executor.submit(self.call_api, block, self.prompt)
+                in_flight.append(block_key)
+                if len(in_flight) >= 2 * self.max_workers:
+                    complete_oldest()
+            flush()
+        while in_flight:
+            complete_oldest()
+        flush()
+        return output
+
+class PriorityScheduler:
+    """Ordine di invio dei blocchi tra le modalità, guidato da ciò che l'utente sta guardando.
+
+    Prima i blocchi della modalità in primo piano, a partire dalla posizione di lettura; poi le altre
+    modalità alternate, iniziando da quella più indietro. Il fuoco può cambiare durante l'elaborazione:
+    il numero totale di richieste non cambia, solo il loro ordine.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Per modalità: indici dei blocchi ancora da inviare, ordinati, e quanti ne sono già stati presi
+        self._remaining = {}
+        self._taken = {}
+        self._focus_option = None
+        self._focus_index = 0
+
+    def add(self, option, indices):
+        with self._lock:
+            self._remaining[option] = sorted(indices)
+            self._taken[option] = 0
+
+    def set_focus(self, option, index=0):
+        """Modalità visibile e indice del blocco in cima alla vista"""
+        with self._lock:
+            self._focus_option = option
+            self._focus_index = max(0, index)
+
+    def next_task(self, options=None):
+        """Prossima coppia (modalità, indice del blocco) tra le modalità indicate, o None se non resta nulla"""
+        with self._lock:
+            candidates = [option for option in (options or self._remaining) if self._remaining.get(option)]
+            if not candidates:
+                return None
+            if self._focus_option in candidates:
+                option = self._focus_option
+                remaining = self._remaining[option]
+                # Il primo blocco non ancora inviato dalla posizione di lettura in poi, poi dall'inizio
+                position = bisect.bisect_left(remaining, self._focus_index)
+                if position == len(remaining):
+                    position = 0
+            else:
+                option = min(candidates, key=lambda candidate: self._taken[candidate])
+                position = 0
+            self._taken[option] += 1
+            return option, self._remaining[option].pop(position)
+
+class MapReduceSummarizer(ParallelBlockProcessor):
+    """Riassunto gerarchico: riassume i blocchi in parallelo e unisce i riassunti parziali ad albero.
+
+    Ogni livello dell'albero viene eseguito in parallelo, quindi con un fan-out f il numero di
+    passaggi sequenziali cresce come log_f(numero di blocchi) e non linearmente.
+    """
+    # Numero massimo di livelli di reduce, come protezione da risposte che non si accorciano
+    MAX_DEPTH = 8
+
+    def __init__(self, call_api, prompt, max_words=400, fan_out=4, max_workers=8, previous_results=None,
+                 store=None):
+        super().__init__(call_api, prompt, max_workers, previous_results, store)
+        self.max_words = max_words
+        self.fan_out = max(2, fan_out)
+
+    @staticmethod
+    def _word_count(text):
+        return len(re.findall(r'\w+', text))
+
+    def _group(self, parts):
+        """Raggruppa i riassunti parziali in gruppi di circa fan_out elementi, con confini scelti dal contenuto.
+
+        Un gruppo si chiude dopo un riassunto il cui hash è multiplo di fan_out (almeno 2 elementi, al più
+        2 * fan_out). I confini non dipendono dalla posizione: un blocco diviso o unito cambia solo i gruppi
+        vicini e gli altri ricevono gli stessi input, riusando le unioni salvate nell'esecuzione precedente.
+        """
+        max_size = 2 * self.fan_out
+        groups = []
+        group = []
+        for part in parts:
+            group.append(part)
+            if len(group) >= max_size or (
+                    len(group) >= 2 and int(TextProcessor.block_hash(part)[:8], 16) % self.fan_out == 0):
+                groups.append(group)
+                group = []
+        if group:
+            # Un riassunto rimasto da solo va con il gruppo precedente invece di essere unito da solo
+            if len(group) == 1 and groups:
+                groups[-1].extend(group)
+            else:
+                groups.append(group)
+        return groups
+
+    def _run_parallel(self, executor, inputs, prompt, on_done=None):
+        """Esegue le chiamate in parallelo mantenendo l'ordine dei risultati.
+
+        Gli input già uniti in un'esecuzione precedente riusano il risultato salvato.
+        """
+        keys = [TextProcessor.block_hash(prompt + "\n\n" + text) for text in inputs]
+        outputs = [self.previous_results.get(key) for key in keys]
+        futures = {executor.submit(self.call_api, text, prompt): index
+                   for index, text in enumerate(inputs) if outputs[index] is None}
+        for future in as_completed(futures):
+            outputs[futures[future]] = future.result()
+            if on_done:
+                on_done()
+        for key, output in zip(keys, outputs):
+            self._remember(key, output)
+        return outputs
+
+    def summarize(self, blocks, on_block_done=None):
+        """Restituisce il riassunto dell'intero documento.
+
+        on_block_done viene chiamato nel thread chiamante dopo ogni blocco della fase di map.
+        """
+        merge_prompt = merge_summary_prompt.format(max_words=self.max_words)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Fase map: un riassunto per blocco
+            parts = self.map_blocks(executor, blocks, on_block_done)
+            if not parts:
+                return ""
+
+            errors = [part for part in parts if APIWorker.is_error_result(part)]
+            parts = [part for part in parts if not APIWorker.is_error_result(part)]
+            if not parts:
+                return errors[0] if errors else "Nessuna risposta ottenuta dall'API."
+            if errors:
+                logger.warning(f"Riassunto: {len(errors)} blocchi non riassunti a causa di errori")
+
+            # Fase reduce: unisce i riassunti a gruppi finché il risultato rientra nella lunghezza obiettivo
+            depth = 0
+            while depth < self.MAX_DEPTH and (len(parts) > 1 or self._word_count(parts[0]) > self.max_words):
+                depth += 1
+                groups = self._group(parts)
+                merged = self._run_parallel(executor, ["\n\n".join(group) for group in groups], merge_prompt)
+                # Se un'unione fallisce, mantiene i riassunti parziali originali di quel gruppo
+                parts = [part for group, result in zip(groups, merged)
+                         for part in (group if APIWorker.is_error_result(result) else [result])]
+                if any(APIWorker.is_error_result(result) for result in merged):
+                    logger.warning(f"Riassunto: unione fallita al livello {depth}")
+                    break
+                logger.info(f"Riassunto: livello {depth} completato, {len(parts)} riassunti parziali")
+
+        return "\n\n".join(parts)
 
 class APIWorker(QObject):
     """Worker per gestire le chiamate API in un thread separato"""
     finished = pyqtSignal()
-    progress = pyqtSignal(int)
     result = pyqtSignal(dict)
+    # Client OpenAI condiviso tra worker e preparazione speculativa
+    _client = None
+    _client_lock = threading.Lock()
+    _last_warm_up = float("-inf")
+    # Intervallo minimo (secondi) tra due aperture anticipate della connessione
+    WARM_UP_INTERVAL = 30
+    # Nuovi tentativi per richiesta dopo errori temporanei, con attesa iniziale (raddoppiata a ogni tentativo)
+    MAX_RETRIES = 2
+    RETRY_BACKOFF_S = 0.5
     
-    def __init__(self, text_blocks, selected_options, prompts):
+    def __init__(self, text_blocks, selected_options, prompts, settings=None, progress_tracker=None,
+                 previous_results=None, routing=None, result_store=None):
         super().__init__()
         self.text_blocks = text_blocks
         self.selected_options = selected_options
         self.prompts = prompts
+        self.settings = settings or default_settings
+        self.progress_tracker = progress_tracker or ProgressTracker()
         self.results = {option: [] for option in selected_options}
-        
+        # Per modalità: indici dei blocchi con un nuovo risultato, letti dall'interfaccia per aggiornare solo quelli
+        self.completed_indices = {option: deque() for option in selected_options}
+        # Ordine di invio tra le modalità, aggiornato dall'interfaccia in base alla tab visibile
+        self.scheduler = PriorityScheduler()
+        # Per modalità: (prompt, {hash del blocco: risultato}) dell'esecuzione precedente e di questa
+        self.previous_results = previous_results or {}
+        self.block_results = {}
+        # I testi dei risultati per blocco sono scritti qui, su disco, appena arrivano
+        # (uno store vuoto è falso: il confronto è con None)
+        self.result_store = result_store if result_store is not None else ResultStore()
+        # Impostato alla chiusura della finestra: i blocchi non ancora inviati non vengono più richiesti
+        self.cancelled = threading.Event()
+        self.shared_instructions = self.settings.get("istruzioni_comuni", "")
+        self.token_usage = TokenUsage()
+        self.router = ModelRouter(routing, self.settings.get("pool_modelli"))
+        # Le richieste sono eseguite da questo pool, così chi le attende può applicare scadenza e copie
+        pool_threads = sum(self.router.pool_size(self.router.route(option)["modello"]) for option in selected_options)
+        self.request_executor = ThreadPoolExecutor(max_workers=2 * pool_threads + 2, thread_name_prefix="richiesta")
+        max_extra_percent = self.settings.get("ridondanza_max_percento", 5)
+        self.hedger = HedgedRequests(self.request_executor,
+                                     timeout=self.settings.get("timeout_richiesta_s", 120),
+                                     enabled=self.settings.get("richieste_ridondanti", True),
+                                     max_extra_percent=max_extra_percent,
+                                     max_parallel_hedges=pool_threads * max_extra_percent // 100)
+    
+    @staticmethod
+    def shared_client():
+        """Client OpenAI condiviso da tutte le richieste: le connessioni HTTP restano aperte e riutilizzabili"""
+        with APIWorker._client_lock:
+            if APIWorker._client is None:
+                APIWorker._client = OpenAI(api_key='sk-XXX')
+            return APIWorker._client
+    
+    @staticmethod
+    def warm_up():
+        """Apre in anticipo la connessione all'API con una richiesta leggera, al più una volta ogni WARM_UP_INTERVAL"""
+        now = time.monotonic()
+        with APIWorker._client_lock:
+            if now - APIWorker._last_warm_up < APIWorker.WARM_UP_INTERVAL:
+                return
+            APIWorker._last_warm_up = now
+        try:
+            APIWorker.shared_client().with_options(timeout=10, max_retries=0).models.list()
+        except Exception as e:
+            logger.debug(f"Connessione anticipata all'API non riuscita: {str(e)}")
+    
+    @staticmethod
+    def is_error_result(text):
+        """True se il testo è un errore o una risposta vuota dell'API, da non riutilizzare"""
+        return not text or text.startswith("Errore:") or text == "Nessuna risposta ottenuta dall'API."
+    
+    @staticmethod
+    def request_signature(prompt, shared_instructions, route):
+        """Identifica richiesta e parametri di generazione: i risultati sono riutilizzabili solo a parità di firma"""
+        return (RequestBuilder.system_prompt(prompt, shared_instructions), tuple(sorted(route.items())))
+    
+    def reusable_results(self, option):
+        """Risultati precedenti della modalità, validi solo se prompt e instradamento non sono cambiati"""
+        signature, results = self.previous_results.get(option, (None, {}))
+        return results if signature == self.signature(option) else {}
+    
+    def signature(self, option):
+        return self.request_signature(self.prompts.get(option, "Elabora il testo"), self.shared_instructions,
+                                      self.router.route(option))
+    
+    @Tracer.traced("api.elaborazione")
     def process(self):
-        total_tasks = len(self.text_blocks) * len(self.selected_options)
-        completed_tasks = 0
-        
+        block_count = len(self.text_blocks)
         for option in self.selected_options:
-            prompt = self.prompts.get(option, "Elabora il testo")
-            for block in self.text_blocks:
-                result = self.call_api(block, prompt)
-                self.results[option].append(result)
-                completed_tasks += 1
-                self.progress.emit(completed_tasks)
+            self.progress_tracker.set_total(ProgressTracker.STAGE_API, option, block_count)
+        
+        if self.is_scheduled:
+            self.process_scheduled()
+        else:
+            self.process_streamed()
         
+        # Le richieste abbandonate terminano da sole, al più alla scadenza
+        self.request_executor.shutdown(wait=False)
+        logger.info(f"Utilizzo token: {self.token_usage.summary()}")
+        logger.info(f"Richieste API: {self.hedger.summary()}")
         self.result.emit(self.results)
         self.finished.emit()
     
-    def call_api(self, text_block, prompt):
-        """Chiamata API OpenAI con il prompt specifico"""
+    @property
+    def is_scheduled(self):
+        """True se i risultati per blocco si riempiono man mano, nell'ordine scelto dallo scheduler"""
+        return isinstance(self.text_blocks, (list, Document))
+    
+    def process_scheduled(self):
+        """Elabora tutte le modalità insieme, nell'ordine di priorità dello scheduler.
+
+        Ogni modello ha tanti thread quante richieste contemporanee consente; i risultati per blocco
+        vengono scritti in self.results appena pronti, così l'interfaccia può mostrarli subito.
+        Per il riassunto lo scheduler gestisce la fase di map; le unioni seguono alla fine.
+        """
+        blocks = self.text_blocks
+        if isinstance(blocks, Document):
+            block_keys = blocks.block_hashes()
+        else:
+            block_keys = [TextProcessor.block_hash(block) for block in blocks]
+        positions = {}
+        for index, block_key in enumerate(block_keys):
+            positions.setdefault(block_key, []).append(index)
+        
+        routes = {option: self.router.route(option) for option in self.selected_options}
+        store = self.result_store
+        outputs = {option: ResultList(store, len(blocks)) for option in self.selected_options}
+        completed = {option: StoredResults(store) for option in self.selected_options}
+        valid = {option: StoredResults(store) for option in self.selected_options}
+        for option in self.selected_options:
+            if option != "riassunto":
+                self.results[option] = outputs[option]
+        
+        def fill(option, block_key, result):
+            # Blocchi identici ricevono lo stesso risultato
+            indices = positions[block_key]
+            for index in indices:
+                outputs[option][index] = result
+            self.completed_indices[option].extend(indices)
+            completed[option][block_key] = result
+            if not self.is_error_result(result):
+                valid[option][block_key] = result
+            self.progress_tracker.advance(ProgressTracker.STAGE_API, option, len(indices))
+        
+        for option in self.selected_options:
+            previous = self.reusable_results(option)
+            pending = []
+            for block_key, indices in positions.items():
+                if block_key in previous:
+                    fill(option, block_key, previous[block_key])
+                else:
+                    pending.append(indices[0])
+            self.scheduler.add(option, pending)
+        
+        def drain(options):
+            while True:
+                task = self.scheduler.next_task(options)
+                if task is None:
+                    return
+                option, index = task
+                result = self.call_api(blocks[index], self.prompts.get(option, "Elabora il testo"),
+                                       route=routes[option])
+                fill(option, block_keys[index], result)
+        
+        models = {}
+        for option, route in routes.items():
+            models.setdefault(route["modello"], []).append(option)
+        thread_count = sum(self.router.pool_size(model) for model in models)
+        with ThreadPoolExecutor(max_workers=thread_count) as executor:
+            futures = [executor.submit(drain, options)
+                       for model, options in models.items()
+                       for _ in range(self.router.pool_size(model))]
+            for future in futures:
+                future.result()
+        
+        for option in self.selected_options:
+            if option == "riassunto":
+                # Tutti i riassunti parziali sono pronti: il summarizer esegue solo le unioni
+                summarizer = MapReduceSummarizer(
+                    partial(self.call_api, route=routes[option]),
+                    self.prompts.get(option, "Elabora il testo"),
+                    max_words=self.settings["riassunto_parole_max"],
+                    fan_out=self.settings["riassunto_fan_out"],
+                    max_workers=self.settings["riassunto_thread"],
+                    previous_results=StoredResults(store, self.reusable_results(option)),
+                    store=store,
+                )
+                summarizer.previous_results.update(completed[option])
+                self.results[option] = [summarizer.summarize(blocks)]
+                self.block_results[option] = (self.signature(option), summarizer.block_results)
+            else:
+                self.block_results[option] = (self.signature(option), valid[option])
+    
+    def process_streamed(self):
+        """Elabora i blocchi letti a flusso dal disco, una modalità dopo l'altra, senza tenerli in memoria"""
+        for option in self.selected_options:
+            on_block_done = partial(self.progress_tracker.advance, ProgressTracker.STAGE_API, option)
+            prompt = self.prompts.get(option, "Elabora il testo")
+            route = self.router.route(option)
+            call_api = partial(self.call_api, route=route)
+            
+            if option == "riassunto":
+                # Il riassunto riguarda l'intero documento: map-reduce invece di un riassunto per blocco
+                processor = MapReduceSummarizer(
+                    call_api,
+                    prompt,
+                    max_words=self.settings["riassunto_parole_max"],
+                    fan_out=self.settings["riassunto_fan_out"],
+                    max_workers=self.settings["riassunto_thread"],
+                    previous_results=self.reusable_results(option),
+                    store=self.result_store,
+                )
+                self.results[option].append(processor.summarize(self.text_blocks, on_block_done))
+            else:
+                # Un blocco per richiesta, con tante richieste in parallelo quante ne consente il modello
+                processor = ParallelBlockProcessor(
+                    call_api,
+                    prompt,
+                    max_workers=self.router.pool_size(route["modello"]),
+                    previous_results=self.reusable_results(option),
+                    store=self.result_store,
+                )
+                self.results[option] = ResultList(self.result_store)
+                with ThreadPoolExecutor(max_workers=processor.max_workers) as executor:
+                    processor.map_blocks(executor, self.text_blocks, on_block_done, self.results[option])
+            
+            self.block_results[option] = (self.signature(option), processor.block_results)
+    
+    def _request(self, text_block, prompt, route, deadline):
+        """Una richiesta chat completions che termina entro deadline (time.monotonic()).
+
+        I nuovi tentativi del client sono disattivati: errori di connessione, limiti di frequenza ed
+        errori del server sono ritentati qui, solo se il tempo rimasto basta per l'attesa e la richiesta.
+        """
+        messages = RequestBuilder.build_messages(prompt, text_block, self.shared_instructions)
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"nessuna risposta entro {self.hedger.timeout} s")
+            client = APIWorker.shared_client().with_options(timeout=remaining, max_retries=0)
+            try:
+                with Tracer.span("api.chiamata", modello=route["modello"], tentativo=attempt):
+                    completion = client.chat.completions.create(
+                        model=route["modello"],
+                        messages=messages,
+                        max_completion_tokens=route["max_token"],
+                        temperature=route["temperatura"],
+                        prompt_cache_key=RequestBuilder.cache_key(prompt, self.shared_instructions),
+                    )
+                break
+            except (APIConnectionError, RateLimitError, InternalServerError):
+                backoff = self.RETRY_BACKOFF_S * 2 ** attempt
+                attempt += 1
+                if attempt > self.MAX_RETRIES or deadline - time.monotonic() <= backoff:
+                    raise
+                time.sleep(backoff)
+        # Anche le risposte delle richieste abbandonate sono conteggiate: i loro token sono spesi
+        self.token_usage.add(completion.usage)
+        return completion
+    
+    def call_api(self, text_block, prompt, route=None):
+        """Chiamata API OpenAI con il prompt specifico e i parametri di generazione della modalità"""
+        route = route or ModelRouter.DEFAULT_ROUTE
+        if self.cancelled.is_set():
+            return "Errore: elaborazione annullata"
         try:
-            # Assicura che il blocco di testo sia codificato correttamente in UTF-8
-            if isinstance(text_block, str):
-                text_block = text_block.encode('utf-8', errors='replace').decode('utf-8')
-                
-            client = OpenAI(api_key='sk-XXX')
-            completion = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"{prompt}"
-                    },
-                    {"role": "user", "content": f"{text_block}"}
-                ]
-            )
+            # La differenza tra i due span è l'attesa di un posto libero nel pool del modello
+            with Tracer.span("api.richiesta", modello=route["modello"]), self.router.slot(route["modello"]):
+                completion = self.hedger.call(partial(self._request, text_block, prompt, route), route["modello"])
             if completion.choices and completion.choices[0].message:
                 response = completion.choices[0].message.content
-                # Assicura che la risposta sia codificata correttamente in UTF-8
-                return response.encode('utf-8', errors='replace').decode('utf-8')
+                # La risposta entra nei risultati: normalizzata qui, una sola volta
+                return Document.normalize(response)
             return "Nessuna risposta ottenuta dall'API."
         except Exception as e:
             logging.error(f"Errore generazione articolo: {str(e)}")
             return f"Errore: {str(e)}"
 
+    def cancel(self):
+        """Annulla le richieste non ancora inviate; quelle in corso terminano entro la loro scadenza"""
+        self.cancelled.set()
+
 class APIThread(QThread):
     """Thread per eseguire il worker API"""
-    def __init__(self, text_blocks, selected_options, prompts):
+    def __init__(self, text_blocks, selected_options, prompts, settings=None, progress_tracker=None,
+                 previous_results=None, routing=None, result_store=None):
         super().__init__()
-        self.worker = APIWorker(text_blocks, selected_options, prompts)
+        self.worker = APIWorker(text_blocks, selected_options, prompts, settings, progress_tracker,
+                                previous_results, routing, result_store)
         self.worker.moveToThread(self)
         
     def run(self):
         self.worker.process()
 
-class TextProcessor:
-    """Classe per elaborare i testi e dividerli in blocchi"""
-    @staticmethod
-    def extract_text_from_file(file_path):
-        """Estrae il testo da file di diverso formato"""
-        _, ext = os.path.splitext(file_path)
-        
+class PreparationThread(QThread):
+    """Preparazione speculativa del testo caricato o modificato, prima della pressione del pulsante.
+
+    Divide il testo in un Document (blocchi e hash, riutilizzando la divisione precedente) e apre
+    in anticipo la connessione all'API, così l'elaborazione può partire subito.
+    """
+    prepared = pyqtSignal(str, object)
+
+    def __init__(self, text, previous_document=None):
+        super().__init__()
+        self.text = text
+        self.previous_document = previous_document
+
+    def run(self):
+        # La connessione si apre in parallelo, in un thread daemon che non trattiene la chiusura dell'app
+        threading.Thread(target=APIWorker.warm_up, daemon=True).start()
         try:
-            if ext.lower() == '.txt':
-                # Rileva automaticamente l'encoding
-                with open(file_path, 'rb') as f:
-                    raw_data = f.read()
-                    encoding = chardet.detect(raw_data)['encoding'] or 'utf-8'  # Fallback a UTF-8
-                
-                # Usa codecs per una migliore gestione degli encoding
-                with codecs.open(file_path, 'r', encoding=encoding, errors='replace') as file:
-                    text = file.read()
-                    # Normalizza il testo per gestire meglio gli accenti
-                    return unicodedata.normalize('NFC', text)
-                
-            elif ext.lower() == '.docx':
-                doc = docx.Document(file_path)
-                paragraphs = []
-                for paragraph in doc.paragraphs:
-                    if paragraph.text:
-                        # Normalizza il testo e assicurati che sia valido UTF-8
-                        text = unicodedata.normalize('NFC', paragraph.text)
-                        text = text.encode('utf-8', errors='replace').decode('utf-8')
-                        paragraphs.append(text)
-                return '\n'.join(paragraphs)
-                
-            elif ext.lower() == '.pdf':
-                # Controllo iniziale con metodo tradizionale 
-                try:
-                    # Tenta prima con pdfminer per documenti digitali con specifiche UTF-8
-                    laparams = LAParams()
-                    
-                    # Usa extract_text con parametri espliciti per UTF-8
-                    text = pdfminer_extract_text(
-                        file_path,
-                        laparams=laparams,
-                        codec='utf-8'  # Specifica esplicitamente UTF-8
-                    )
-                    
-                    # Normalizza il testo per gestire meglio gli accenti
-                    text = unicodedata.normalize('NFC', text)
-                    # Assicura che il testo sia codificato correttamente
-                    text = text.encode('utf-8', errors='replace').decode('utf-8')
-                    
-                    # Se il testo sembra valido e contiene più di 100 caratteri, usalo
-                    if text and len(text) > 100:
-                        logger.info("Testo estratto con successo utilizzando pdfminer con encoding UTF-8")
-                        return text
-                    else:
-                        # Se il testo è scarso, passa all'OCR
-                        logger.info("Testo insufficiente con pdfminer, passaggio a OCR")
-                        raise ValueError("Testo insufficiente, provo con OCR")
-                except Exception as e:
-                    logger.warning(f"Estrazione tradizionale fallita: {str(e)}")
-                    # Procedi con OCR
-                    pass
-                    
-                # Usa easyOCR per l'estrazione tramite OCR
-                logger.info("Inizio estrazione OCR con easyOCR")
-                
-                # Inizializza il lettore OCR per italiano e inglese
-                # Nota: al primo avvio scaricherà i modelli (può richiedere tempo)
-                reader = easyocr.Reader(['it', 'en'], gpu=False)
-                
-                with tempfile.TemporaryDirectory() as path:
-                    logger.info("Conversione PDF in immagini...")
-                    images = convert_from_path(file_path, dpi=300)
-                    
-                    # Estrazione del testo da ogni immagine
-                    full_text = []
-                    total_pages = len(images)
-                    
-                    for i, img in enumerate(images):
-                        logger.info(f"Elaborazione pagina {i+1}/{total_pages}")
-                        
-                        # Converti l'immagine Pillow in array NumPy per easyOCR
-                        img_np = np.array(img)
-                        
-                        # Estrai il testo
-                        # detail=0 restituisce solo il testo senza coordinate
-                        # paragraph=True raggruppa il testo in paragrafi
-                        results = reader.readtext(img_np, detail=0, paragraph=True)
-                        
-                        # Assicurati che ogni risultato sia codificato correttamente in UTF-8
-                        sanitized_results = []
-                        for r in results:
-                            if isinstance(r, str):
-                                # Normalizza e codifica correttamente
-                                sanitized = unicodedata.normalize('NFC', r)
-                                sanitized = sanitized.encode('utf-8', errors='replace').decode('utf-8')
-                                sanitized_results.append(sanitized)
-                            else:
-                                # Se non è una stringa, convertiamo e sanitizziamo
-                                sanitized = str(r).encode('utf-8', errors='replace').decode('utf-8')
-                                sanitized_results.append(sanitized)
-                                
-                        # Unisci i risultati
-                        page_text = '\n'.join(sanitized_results)
-                        full_text.append(page_text)
-                        
-                    # Unisci il testo di tutte le pagine
-                    final_text = '\n\n'.join(full_text)
-                    
-                    # Post-processing del testo
-                    # Normalizza in forma di composizione (NFC) per una migliore resa degli accenti
-                    final_text = unicodedata.normalize('NFC', final_text)
-                    # Rimuovi caratteri non validi in UTF-8 o sostituiscili
-                    final_text = final_text.encode('utf-8', errors='replace').decode('utf-8')
-                    final_text = re.sub(r' {2,}', ' ', final_text)  # Riduci spazi multipli
-                    
-                    logger.info(f"Estrazione OCR completata: {len(final_text)} caratteri estratti")
-                    return final_text
-                
-            else:
-                raise ValueError(f"Formato file non supportato: {ext}")
-                
+            self.prepared.emit(self.text, Document.from_text(self.text, previous=self.previous_document))
         except Exception as e:
-            logger.error(f"Errore nell'estrazione del testo: {str(e)}")
-            raise
-    
+            logger.warning(f"Preparazione del testo non riuscita: {str(e)}")
+
+class OpenAIBatchClient:
+    """Endpoint batch di OpenAI: un file JSONL di richieste elaborato in modo asincrono entro 24 ore"""
+
+    def __init__(self):
+        self.client = OpenAI(api_key='sk-XXX')
+
+    def submit(self, jsonl_path):
+        """Carica il file delle richieste e crea il batch; restituisce l'id del batch"""
+        with open(jsonl_path, 'rb') as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        return batch.id
+
+    def status(self, batch_id):
+        """Restituisce (stato, id del file dei risultati, id del file degli errori)"""
+        batch = self.client.batches.retrieve(batch_id)
+        return batch.status, batch.output_file_id, batch.error_file_id
+
+    def download(self, file_id):
+        return self.client.files.content(file_id).text
+
+    def delete(self, batch_id):
+        """Elimina dall'account i file di richieste, risultati ed errori del batch raccolto"""
+        batch = self.client.batches.retrieve(batch_id)
+        for file_id in (batch.input_file_id, batch.output_file_id, batch.error_file_id):
+            if file_id:
+                self.client.files.delete(file_id)
+
+class LocalBatchClient:
+    """Sostituto locale dell'endpoint batch, con lo stesso formato dei file, per le prove senza rete.
+
+    Il batch risulta completato alla prima interrogazione dopo `delay` secondi; le risposte sono
+    prodotte da `responder(body)`, che per impostazione predefinita restituisce il testo ricevuto.
+    """
+
+    def __init__(self, root_dir=None, responder=None, delay=0.0):
+        self.root_dir = root_dir or os.path.join(app_data_dir, "batch", "locale")
+        self.responder = responder or self.echo
+        self.delay = delay
+        os.makedirs(self.root_dir, exist_ok=True)
+
     @staticmethod
-    def split_into_blocks(text, max_words=80):
-        """Divide il testo in blocchi di massimo 500 parole, rispettando frasi e parole"""
+    def echo(body):
+        return f"[{body['model']}] {body['messages'][-1]['content']}"
+
+    def _path(self, name):
+        return os.path.join(self.root_dir, name)
+
+    def submit(self, jsonl_path):
+        batch_id = f"batch_locale_{int(time.time() * 1000)}"
+        shutil.copyfile(jsonl_path, self._path(f"{batch_id}.input.jsonl"))
+        with open(self._path(f"{batch_id}.json"), 'w', encoding='utf-8') as f:
+            json.dump({"creato": time.time()}, f)
+        return batch_id
+
+    def status(self, batch_id):
+        output_id = f"{batch_id}.output.jsonl"
+        if os.path.exists(self._path(output_id)):
+            return "completed", output_id, None
+        with open(self._path(f"{batch_id}.json"), encoding='utf-8') as f:
+            created = json.load(f)["creato"]
+        if time.time() - created < self.delay:
+            return "in_progress", None, None
+
+        with open(self._path(f"{batch_id}.input.jsonl"), encoding='utf-8') as source, \
+                open(self._path(output_id), 'w', encoding='utf-8') as output:
+            for index, line in enumerate(source):
+                request = json.loads(line)
+                body = {"choices": [{"index": 0, "message": {"role": "assistant",
+                                                             "content": self.responder(request["body"])}}],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}}
+                output.write(json.dumps({"id": f"batch_req_{index}", "custom_id": request["custom_id"],
+                                         "response": {"status_code": 200, "body": body}, "error": None},
+                                        ensure_ascii=False) + "\n")
+        return "completed", output_id, None
+
+    def download(self, file_id):
+        with open(self._path(file_id), encoding='utf-8') as f:
+            return f.read()
+
+    def delete(self, batch_id):
+        for suffix in (".input.jsonl", ".json", ".output.jsonl"):
+            path = self._path(f"{batch_id}{suffix}")
+            if os.path.exists(path):
+                os.remove(path)
+
+class BatchManager:
+    """Elaborazioni tramite API batch: richieste serializzate in JSONL, stato salvato su disco.
+
+    Lo stato di ogni lavoro (blocchi, modalità, prompt, id del batch) resta in un file JSON, così
+    l'applicazione può essere chiusa mentre il batch è in corso e i risultati raccolti alla riapertura.
+    I blocchi vanno nel batch; le unioni del riassunto map-reduce, poche, sono eseguite alla raccolta.
+    """
+    # Stati finali dell'endpoint batch
+    TERMINAL_STATES = ("completed", "failed", "expired", "cancelled")
+
+    @staticmethod
+    def jobs_dir():
+        path = os.path.join(app_data_dir, "batch", "lavori")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @staticmethod
+    def client(settings):
+        return LocalBatchClient() if settings.get("batch_locale") else OpenAIBatchClient()
+
+    @staticmethod
+    def _job_path(job_id):
+        return os.path.join(BatchManager.jobs_dir(), f"{job_id}.json")
+
+    @staticmethod
+    def save(job):
+        path = BatchManager._job_path(job["id"])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def remove(job):
+        for path in (BatchManager._job_path(job["id"]), job.get("file_richieste")):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def delete_batch_files(job, client):
+        """Elimina i file del batch raccolto; un errore qui non deve far perdere i risultati"""
+        try:
+            client.delete(job["batch_id"])
+        except Exception as e:
+            logger.warning(f"File del batch {job['batch_id']} non eliminati: {e}")
+
+    @staticmethod
+    def pending_jobs():
+        """Lavori inviati e non ancora raccolti, dal più vecchio"""
+        jobs = []
+        for name in sorted(os.listdir(BatchManager.jobs_dir())):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(BatchManager.jobs_dir(), name), encoding='utf-8') as f:
+                        jobs.append(json.load(f))
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Stato del batch illeggibile {name}: {e}")
+        return sorted(jobs, key=lambda job: job["creato"])
+
+    @staticmethod
+    def build_requests(blocks, options, prompts, routing, shared_instructions=""):
+        """Una richiesta chat completions per ogni coppia (modalità, blocco distinto)"""
+        router = ModelRouter(routing, {})
+        for option in options:
+            prompt = prompts.get(option, "Elabora il testo")
+            route = router.route(option)
+            seen = set()
+            for block in blocks:
+                block_key = TextProcessor.block_hash(block)
+                if block_key in seen:
+                    continue
+                seen.add(block_key)
+                yield {
+                    "custom_id": f"{option}:{block_key}",
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        "model": route["modello"],
+                        "messages": RequestBuilder.build_messages(prompt, block, shared_instructions),
+                        "max_completion_tokens": route["max_token"],
+                        "temperature": route["temperatura"],
+                        "prompt_cache_key": RequestBuilder.cache_key(prompt, shared_instructions),
+                    },
+                }
+
+    @staticmethod
+    def submit(blocks, options, prompts, routing, settings, client, source_name=""):
+        """Serializza le richieste, invia il batch e salva lo stato del lavoro"""
+        blocks = list(blocks)
+        job_id = f"lavoro_{int(time.time() * 1000)}"
+        requests_path = os.path.join(BatchManager.jobs_dir(), f"{job_id}.jsonl")
+        request_count = 0
+        with open(requests_path, 'w', encoding='utf-8') as f:
+            for request in BatchManager.build_requests(blocks, options, prompts, routing,
+                                                       settings.get("istruzioni_comuni", "")):
+                f.write(json.dumps(request, ensure_ascii=False) + "\n")
+                request_count += 1
+
+        job = {
+            "id": job_id,
+            "creato": time.time(),
+            "file_origine": source_name,
+            "modalita": list(options),
+            "blocchi": blocks,
+            "prompt": dict(prompts),
+            "instradamento": routing,
+            "impostazioni": {key: settings[key] for key in ("istruzioni_comuni", "riassunto_parole_max",
+                                                            "riassunto_fan_out", "riassunto_thread",
+                                                            "pool_modelli", "batch_locale") if key in settings},
+            "richieste": request_count,
+            "file_richieste": requests_path,
+            "batch_id": client.submit(requests_path),
+            "stato": "validating",
+        }
+        BatchManager.save(job)
+        logger.info(f"Batch {job['batch_id']} inviato: {request_count} richieste")
+        return job
+
+    @staticmethod
+    def parse_output(text):
+        """Mappa custom_id -> testo della risposta o messaggio di errore"""
+        responses = {}
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            response = item.get("response") or {}
+            if item.get("error") or response.get("status_code") != 200:
+                error = item.get("error") or response.get("body", {}).get("error") or {}
+                responses[item["custom_id"]] = f"Errore: {error.get('message', 'richiesta batch fallita')}"
+                continue
+            choices = response["body"].get("choices") or []
+            content = choices[0]["message"].get("content") if choices else None
+            responses[item["custom_id"]] = content or "Nessuna risposta ottenuta dall'API."
+        return responses
+
+    @staticmethod
+    def poll(job, client):
+        """Aggiorna lo stato del lavoro; se il batch è concluso restituisce le risposte per modalità.
+
+        Le risposte sono nel formato dei risultati precedenti di APIWorker, (firma, {hash: risultato}),
+        quindi il worker le riusa senza richiederle e completa solo le unioni del riassunto.
+        """
+        state, output_file_id, error_file_id = client.status(job["batch_id"])
+        if state != job["stato"]:
+            job["stato"] = state
+            BatchManager.save(job)
+        if state not in BatchManager.TERMINAL_STATES:
+            return None
+
+        responses = {}
+        for file_id in (output_file_id, error_file_id):
+            if file_id:
+                responses.update(BatchManager.parse_output(client.download(file_id)))
+
+        settings = {**default_settings, **job["impostazioni"]}
+        router = ModelRouter(job["instradamento"], {})
+        previous_results = {}
+        for option in job["modalita"]:
+            option_results = {}
+            for block in job["blocchi"]:
+                block_key = TextProcessor.block_hash(block)
+                option_results[block_key] = responses.get(f"{option}:{block_key}",
+                                                          f"Errore: batch {state} senza risposta")
+            signature = APIWorker.request_signature(job["prompt"].get(option, "Elabora il testo"),
+                                                    settings.get("istruzioni_comuni", ""), router.route(option))
+            previous_results[option] = (signature, option_results)
+        return previous_results
+
+class BatchSubmitThread(QThread):
+    """Thread per serializzare e inviare un lavoro batch"""
+    submitted = pyqtSignal(dict)
+    errorOccurred = pyqtSignal(str)
+
+    def __init__(self, blocks, options, prompts, routing, settings, source_name=""):
+        super().__init__()
+        self.blocks = blocks
+        self.options = options
+        self.prompts = dict(prompts)
+        self.routing = routing
+        self.settings = dict(settings)
+        self.source_name = source_name
+
+    def run(self):
+        try:
+            job = BatchManager.submit(self.blocks, self.options, self.prompts, self.routing, self.settings,
+                                      BatchManager.client(self.settings), self.source_name)
+            self.submitted.emit(job)
+        except Exception as e:
+            logger.error(f"Errore invio batch: {str(e)}")
+            self.errorOccurred.emit(str(e))
+
+class BatchPollThread(QThread):
+    """Thread che interroga i lavori batch in corso e ricostruisce i risultati di quelli conclusi"""
+    batchCompleted = pyqtSignal(dict, dict)
+    errorOccurred = pyqtSignal(str)
+
+    def run(self):
+        for job in BatchManager.pending_jobs():
+            try:
+                if "risultati" not in job:
+                    settings = {**default_settings, **job["impostazioni"]}
+                    client = BatchManager.client(settings)
+                    previous_results = BatchManager.poll(job, client)
+                    if previous_results is None:
+                        continue
+                    worker = APIWorker(job["blocchi"], job["modalita"], job["prompt"], settings,
+                                       previous_results=previous_results, routing=job["instradamento"])
+                    try:
+                        worker.process()
+                        # I risultati del batch sono già in memoria dopo il controllo: liste semplici,
+                        # così lo store temporaneo del worker può essere chiuso subito
+                        results = {option: list(blocks) for option, blocks in worker.results.items()}
+                    finally:
+                        worker.result_store.close()
+                    # Salvati nel lavoro prima di mostrarli: se la GUI non può ancora accoglierli,
+                    # i controlli successivi li riprendono senza ripetere le unioni a pagamento
+                    job["risultati"] = results
+                    BatchManager.save(job)
+                    BatchManager.delete_batch_files(job, client)
+                self.batchCompleted.emit(job, job["risultati"])
+            except Exception as e:
+                logger.error(f"Errore controllo batch {job.get('id')}: {str(e)}")
+                self.errorOccurred.emit(str(e))
+
+class BoilerplateFilter:
+    """Rileva e rimuove le righe ripetute su più pagine (intestazioni, piè di pagina, disclaimer)"""
+    # Frazione minima di pagine in cui una riga deve comparire per essere considerata ripetuta
+    MIN_PAGE_RATIO = 0.5
+    # Numero minimo di pagine per applicare il rilevamento
+    MIN_PAGES = 3
+    # Righe all'inizio e alla fine della pagina considerate zona intestazione/piè di pagina
+    EDGE_LINES = 3
+    # Fuori dalla zona di bordo una riga ripetuta viene rimossa solo se lunga almeno così e nella
+    # stessa posizione (dall'inizio o dalla fine) sulle pagine: clausole e titoli ripetuti nel testo restano
+    MIN_BODY_LINE_LENGTH = 40
+
+    # Numerazione di pagina: "3", "- 3 -", "Pagina 3 di 10", "Page 3/10", "pag. 3"
+    PAGE_NUMBER_PATTERN = re.compile(r'^\W*(?:pagina|pag\.?|page|p\.)?\s*\d+(?:\s*(?:di|of|/)\s*\d+)?\W*$')
+
+    @staticmethod
+    def _line_key(line):
+        """Chiave di confronto: ignora maiuscole e spazi, unifica i numeri di pagina"""
+        key = re.sub(r'\s+', ' ', line.strip().lower())
+        if BoilerplateFilter.PAGE_NUMBER_PATTERN.match(key):
+            return "<numero di pagina>"
+        return key
+
+    @staticmethod
+    def remove_repeated_lines(pages, keep_first=True):
+        """Rimuove dalle pagine le righe che si ripetono sulla maggior parte di esse.
+
+        Se keep_first è True la prima occorrenza viene mantenuta, così il contenuto
+        viene inviato al modello una sola volta. Restituisce la lista di pagine filtrate.
+        """
+        # La parte vuota dopo l'ultimo form feed non è una pagina: non entra nel conteggio
+        trailing = []
+        if pages and not pages[-1].strip():
+            pages, trailing = pages[:-1], pages[-1:]
+        if len(pages) < BoilerplateFilter.MIN_PAGES:
+            return pages + trailing
+
+        page_lines = [page.split('\n') for page in pages]
+        page_keys = [[BoilerplateFilter._line_key(line) for line in lines] for lines in page_lines]
+
+        # Conta in quante pagine compare ciascuna riga (una volta per pagina), in qualsiasi punto
+        # e in ciascuna posizione tra le righe non vuote, contata dall'inizio (>= 0) e dalla fine (< 0)
+        page_counts = {}
+        position_counts = {}
+        for keys in page_keys:
+            non_empty = [key for key in keys if key]
+            for key in set(non_empty):
+                page_counts[key] = page_counts.get(key, 0) + 1
+            positions = {(key, rank) for rank, key in enumerate(non_empty)}
+            positions.update((key, rank - len(non_empty)) for rank, key in enumerate(non_empty))
+            for position in positions:
+                position_counts[position] = position_counts.get(position, 0) + 1
+
+        threshold = max(BoilerplateFilter.MIN_PAGES, len(pages) * BoilerplateFilter.MIN_PAGE_RATIO)
+        repeated = {key for key, count in page_counts.items() if count >= threshold}
+        if not repeated:
+            return pages + trailing
+        repeated_positions = {position for position, count in position_counts.items() if count >= threshold}
+
+        seen = set()
+        removed = 0
+        filtered_pages = []
+        for lines, keys in zip(page_lines, page_keys):
+            non_empty = [i for i, key in enumerate(keys) if key]
+            rank = {index: r for r, index in enumerate(non_empty)}
+            edge = set(non_empty[:BoilerplateFilter.EDGE_LINES] + non_empty[-BoilerplateFilter.EDGE_LINES:])
+            kept = []
+            for i, (line, key) in enumerate(zip(lines, keys)):
+                is_boilerplate = key in repeated and (
+                    i in edge or (len(key) >= BoilerplateFilter.MIN_BODY_LINE_LENGTH and (
+                        (key, rank[i]) in repeated_positions
+                        or (key, rank[i] - len(non_empty)) in repeated_positions))
+                )
+                if is_boilerplate:
+                    if keep_first and key not in seen:
+                        seen.add(key)
+                        kept.append(line)
+                    else:
+                        removed += 1
+                    continue
+                kept.append(line)
+            filtered_pages.append('\n'.join(kept))
+
+        logger.info(f"Rimosse {removed} righe ripetute su {len(pages)} pagine")
+        return filtered_pages + trailing
+
+class TextCleaner:
+    """Pulizia del testo dei PDF (pdfminer e OCR) prima della divisione in blocchi.
+
+    Ricongiunge le parole divise dal trattino a fine riga, unisce le righe spezzate all'interno di
+    una frase e rimuove le righe di rumore: elenchi puntati e linee di separazione vuoti, segni di
+    punteggiatura isolati. Lettere, cifre e simboli con un significato (€, %, §, &) non vengono mai
+    rimossi. Dei composti con il trattino a fine riga sono riconosciuti solo quelli con un primo
+    elemento in COMPOUND_PREFIXES: gli altri ("tecnico-\nscientifico") perdono il trattino. Ogni passaggio è
+    una sostituzione sull'intero testo (str.replace o un'espressione regolare che inizia da un a capo
+    o da un trattino, così la ricerca salta subito al punto utile), senza cicli riga per riga.
+    Interruzioni di pagina (form feed) e righe vuote tra i paragrafi restano al loro posto.
+    """
+    MULTIPLE_SPACES = re.compile(r'  +')
+    # Righe fatte solo di punti elenco o di caratteri di separazione ("•", "|", "~~", "_____", "====")
+    SYMBOL_LINE = re.compile(r'(\f)[•·▪◦|~_=\-]+\n|\n[•·▪◦|~_=\-]+(?=[\n\f]|\Z)')
+    # Segno di punteggiatura isolato (macchia dell'OCR) all'inizio di un paragrafo o dopo la fine di una
+    # frase, dove non può chiudere la riga precedente
+    CHAR_LINE = re.compile(r'(\f)[.,;:\'"`´‘’^]\n|\n(?<=[\n.!?:]\n)[.,;:\'"`´‘’^](?=[\n\f]|\Z)')
+    # Parola divisa a fine riga: "docu-\nmento" -> "documento", anche con il trattino morbido
+    HYPHENATED = re.compile(r'[-\u00ad](?<=\w[-\u00ad])\n(?=[a-zà-öø-ÿ])')
+    # Primi elementi di parole composte: il trattino a fine riga dopo di essi fa parte della parola
+    COMPOUND_PREFIXES = re.compile(
+        r'\b(?:anti|auto|bio|co|contro|cross|ex|extra|high|inter|intra|long|low|macro|micro|multi|neo|non|'
+        r'post|pre|pro|self|semi|short|socio|sovra|sub|super|ultra|vice|well)$', re.IGNORECASE)
+    # A capo dentro una frase: la riga non termina con una punteggiatura finale e la successiva inizia
+    # con una minuscola. Elenchi ("a) ..."), titoli e righe che iniziano con una maiuscola restano separati
+    WRAPPED_LINE = re.compile(r'\n(?<=[\w,)\]»"\'’]\n)(?=[a-zà-öø-ÿ])(?!\w[).]\s)')
+    BLANK_LINES = re.compile(r'\n\n\n+')
+
+    @staticmethod
+    def _join_hyphenated(match):
+        # Il trattino morbido è solo un punto di sillabazione; quello dei composti resta
+        if match.group()[0] == '-' and TextCleaner.COMPOUND_PREFIXES.search(
+                match.string, max(0, match.start() - 16), match.start()):
+            return '-'
+        return ''
+
+    @staticmethod
+    def estimate_tokens(text):
+        """Stima approssimativa senza dividere il testo: una parola per spazio o a capo, più l'a capo stesso"""
+        return text.count(' ') + 2 * text.count('\n')
+
+    @staticmethod
+    def clean(text):
+        """Restituisce il testo ripulito e registra nel log i token stimati risparmiati"""
         if not text:
-            return []
-            
-        # Assicurati che il testo sia codificato correttamente
-        if isinstance(text, str):
-            text = text.encode('utf-8', errors='replace').decode('utf-8')
+            return text
+        tokens_before = TextCleaner.estimate_tokens(text)
+        text = text.replace('\r\n', '\n').replace('\r', '\n').replace('\t', ' ')
+        text = TextCleaner.MULTIPLE_SPACES.sub(' ', text)
+        text = text.replace(' \n', '\n').replace('\n ', '\n').replace(' \f', '\f').replace('\f ', '\f')
+        # Un a capo iniziale fa trattare la prima riga come tutte le altre
+        text = '\n' + text
+        text, symbol_lines = TextCleaner.SYMBOL_LINE.subn(r'\1', text)
+        text, char_lines = TextCleaner.CHAR_LINE.subn(r'\1', text)
+        text, hyphenated = TextCleaner.HYPHENATED.subn(TextCleaner._join_hyphenated, text)
+        text = text.replace('\u00ad', '')
+        text, wrapped = TextCleaner.WRAPPED_LINE.subn(' ', text)
+        text = TextCleaner.BLANK_LINES.sub('\n\n', text)[1:]
+        tokens_after = TextCleaner.estimate_tokens(text)
+
+        saved = tokens_before - tokens_after
+        logger.info(f"Pulizia del testo: {symbol_lines + char_lines} righe di rumore rimosse, "
+                    f"{hyphenated} parole divise a fine riga ricongiunte, {wrapped} righe unite; "
+                    f"circa {saved} token risparmiati su {tokens_before} ({saved / max(1, tokens_before):.1%})")
+        return text
+
+class ExtractionCache(DiskCache):
+    """Cache del testo estratto dai documenti, compresso con zlib.
+
+    La voce è identificata dall'hash del contenuto del file, dalla versione dell'estrattore
+    e dalle opzioni di estrazione. Un indice (percorso, dimensione, mtime) -> hash evita di
+    rileggere il file quando non è cambiato.
+    """
+    SUFFIX = ".txt.z"
+    INDEX_FILE = "index.json"
+    # Numero massimo di file ricordati nell'indice
+    MAX_INDEX_ENTRIES = 2000
+
+    def __init__(self, cache_dir=None, max_mb=500, max_age_days=90):
+        super().__init__(cache_dir or os.path.join(app_data_dir, "extraction_cache"), max_mb, max_age_days)
+        self.index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        # L'indice è condiviso dai thread di caricamento, di preparazione e dalla GUI
+        self._lock = threading.Lock()
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def _encode(self, text):
+        return zlib.compress(text.encode('utf-8'), 6)
+
+    def _decode(self, data):
+        return zlib.decompress(data).decode('utf-8')
+
+    @staticmethod
+    def content_hash(file_path):
+        digest = hashlib.blake2b(digest_size=20)
+        with open(file_path, 'rb') as f:
+            for chunk in iter(partial(f.read, 1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _content_hash_cached(self, file_path):
+        """Hash del contenuto, ricalcolato solo se percorso, dimensione o mtime sono cambiati"""
+        stat = os.stat(file_path)
+        stat_key = f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        with self._lock:
+            content_hash = self.index.pop(stat_key, None)
+        # L'hash di un file nuovo si calcola fuori dal lock: su file grandi richiede secondi
+        content_hash = content_hash or self.content_hash(file_path)
+        with self._lock:
+            # Reinserisce in coda: l'indice resta ordinato dal meno al più recente
+            self.index[stat_key] = content_hash
+            while len(self.index) > self.MAX_INDEX_ENTRIES:
+                del self.index[next(iter(self.index))]
+        return content_hash
+
+    def _save_index(self):
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with self._lock:
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.index, f)
+                os.replace(tmp_path, self.index_path)
+            except OSError as e:
+                logger.warning(f"Impossibile salvare l'indice della cache di estrazione: {str(e)}")
+
+    def make_key(self, file_path, options):
+        settings = json.dumps({"options": options, "version": TextProcessor.EXTRACTOR_VERSION}, sort_keys=True)
+        content_hash = self._content_hash_cached(file_path)
+        return hashlib.sha256(f"{content_hash}:{settings}".encode('utf-8')).hexdigest()
+
+    def put(self, key, text):
+        super().put(key, text)
+        self._save_index()
+
+class DocxStreamExtractor:
+    """Estrazione a flusso del testo dei file .docx leggendo direttamente l'XML del pacchetto.
+
+    Rispetto a python-docx non costruisce l'albero del documento e include tabelle,
+    intestazioni, piè di pagina, note a piè di pagina e note di chiusura.
+    """
+    # Con namespace_separator=' ' expat riporta i nomi come "<namespace> <nome>"
+    W_NAMESPACE = "http://schemas.openxmlformats.org/wordprocessingml/2006/main "
+    PARAGRAPH = W_NAMESPACE + "p"
+    TEXT = W_NAMESPACE + "t"
+    TAB = W_NAMESPACE + "tab"
+    BREAKS = (W_NAMESPACE + "br", W_NAMESPACE + "cr")
+    BREAK_TYPE = W_NAMESPACE + "type"
+    TABLE_ROW = W_NAMESPACE + "tr"
+    TABLE_CELL = W_NAMESPACE + "tc"
+    # Byte letti per ogni passo del parser incrementale
+    READ_SIZE = 256 * 1024
+
+    @staticmethod
+    def _iter_part(stream):
+        """Restituisce le righe di testo di una parte XML (paragrafi e righe di tabella) in ordine"""
+        # Pile per paragrafi, celle e righe aperti (le tabelle possono essere annidate)
+        paragraphs = []
+        cells = []
+        rows = []
+        output = []
+        in_text = False
+
+        def add_line(line):
+            # Una riga finisce nella cella aperta oppure, fuori dalle tabelle, nell'output
+            (cells[-1] if cells else output).append(line)
+
+        def start_element(name, attributes):
+            nonlocal in_text
+            if name == DocxStreamExtractor.TEXT:
+                in_text = bool(paragraphs)
+            elif name == DocxStreamExtractor.PARAGRAPH:
+                paragraphs.append([])
+            elif name == DocxStreamExtractor.TAB:
+                if paragraphs:
+                    paragraphs[-1].append("\t")
+            elif name in DocxStreamExtractor.BREAKS:
+                # Le interruzioni di pagina e di colonna non producono testo, come in python-docx
+                break_type = attributes.get(DocxStreamExtractor.BREAK_TYPE, "textWrapping")
+                if paragraphs and break_type == "textWrapping":
+                    paragraphs[-1].append("\n")
+            elif name == DocxStreamExtractor.TABLE_CELL:
+                cells.append([])
+            elif name == DocxStreamExtractor.TABLE_ROW:
+                rows.append([])
+
+        def end_element(name):
+            nonlocal in_text
+            if name == DocxStreamExtractor.TEXT:
+                in_text = False
+            elif name == DocxStreamExtractor.PARAGRAPH:
+                text = "".join(paragraphs.pop())
+                if text:
+                    add_line(text)
+            elif name == DocxStreamExtractor.TABLE_CELL:
+                cell_text = " ".join(cells.pop())
+                if rows:
+                    rows[-1].append(cell_text)
+            elif name == DocxStreamExtractor.TABLE_ROW:
+                row = rows.pop()
+                if any(row):
+                    add_line("\t".join(row))
+
+        def character_data(data):
+            if in_text:
+                paragraphs[-1].append(data)
+
+        parser = expat.ParserCreate(namespace_separator=' ')
+        parser.buffer_text = True
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.CharacterDataHandler = character_data
+
+        # Analisi incrementale: le righe complete vengono restituite dopo ogni blocco letto
+        for data in iter(partial(stream.read, DocxStreamExtractor.READ_SIZE), b''):
+            parser.Parse(data, False)
+            yield from output
+            output.clear()
+        parser.Parse(b'', True)
+        yield from output
+
+    @staticmethod
+    def _part_text(package, name):
+        with package.open(name) as stream:
+            return "\n".join(DocxStreamExtractor._iter_part(stream))
+
+    @staticmethod
+    def _natural_key(name):
+        """Ordina header1, header2, ..., header10 in modo naturale"""
+        return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]
+
+    @staticmethod
+    def iter_lines(file_path):
+        """Righe di testo del documento: intestazioni, corpo, note e piè di pagina"""
+        with zipfile.ZipFile(file_path) as package:
+            names = set(package.namelist())
+            part_names = sorted(names, key=DocxStreamExtractor._natural_key)
+            headers = [name for name in part_names if re.fullmatch(r'word/header\d*\.xml', name)]
+            footers = [name for name in part_names if re.fullmatch(r'word/footer\d*\.xml', name)]
+
+            # Intestazioni e piè di pagina si ripetono tra le sezioni: ciascun testo una sola volta
+            seen = set()
+            for name in headers:
+                text = DocxStreamExtractor._part_text(package, name)
+                if text and text not in seen:
+                    seen.add(text)
+                    yield text
+
+            with package.open("word/document.xml") as stream:
+                yield from DocxStreamExtractor._iter_part(stream)
+
+            for name in ("word/footnotes.xml", "word/endnotes.xml"):
+                if name in names:
+                    with package.open(name) as stream:
+                        yield from DocxStreamExtractor._iter_part(stream)
+
+            for name in footers:
+                text = DocxStreamExtractor._part_text(package, name)
+                if text and text not in seen:
+                    seen.add(text)
+                    yield text
+
+    @staticmethod
+    @Tracer.traced("estrazione.docx")
+    def extract_text(file_path):
+        return '\n'.join(DocxStreamExtractor.iter_lines(file_path))
+
+class PDFTriage:
+    """Analisi rapida di un PDF con PyPDF2, prima dell'estrazione completa.
+
+    Su poche pagine campione verifica se c'è uno strato di testo (testo estraibile) e se
+    l'impaginazione ha più colonne: i documenti scansionati vanno subito all'OCR e quelli a colonna
+    singola usano pdfminer senza analisi del layout.
+    """
+    SAMPLE_PAGES = 8
+    # Caratteri minimi perché una pagina campione conti come pagina con testo
+    MIN_PAGE_CHARS = 20
+    # Un margine sinistro allineato nella fascia centrale della pagina con almeno questa quota
+    # dei segmenti di testo indica una seconda colonna (o una tabella)
+    COLUMN_EDGE_RATIO = 0.15
+    COLUMN_BAND = (0.3, 0.7)
+    EDGE_BIN_WIDTH = 4.0
+
+    @staticmethod
+    def sample_indices(total_pages, count):
+        """Indici di pagina distribuiti uniformemente nel documento"""
+        if total_pages <= count:
+            return list(range(total_pages))
+        step = total_pages / count
+        return sorted({int(i * step + step / 2) for i in range(count)})
+
+    @staticmethod
+    def _is_multi_column(edges, page_left, page_width):
+        """True se molti segmenti iniziano alla stessa ascissa nella fascia centrale della pagina"""
+        if not edges or page_width <= 0:
+            return False
+        low, high = PDFTriage.COLUMN_BAND
+        bins = {}
+        for x in edges:
+            position = (x - page_left) / page_width
+            if low <= position <= high:
+                key = int(x // PDFTriage.EDGE_BIN_WIDTH)
+                bins[key] = bins.get(key, 0) + 1
+        return bool(bins) and max(bins.values()) >= PDFTriage.COLUMN_EDGE_RATIO * len(edges)
+
+    @staticmethod
+    @Tracer.traced("estrazione.analisi_pdf")
+    def probe(file_path, sample_pages=None):
+        """Restituisce {"pages", "sampled", "text_pages", "scanned", "needs_layout"} o None se PyPDF2 fallisce"""
+        try:
+            reader = PyPDF2.PdfReader(file_path)
+            if reader.is_encrypted:
+                reader.decrypt("")
+            total_pages = len(reader.pages)
+            indices = PDFTriage.sample_indices(total_pages, sample_pages or PDFTriage.SAMPLE_PAGES)
+            text_pages = 0
+            column_pages = 0
+            for index in indices:
+                page = reader.pages[index]
+                edges = []
+
+                def visit(text, cm, tm, font_dict, font_size):
+                    if text.strip():
+                        # Ascissa di inizio del segmento nello spazio della pagina
+                        edges.append(tm[4] * cm[0] + tm[5] * cm[2] + cm[4])
+
+                text = page.extract_text(visitor_text=visit) or ""
+                if len(text.strip()) >= PDFTriage.MIN_PAGE_CHARS:
+                    text_pages += 1
+                    box = page.mediabox
+                    if PDFTriage._is_multi_column(edges, float(box.left), float(box.width)):
+                        column_pages += 1
+
+            if indices and text_pages == 0:
+                # PyPDF2 non vede il testo di alcuni PDF (form XObject, codifiche dei font): prima di
+                # mandare il documento all'OCR lo conferma una passata pdfminer sulle stesse pagine
+                sample_text = extract_range(file_path, indices, use_layout=False)
+                text_pages = sum(1 for page_text in sample_text.split('\f')
+                                 if len(page_text.strip()) >= PDFTriage.MIN_PAGE_CHARS)
+                # Impaginazione non analizzata: l'estrazione usa l'analisi del layout
+                column_pages = text_pages
+        except Exception as e:
+            logger.warning(f"Analisi preliminare del PDF non riuscita: {str(e)}")
+            return None
+
+        return {
+            "pages": total_pages,
+            "sampled": len(indices),
+            "text_pages": text_pages,
+            # Nessuna pagina campione con testo: documento scansionato
+            "scanned": bool(indices) and text_pages == 0,
+            "needs_layout": column_pages > 0,
+        }
+
+class WorkerProcess:
+    """Processo di lavoro eseguito da workers.py, senza importare main.py.
+
+    I processi avviati da multiprocessing con spawn rieseguono questo modulo, e con esso PyQt6,
+    il client OpenAI ed easyocr/torch; workers.py importa solo ciò che serve al lavoro (kind).
+    I lavori passano sulla Connection di multiprocessing restituita da connect(), utilizzabile con
+    multiprocessing.connection.wait; il processo si controlla come un multiprocessing.Process.
+    """
+    SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "workers.py")
+
+    def __init__(self, kind, *args):
+        """Avvia il processo senza attenderlo: più processi si avviano insieme e poi si collegano"""
+        self.kind = kind
+        self.conn = None
+        self._authkey = os.urandom(32)
+        self._process = subprocess.Popen([sys.executable, WorkerProcess.SCRIPT, kind, *args],
+                                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        # La chiave passa su stdin, non sulla riga di comando visibile agli altri processi
+        self._process.stdin.write(self._authkey.hex() + "\n")
+        self._process.stdin.close()
+
+    def connect(self):
+        """Attende che il processo sia pronto e vi si collega; restituisce la connessione"""
+        address = self._process.stdout.readline().strip()
+        self._process.stdout.close()
+        if not address:
+            raise OSError(f"Processo di lavoro {self.kind} terminato all'avvio (codice {self._process.wait()})")
+        self.conn = multiprocessing.connection.Client(address, authkey=self._authkey)
+        return self.conn
+
+    @property
+    def pid(self):
+        return self._process.pid
+
+    @property
+    def exitcode(self):
+        return self._process.poll()
+
+    def is_alive(self):
+        return self._process.poll() is None
+
+    def join(self, timeout=None):
+        try:
+            self._process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            pass
+
+    def kill(self):
+        self._process.kill()
+
+class PDFRangeExtractor:
+    """Estrazione pdfminer dei PDF digitali lunghi divisa per intervalli di pagine su più processi.
+
+    pdfminer usa un solo core: ogni processo estrae un intervallo contiguo di pagine (page_numbers)
+    e i testi sono riuniti nell'ordine delle pagine, con lo stesso risultato dell'estrazione seriale.
+    I documenti brevi restano seriali, perché l'avvio dei processi costerebbe più di quanto fa risparmiare.
+    """
+    # Pagine minime del documento per l'estrazione parallela e di ciascun intervallo
+    MIN_PAGES = 100
+    MIN_RANGE_PAGES = 20
+    # Intervalli per processo: più di uno compensa pagine di densità diversa
+    RANGES_PER_WORKER = 2
+
+    @staticmethod
+    def worker_count(workers=0):
+        """Processi da usare: workers se positivo, altrimenti uno per core"""
+        return workers if workers > 0 else (os.cpu_count() or 1)
+
+    @staticmethod
+    def page_ranges(total_pages, workers):
+        """Intervalli contigui di pagine (indici da 0) di dimensione simile, nell'ordine del documento"""
+        count = min(workers * PDFRangeExtractor.RANGES_PER_WORKER, total_pages // PDFRangeExtractor.MIN_RANGE_PAGES)
+        size = math.ceil(total_pages / max(1, count))
+        return [range(start, min(start + size, total_pages)) for start in range(0, total_pages, size)]
+
+    @staticmethod
+    def _extract_parallel(file_path, ranges, use_layout, workers):
+        """Distribuisce gli intervalli ai processi, uno alla volta per processo, e unisce i testi in ordine"""
+        processes = []
+        busy = set()
+        try:
+            for _ in range(workers):
+                processes.append(WorkerProcess("pdf"))
+            for process in processes:
+                process.connect()
+            pending = deque(enumerate(ranges))
+            texts = [None] * len(ranges)
+
+            def dispatch(conn):
+                index, pages = pending.popleft()
+                conn.send((index, {"file_path": file_path, "page_numbers": list(pages), "use_layout": use_layout}))
+                busy.add(conn)
+
+            for process in processes:
+                if pending:
+                    dispatch(process.conn)
+            while busy:
+                for conn in multiprocessing.connection.wait(list(busy)):
+                    busy.discard(conn)
+                    try:
+                        index, success, payload = conn.recv()
+                    except EOFError:
+                        raise OSError("processo di estrazione terminato") from None
+                    if not success:
+                        raise OSError(payload)
+                    texts[index] = payload
+                    if pending:
+                        dispatch(conn)
+            return ''.join(texts)
+        finally:
+            # Un processo ancora al lavoro (dopo un errore) viene terminato, gli altri chiudono da soli
+            for process in processes:
+                if process.conn in busy:
+                    process.kill()
+                elif process.conn is not None:
+                    try:
+                        process.conn.send(None)
+                    except OSError:
+                        pass
+                if process.conn is not None:
+                    process.conn.close()
+                process.join(10)
+                if process.is_alive():
+                    process.kill()
+                    process.join()
+
+    @staticmethod
+    def extract_text(file_path, use_layout=True, total_pages=None, workers=0):
+        """Estrae il testo con pdfminer, in parallelo se il documento ha almeno MIN_PAGES pagine.
+
+        total_pages viene dall'analisi preliminare del PDF: se manca l'estrazione è seriale.
+        """
+        workers = PDFRangeExtractor.worker_count(workers)
+        if workers > 1 and total_pages and total_pages >= PDFRangeExtractor.MIN_PAGES:
+            ranges = PDFRangeExtractor.page_ranges(total_pages, workers)
+            workers = min(workers, len(ranges))
+            try:
+                with Tracer.span("estrazione.pdfminer", layout=use_layout, processi=workers, intervalli=len(ranges)):
+                    text = PDFRangeExtractor._extract_parallel(file_path, ranges, use_layout, workers)
+                logger.info(f"Estrazione pdfminer di {total_pages} pagine in {len(ranges)} intervalli "
+                            f"su {workers} processi")
+                return text
+            except OSError as e:
+                # Anche un errore nel documento: l'estrazione seriale lo ripete con il suo tipo originale
+                logger.warning(f"Estrazione parallela non riuscita, ripiego su quella seriale: {str(e)}")
+        
+        with Tracer.span("estrazione.pdfminer", layout=use_layout):
+            return extract_range(file_path, None, use_layout)
+
+class OCRService:
+    """Processi OCR separati dalla GUI, con i modelli caricati una volta sola e riutilizzati.
+
+    easyocr/torch non occupano così la memoria dell'interfaccia e un crash del codice nativo OCR
+    termina solo il processo di lavoro, che viene riavviato e riceve di nuovo la pagina in corso.
+    Ogni processo viene sostituito dopo max_pages pagine, per tenere limitata la memoria residente.
+    Le pagine vengono distribuite tra i processi e il testo restituito in ordine, man mano che è pronto.
+    """
+    # Secondi massimi per una pagina prima di considerare bloccato il processo
+    PAGE_TIMEOUT = 600
+    # Tentativi per pagina dopo un crash del processo
+    MAX_RETRIES = 2
+
+    def __init__(self, workers=1, max_pages=200, languages=('it', 'en')):
+        self.worker_count = max(1, workers)
+        self.max_pages = max(1, max_pages)
+        self.languages = list(languages)
+        self._workers = [None] * self.worker_count
+        # Un documento alla volta: le pagine di un documento usano tutti i processi
+        self._lock = threading.Lock()
+
+    def _start(self, slot):
+        process = WorkerProcess("ocr", ",".join(self.languages))
+        # [processo, connessione, pagine elaborate, lavoro in corso, inizio del lavoro]
+        self._workers[slot] = [process, process.connect(), 0, None, 0.0]
+        logger.info(f"Processo OCR {slot} avviato (pid {process.pid})")
+
+    def _stop(self, slot, kill=False):
+        worker = self._workers[slot]
+        if worker is None:
+            return
+        process, conn = worker[0], worker[1]
+        try:
+            if not kill:
+                conn.send(None)
+        except (OSError, ValueError):
+            pass
+        process.join(0 if kill else 10)
+        if process.is_alive():
+            process.kill()
+            process.join()
+        conn.close()
+        self._workers[slot] = None
+
+    def _dispatch(self, slot, job_id, job):
+        worker = self._workers[slot]
+        if worker is None or not worker[0].is_alive():
+            self._start(slot)
+            worker = self._workers[slot]
+        elif worker[2] >= self.max_pages:
+            # Riciclo del processo per liberare la memoria accumulata
+            logger.info(f"Processo OCR {slot} riciclato dopo {worker[2]} pagine")
+            self._stop(slot)
+            self._start(slot)
+            worker = self._workers[slot]
+        worker[1].send((job_id, job))
+        worker[3] = (job_id, job)
+        worker[4] = time.monotonic()
+
+    def _busy_slots(self):
+        return [slot for slot, worker in enumerate(self._workers) if worker is not None and worker[3] is not None]
+
+    def _restart_job(self, slot, reason, retries):
+        """Riavvia un processo terminato o bloccato e gli riassegna la pagina che stava elaborando"""
+        process = self._workers[slot][0]
+        job_id, job = self._workers[slot][3]
+        self._stop(slot, kill=True)
+        logger.warning(f"Processo OCR {slot} {reason} (codice {process.exitcode}), "
+                       f"nuovo tentativo per la pagina {job_id + 1}")
+        retries[job_id] = retries.get(job_id, 0) + 1
+        if retries[job_id] > self.MAX_RETRIES:
+            raise RuntimeError(f"OCR della pagina {job_id + 1} fallito dopo {self.MAX_RETRIES} riavvii")
+        self._dispatch(slot, job_id, job)
+
+    def map(self, items):
+        """Restituisce (generatore) un testo per elemento, nell'ordine degli elementi.
+
+        Le stringhe passano invariate; i lavori di pagina (dict per PageOCR.recognize)
+        sono eseguiti nei processi, al più uno per processo alla volta.
+        """
+        with self._lock:
+            items = iter(items)
+            results = {}
+            queue = deque()
+            retries = {}
+            count = 0
+            next_index = 0
+            exhausted = False
+            try:
+                while True:
+                    # Legge in anticipo solo quanti lavori possono essere eseguiti subito
+                    while not exhausted and len(queue) + len(self._busy_slots()) < self.worker_count:
+                        try:
+                            item = next(items)
+                        except StopIteration:
+                            exhausted = True
+                            break
+                        if isinstance(item, str):
+                            results[count] = item
+                        else:
+                            queue.append((count, item))
+                        count += 1
+                    
+                    for slot, worker in enumerate(self._workers):
+                        if queue and (worker is None or worker[3] is None):
+                            self._dispatch(slot, *queue.popleft())
+                    
+                    while next_index in results:
+                        yield results.pop(next_index)
+                        next_index += 1
+                    
+                    busy = self._busy_slots()
+                    if not busy:
+                        if exhausted and not queue:
+                            return
+                        continue
+                    
+                    connections = {self._workers[slot][1]: slot for slot in busy}
+                    for conn in multiprocessing.connection.wait(list(connections), timeout=1.0):
+                        slot = connections[conn]
+                        worker = self._workers[slot]
+                        try:
+                            job_id, success, payload = conn.recv()
+                        except (EOFError, OSError):
+                            self._restart_job(slot, "terminato", retries)
+                            continue
+                        worker[2] += 1
+                        worker[3] = None
+                        # Il lavoro del processo OCR appare nella traccia come una riga a sé
+                        Tracer.record("ocr.pagina", int(worker[4] * 1e9), time.monotonic_ns(),
+                                      thread=f"processo OCR {slot}", pagina=job_id + 1)
+                        if not success:
+                            raise RuntimeError(f"OCR della pagina {job_id + 1} fallito: {payload}")
+                        results[job_id] = payload
+                    
+                    # Supervisione: i processi terminati o bloccati vengono riavviati
+                    now = time.monotonic()
+                    for slot in self._busy_slots():
+                        worker = self._workers[slot]
+                        if not worker[0].is_alive():
+                            self._restart_job(slot, "terminato", retries)
+                        elif now - worker[4] > self.PAGE_TIMEOUT:
+                            self._restart_job(slot, "bloccato", retries)
+            finally:
+                # Pagine ancora in corso (generatore chiuso o errore): le loro risposte non servono più
+                for slot in self._busy_slots():
+                    self._stop(slot, kill=True)
+
+    def shutdown(self):
+        for slot in range(self.worker_count):
+            self._stop(slot)
+
+class TextProcessor:
+    """Classe per elaborare i testi e dividerli in blocchi"""
+    # Da incrementare quando cambia il testo prodotto dagli estrattori, per invalidare la cache
+    EXTRACTOR_VERSION = 8
+
+    @staticmethod
+    @Tracer.traced("estrazione.documento")
+    def extract_text_from_file(file_path, remove_boilerplate=True, ocr_preset="bilanciato", ocr_cache=None,
+                               extraction_cache=None, progress_tracker=None, ocr_service=None, pdf_workers=0,
+                               clean_text=True):
+        """Estrae il testo da file di diverso formato.
+
+        Con remove_boilerplate i PDF vengono ripuliti dalle righe ripetute su ogni pagina
+        (intestazioni, piè di pagina, numeri di pagina) prima della divisione in blocchi.
+        Con clean_text il testo dei PDF passa per TextCleaner (trattini a fine riga, a capo, rumore OCR).
+        ocr_preset sceglie il compromesso qualità/velocità dell'OCR (vedi OCRPreprocessor.PRESETS).
+        ocr_cache (OCRPageCache o None) evita di ripetere l'OCR sulle pagine già elaborate.
+        extraction_cache (ExtractionCache o None) restituisce subito il testo dei documenti già aperti.
+        progress_tracker (ProgressTracker o None) riceve l'avanzamento per file e per pagina OCR,
+        insieme al testo di ogni pagina OCR appena pronta.
+        ocr_service (OCRService o None) esegue l'OCR in processi separati invece che nel processo corrente.
+        pdf_workers sono i processi per l'estrazione pdfminer dei PDF lunghi (0 = uno per core).
+        """
+        file_name = os.path.basename(file_path)
+        if progress_tracker:
+            progress_tracker.set_total(ProgressTracker.STAGE_EXTRACTION, file_name, 1)
+        
+        options = {"remove_boilerplate": remove_boilerplate, "ocr_preset": ocr_preset, "clean_text": clean_text}
+        cache_key = None
+        if extraction_cache:
+            try:
+                cache_key = extraction_cache.make_key(file_path, options)
+                cached_text = extraction_cache.get(cache_key)
+                if cached_text is not None:
+                    logger.info(f"Testo letto dalla cache di estrazione: {file_name}")
+                    if progress_tracker:
+                        progress_tracker.advance(ProgressTracker.STAGE_EXTRACTION, file_name)
+                    return cached_text
+            except OSError as e:
+                logger.warning(f"Cache di estrazione non disponibile: {str(e)}")
+        
+        # Unico punto di normalizzazione del testo estratto, per tutti i formati
+        text = Document.normalize(TextProcessor._extract_text(file_path, remove_boilerplate, ocr_preset, ocr_cache,
+                                                              progress_tracker, ocr_service, pdf_workers, clean_text))
+        
+        if cache_key:
+            extraction_cache.put(cache_key, text)
+            extraction_cache.prune()
+        if progress_tracker:
+            progress_tracker.advance(ProgressTracker.STAGE_EXTRACTION, file_name)
+        return text
+    
+    @staticmethod
+    def _extract_text(file_path, remove_boilerplate, ocr_preset, ocr_cache, progress_tracker=None, ocr_service=None,
+                      pdf_workers=0, clean_text=True):
+        """Esegue l'estrazione vera e propria, senza cache"""
+        _, ext = os.path.splitext(file_path)
+        
+        try:
+            if ext.lower() == '.txt':
+                # Rileva automaticamente l'encoding
+                with open(file_path, 'rb') as f:
+                    raw_data = f.read()
+                    encoding = chardet.detect(raw_data)['encoding'] or 'utf-8'  # Fallback a UTF-8
+                
+                # Usa codecs per una migliore gestione degli encoding
+                with codecs.open(file_path, 'r', encoding=encoding, errors='replace') as file:
+                    return file.read()
+                
+            elif ext.lower() == '.docx':
+                try:
+                    return DocxStreamExtractor.extract_text(file_path)
+                except (zipfile.BadZipFile, KeyError, expat.ExpatError) as e:
+                    # Pacchetto non standard: ripiega su python-docx (solo paragrafi del corpo)
+                    logger.warning(f"Estrazione a flusso del .docx fallita, uso python-docx: {str(e)}")
+                
+                doc = docx.Document(file_path)
+                return '\n'.join(paragraph.text for paragraph in doc.paragraphs if paragraph.text)
+                
+            elif ext.lower() == '.pdf':
+                # Analisi rapida delle pagine campione: i documenti scansionati passano subito all'OCR
+                triage = PDFTriage.probe(file_path)
+                if triage:
+                    logger.info(f"Analisi PDF: {triage['text_pages']}/{triage['sampled']} pagine campione con testo, "
+                                f"layout a colonne: {'sì' if triage['needs_layout'] else 'no'}")
+                
+                # Controllo iniziale con metodo tradizionale 
+                if triage and triage["scanned"]:
+                    logger.info("Nessuno strato di testo nelle pagine campione, passaggio diretto a OCR")
+                else:
+                    try:
+                        # Tenta prima con pdfminer per documenti digitali con specifiche UTF-8;
+                        # l'analisi del layout serve solo per ricostruire l'ordine di lettura su più colonne.
+                        # I documenti lunghi sono divisi per intervalli di pagine tra più processi
+                        text = PDFRangeExtractor.extract_text(
+                            file_path,
+                            use_layout=triage is None or triage["needs_layout"],
+                            total_pages=triage["pages"] if triage else None,
+                            workers=pdf_workers,
+                        )
+                    
+                        # pdfminer separa le pagine con un form feed
+                        if remove_boilerplate:
+                            text = '\f'.join(BoilerplateFilter.remove_repeated_lines(text.split('\f')))
+                        if clean_text:
+                            text = TextCleaner.clean(text)
+
+                        # Se il testo sembra valido e contiene più di 100 caratteri, usalo
+                        if text and len(text) > 100:
+                            logger.info("Testo estratto con successo utilizzando pdfminer con encoding UTF-8")
+                            return text
+                        else:
+                            # Se il testo è scarso, passa all'OCR
+                            logger.info("Testo insufficiente con pdfminer, passaggio a OCR")
+                            raise ValueError("Testo insufficiente, provo con OCR")
+                    except Exception as e:
+                        logger.warning(f"Estrazione tradizionale fallita: {str(e)}")
+                        # Procedi con OCR
+                        pass
+                    
+                # Usa easyOCR per l'estrazione tramite OCR
+                logger.info("Inizio estrazione OCR con easyOCR")
+                
+                full_text = list(TextProcessor.ocr_pages(file_path, ocr_preset, cache=ocr_cache,
+                                                         progress_tracker=progress_tracker, service=ocr_service))
+                
+                if remove_boilerplate:
+                    full_text = BoilerplateFilter.remove_repeated_lines(full_text)
+
+                # Unisci il testo di tutte le pagine con un form feed, come pdfminer, per la pagina dei blocchi
+                final_text = '\n\f'.join(full_text)
+                
+                # Post-processing del testo
+                if clean_text:
+                    final_text = TextCleaner.clean(final_text)
+                else:
+                    final_text = re.sub(r' {2,}', ' ', final_text)  # Riduci spazi multipli
+                
+                logger.info(f"Estrazione OCR completata: {len(final_text)} caratteri estratti")
+                return final_text
+                
+            else:
+                raise ValueError(f"Formato file non supportato: {ext}")
+                
+        except Exception as e:
+            logger.error(f"Errore nell'estrazione del testo: {str(e)}")
+            raise
+    
+    @staticmethod
+    def ocr_pages(file_path, ocr_preset="bilanciato", reader=None, cache=None, progress_tracker=None, service=None):
+        """Esegue l'OCR di un PDF pagina per pagina, restituendo (generatore) il testo di ogni pagina.
+
+        Con una OCRPageCache le pagine già viste vengono lette dalla cache e il modello OCR
+        viene caricato solo se almeno una pagina deve essere elaborata. Con un OCRService le
+        pagine sono elaborate nei processi OCR separati invece che nel processo corrente.
+        """
+        languages = ['it', 'en']
+        preset = OCRPreprocessor.PRESETS.get(ocr_preset, OCRPreprocessor.PRESETS["bilanciato"])
+        fingerprints = OCRPageCache.page_fingerprints(file_path) if cache else None
+        total_pages = len(fingerprints) if fingerprints else pdfinfo_from_path(file_path)["Pages"]
+        file_name = os.path.basename(file_path)
+        cache_hits = 0
+        keys = {}
+        if progress_tracker:
+            progress_tracker.set_total(ProgressTracker.STAGE_OCR, file_name, total_pages)
+        
+        def page_items():
+            # Testo dalla cache (stringa) oppure lavoro di OCR della pagina (dict)
+            nonlocal cache_hits
+            dpi = None
+            for page_number in range(1, total_pages + 1):
+                if fingerprints:
+                    key = cache.make_key(fingerprints[page_number - 1], languages, preset)
+                    cached_text = cache.get(key)
+                    if cached_text is not None:
+                        cache_hits += 1
+                        logger.info(f"Pagina {page_number}/{total_pages} letta dalla cache OCR")
+                        yield cached_text
+                        continue
+                    keys[page_number] = key
+                
+                if dpi is None:
+                    dpi = OCRPreprocessor.estimate_dpi(file_path, total_pages, preset)
+                    logger.info(f"Conversione PDF in immagini a {dpi} dpi (preset {ocr_preset})...")
+                
+                yield {
+                    "file_path": file_path,
+                    "page_number": page_number,
+                    "total_pages": total_pages,
+                    "dpi": dpi,
+                    "preset": ocr_preset,
+                    "languages": languages,
+                    # Senza impronta dal contenuto PDF la cache usa i pixel della pagina, visti solo da chi la rasterizza
+                    "cache": ((cache.cache_dir, cache.max_bytes / (1024 * 1024), cache.max_age / (24 * 3600))
+                              if cache and not fingerprints else None),
+                }
+        
+        if service is not None:
+            texts = service.map(page_items())
+        else:
+            def get_reader():
+                # Inizializza il lettore OCR per italiano e inglese
+                # Nota: al primo avvio scaricherà i modelli (può richiedere tempo)
+                nonlocal reader
+                if reader is None:
+                    reader = easyocr.Reader(languages, gpu=False)
+                return reader
             
-        # Dividi il testo in frasi (con riconoscimento di più tipi di punteggiatura)
-        sentences = re.split(r'(?<=[.!?:])\s+', text.strip())
+            texts = (item if isinstance(item, str) else PageOCR.recognize(item, get_reader, cache, Tracer.span)
+                     for item in page_items())
         
-        blocks = []
+        for page_number, page_text in enumerate(texts, 1):
+            if page_number in keys:
+                cache.put(keys[page_number], page_text)
+            if progress_tracker:
+                # Il testo della pagina è subito disponibile all'interfaccia, prima della fine dell'OCR
+                progress_tracker.add_partial(ProgressTracker.STAGE_OCR, file_name, page_text)
+                progress_tracker.advance(ProgressTracker.STAGE_OCR, file_name)
+            yield page_text
+        
+        if cache:
+            logger.info(f"Cache OCR: {cache_hits}/{total_pages} pagine riutilizzate")
+            cache.prune()
+    
+    # Separatore di frase (con riconoscimento di più tipi di punteggiatura)
+    SENTENCE_SPLIT = re.compile(r'(?<=[.!?:])\s+')
+    # Lunghezza massima di una frase incompleta in attesa del pezzo successivo, nel testo a flusso
+    MAX_PENDING_CHARS = 1024 * 1024
+
+    @staticmethod
+    def block_hash(block):
+        """Hash compatto di un blocco, usato per riconoscere i blocchi identici"""
+        return hashlib.blake2b(block.encode('utf-8', errors='replace'), digest_size=16).hexdigest()
+
+    @staticmethod
+    def _iter_sentences(chunks):
+        """Divide in frasi un testo ricevuto a pezzi, come re.split sul testo intero"""
+        pending = ""
+        for chunk in chunks:
+            buffer = pending + chunk
+            if not pending:
+                buffer = buffer.lstrip()
+            sentences = TextProcessor.SENTENCE_SPLIT.split(buffer)
+            # L'ultima frase potrebbe continuare nel pezzo successivo
+            pending = sentences.pop()
+            if len(pending) > TextProcessor.MAX_PENDING_CHARS:
+                # Testo senza punteggiatura: spezza sull'ultimo spazio per limitare la memoria
+                cut = pending.rfind(' ') + 1 or len(pending)
+                sentences.append(pending[:cut].rstrip())
+                pending = pending[cut:]
+            yield from sentences
+        pending = pending.rstrip()
+        if pending:
+            yield pending
+
+    @staticmethod
+    def _pack_sentences(sentences, max_words=80):
+        """Raggruppa le frasi in blocchi di al più max_words parole"""
         current_block = ""
         current_word_count = 0
         
@@ -311,7 +2654,7 @@ class TextProcessor:
             
             # Se aggiungere questa frase supererebbe il limite e il blocco corrente non è vuoto
             if current_word_count + sentence_words > max_words and current_word_count > 0:
-                blocks.append(current_block.strip())
+                yield current_block.strip()
                 current_block = sentence
                 current_word_count = sentence_words
             else:
@@ -320,10 +2663,656 @@ class TextProcessor:
         
         # Aggiungi l'ultimo blocco se non è vuoto
         if current_block:
-            blocks.append(current_block.strip())
-            
+            yield current_block.strip()
+    
+    @staticmethod
+    def iter_blocks(chunks, max_words=80):
+        """Versione a flusso di split_into_blocks: riceve il testo a pezzi e produce i blocchi man mano"""
+        return TextProcessor._pack_sentences(TextProcessor._iter_sentences(chunks), max_words)
+    
+    @staticmethod
+    def split_into_blocks(text, max_words=80):
+        """Divide il testo in blocchi di massimo 500 parole, rispettando frasi e parole"""
+        if not text:
+            return []
+        return list(Document.from_text(text, max_words))
+
+class Document:
+    """Modello canonico di un testo: normalizzato una sola volta, con pagine e blocchi come offset.
+
+    I blocchi non sono copie del testo ma intervalli [inizio, fine) nel testo sorgente, con
+    l'hash di ciascun blocco calcolato una volta alla costruzione. Il documento si comporta come
+    una sequenza di blocchi, così lo stesso oggetto passa dalla divisione in blocchi ai worker,
+    alle tab dei risultati e all'esportazione.
+    """
+    __slots__ = ("text", "max_words", "page_starts", "block_starts", "block_ends", "_hashes")
+
+    SURROGATES = re.compile('[\ud800-\udfff]')
+    WORD = re.compile(r'\w+')
+    HASH_SIZE = 16
+
+    def __init__(self, text, block_spans, max_words=80):
+        """text deve essere già normalizzato; block_spans sono le coppie (inizio, fine) dei blocchi"""
+        self.text = text
+        self.max_words = max_words
+        # pdfminer separa le pagine con un form feed: ogni pagina inizia dopo il precedente
+        self.page_starts = array('q', [0])
+        self.page_starts.extend(match.end() for match in re.finditer('\f', text))
+        self.block_starts = array('q', (start for start, _ in block_spans))
+        self.block_ends = array('q', (end for _, end in block_spans))
+        digests = bytearray()
+        for index in range(len(self.block_starts)):
+            digests += hashlib.blake2b(self[index].encode('utf-8'), digest_size=self.HASH_SIZE).digest()
+        self._hashes = bytes(digests)
+
+    @staticmethod
+    def normalize(text):
+        """Normalizzazione unica all'ingresso: NFC e surrogati isolati sostituiti da '?'.
+
+        Il testo già normalizzato (il caso comune) viene solo letto, senza copie.
+        """
+        if not unicodedata.is_normalized('NFC', text):
+            text = unicodedata.normalize('NFC', text)
+        if Document.SURROGATES.search(text):
+            text = Document.SURROGATES.sub('?', text)
+        return text
+
+    @staticmethod
+    def sentence_spans(text):
+        """Intervalli delle frasi del testo, come TextProcessor._iter_sentences sul testo intero"""
+        position = len(text) - len(text.lstrip())
+        end = len(text.rstrip())
+        spans = []
+        if position >= end:
+            return spans
+        for match in TextProcessor.SENTENCE_SPLIT.finditer(text, position, end):
+            spans.append((position, match.start()))
+            position = match.end()
+        spans.append((position, end))
+        return spans
+
+    @staticmethod
+    def _pack_spans(text, sentences, max_words):
+        """Raggruppa gli intervalli delle frasi in blocchi, come TextProcessor._pack_sentences"""
+        blocks = []
+        block_start = block_end = None
+        word_count = 0
+        for start, end in sentences:
+            sentence_words = len(Document.WORD.findall(text, start, end))
+            if word_count + sentence_words > max_words and word_count > 0:
+                blocks.append((block_start, block_end))
+                block_start = None
+                word_count = 0
+            if block_start is None:
+                block_start = start
+            block_end = end
+            word_count += sentence_words
+        if block_start is not None:
+            blocks.append((block_start, block_end))
         return blocks
 
+    @classmethod
+    @Tracer.traced("testo.divisione")
+    def from_text(cls, text, max_words=80, previous=None):
+        """Costruisce il documento normalizzando il testo una sola volta.
+
+        Con previous (il Document della divisione precedente) i blocchi precedenti le cui frasi
+        compaiono invariate e consecutive nel nuovo testo restano identici; solo le frasi nuove o
+        modificate tra due blocchi mantenuti vengono raggruppate in nuovi blocchi. Così una modifica
+        locale non sposta i confini dei blocchi successivi.
+        """
+        text = cls.normalize(text or "")
+        sentences = cls.sentence_spans(text)
+        if not previous or previous.max_words != max_words:
+            return cls(text, cls._pack_spans(text, sentences, max_words), max_words)
+        
+        # Frasi dei blocchi precedenti, con l'intervallo di frasi occupato da ciascun blocco
+        old_sentences = []
+        old_ranges = []
+        for index in range(len(previous)):
+            block_start = previous.block_starts[index]
+            block_sentences = [previous.text[block_start + start:block_start + end] for start, end
+                               in cls.sentence_spans(previous.text[block_start:previous.block_ends[index]])]
+            old_ranges.append((len(old_sentences), len(old_sentences) + len(block_sentences)))
+            old_sentences.extend(block_sentences)
+        new_sentences = [text[start:end] for start, end in sentences]
+        
+        matches = difflib.SequenceMatcher(None, old_sentences, new_sentences, autojunk=False).get_matching_blocks()
+        
+        # Un blocco precedente è mantenuto se tutte le sue frasi cadono in un unico tratto invariato
+        kept = []
+        m = 0
+        for start, end in old_ranges:
+            while m < len(matches) and matches[m].a + matches[m].size < end:
+                m += 1
+            if end > start and m < len(matches) and matches[m].a <= start:
+                new_start = matches[m].b + (start - matches[m].a)
+                kept.append((new_start, new_start + end - start))
+        
+        blocks = []
+        position = 0
+        for new_start, new_end in kept:
+            blocks.extend(cls._pack_spans(text, sentences[position:new_start], max_words))
+            blocks.append((sentences[new_start][0], sentences[new_end - 1][1]))
+            position = new_end
+        blocks.extend(cls._pack_spans(text, sentences[position:], max_words))
+        return cls(text, blocks, max_words)
+
+    def __len__(self):
+        return len(self.block_starts)
+
+    def __bool__(self):
+        return len(self.block_starts) > 0
+
+    def __getitem__(self, index):
+        """Testo del blocco: le frasi dell'intervallo unite da un solo spazio"""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        span = self.text[self.block_starts[index]:self.block_ends[index]]
+        return TextProcessor.SENTENCE_SPLIT.sub(" ", span)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def block_hash(self, index):
+        """Hash del blocco, uguale a TextProcessor.block_hash sul suo testo"""
+        if index < 0:
+            index += len(self)
+        return self._hashes[index * self.HASH_SIZE:(index + 1) * self.HASH_SIZE].hex()
+
+    def block_hashes(self):
+        return [self.block_hash(index) for index in range(len(self))]
+
+    def block_page(self, index):
+        """Numero di pagina (da 1) in cui inizia il blocco"""
+        return bisect.bisect_right(self.page_starts, self.block_starts[index])
+
+    def block_span(self, index):
+        """Offset (inizio, fine) del blocco nel testo sorgente"""
+        return self.block_starts[index], self.block_ends[index]
+
+class LargeTextFile:
+    """File di testo molto grande, letto tramite mmap e decodificato in modo incrementale"""
+    CHUNK_SIZE = 1024 * 1024
+    # Byte campionati per rilevare l'encoding dei file che non sono UTF-8
+    SAMPLE_SIZE = 64 * 1024
+    # Sotto questa confidenza di chardet si usa cp1252, l'encoding più comune dei testi italiani non UTF-8
+    MIN_CONFIDENCE = 0.3
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.size = os.path.getsize(file_path)
+        self.encoding = LargeTextFile.detect_encoding(file_path)
+
+    @staticmethod
+    def detect_encoding(file_path):
+        """UTF-8 se tutto il file lo è, altrimenti l'encoding rilevato da chardet dove UTF-8 fallisce.
+
+        Un campione iniziale non basta: su un inizio in puro ASCII chardet risponde "ascii" e i
+        caratteri UTF-8 più avanti diventerebbero U+FFFD. La verifica a pezzi usa poca memoria.
+        """
+        # utf-8-sig accetta anche i file senza BOM e, se c'è, lo rimuove
+        decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        offset = 0
+        with open(file_path, 'rb') as f:
+            while True:
+                chunk = f.read(LargeTextFile.CHUNK_SIZE)
+                try:
+                    decoder.decode(chunk, final=not chunk)
+                except UnicodeDecodeError as e:
+                    # Campione dal primo byte non valido (meno gli eventuali byte di un carattere a cavallo)
+                    f.seek(max(0, offset + e.start - 4))
+                    detected = chardet.detect(f.read(LargeTextFile.SAMPLE_SIZE))
+                    encoding = detected['encoding']
+                    # "ascii" qui non può essere: c'è almeno un byte non ASCII
+                    if (not encoding or encoding.lower() == 'ascii'
+                            or (detected['confidence'] or 0) < LargeTextFile.MIN_CONFIDENCE):
+                        return 'cp1252'
+                    return encoding
+                if not chunk:
+                    return 'utf-8-sig'
+                offset += len(chunk)
+
+    def iter_text(self, max_chars=None):
+        """Restituisce il testo a pezzi, normalizzato NFC, senza caricare il file in memoria"""
+        if self.size == 0:
+            return
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+        pending = ""
+        produced = 0
+        with open(self.file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for offset in range(0, self.size, self.CHUNK_SIZE):
+                final = offset + self.CHUNK_SIZE >= self.size
+                text = pending + decoder.decode(mm[offset:offset + self.CHUNK_SIZE], final=final)
+                if not final:
+                    # Trattiene l'ultimo carattere base con i suoi segni combinanti:
+                    # la normalizzazione NFC deve vederli insieme
+                    cut = len(text)
+                    while cut > 0 and unicodedata.combining(text[cut - 1]):
+                        cut -= 1
+                    cut = max(cut - 1, 0)
+                    text, pending = text[:cut], text[cut:]
+                text = Document.normalize(text)
+                if max_chars is not None and produced + len(text) >= max_chars:
+                    yield text[:max_chars - produced]
+                    return
+                produced += len(text)
+                yield text
+
+    def preview(self, max_chars=200000):
+        """Primi caratteri del file, da mostrare nell'editor"""
+        return "".join(self.iter_text(max_chars))
+
+class StreamedBlocks:
+    """Sequenza di blocchi di un LargeTextFile, generata dal disco a ogni iterazione"""
+    def __init__(self, large_file, max_words=80):
+        self.large_file = large_file
+        self.max_words = max_words
+        self._count = None
+
+    def __iter__(self):
+        return TextProcessor.iter_blocks(self.large_file.iter_text(), self.max_words)
+
+    def __len__(self):
+        if self._count is None:
+            self._count = sum(1 for _ in self)
+        return self._count
+
+    def __bool__(self):
+        return self.large_file.size > 0
+
+class LargeFileLoadThread(QThread):
+    """Thread che prepara un file di testo di grandi dimensioni: anteprima e conteggio dei blocchi"""
+    resultReady = pyqtSignal(object, str)
+    errorOccurred = pyqtSignal(str)
+
+    def __init__(self, file_path):
+        super().__init__()
+        self.file_path = file_path
+
+    def run(self):
+        try:
+            large_file = LargeTextFile(self.file_path)
+            blocks = StreamedBlocks(large_file)
+            # Il conteggio viene calcolato qui, lontano dal thread dell'interfaccia
+            len(blocks)
+            self.resultReady.emit(blocks, large_file.preview())
+        except Exception as e:
+            self.errorOccurred.emit(str(e))
+
+class ResultExporter:
+    """Esportazione dei risultati di tutte le modalità in TXT, DOCX, JSONL o ZIP.
+
+    Ogni formato viene scritto a flusso, blocco per blocco, senza costruire in memoria
+    il testo completo di una modalità.
+    """
+    FORMATS = ("txt", "docx", "jsonl", "zip")
+    # Caratteri non ammessi in XML 1.0 (es. il form feed che pdfminer usa tra le pagine)
+    INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+    DOCX_CONTENT_TYPES = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        '</Types>'
+    )
+    DOCX_RELATIONSHIPS = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="word/document.xml"/>'
+        '</Relationships>'
+    )
+    DOCX_DOCUMENT_START = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+    )
+    DOCX_DOCUMENT_END = '</w:body></w:document>'
+
+    @staticmethod
+    def write_txt(stream, blocks):
+        """Scrive i blocchi non vuoti separati da una riga vuota, come nelle tab dei risultati"""
+        first = True
+        for block in blocks:
+            if not block:
+                continue
+            if not first:
+                stream.write("\n\n")
+            stream.write(block)
+            first = False
+
+    @staticmethod
+    def _docx_paragraph(line):
+        runs = []
+        for i, part in enumerate(ResultExporter.INVALID_XML_CHARS.sub('', line).split('\t')):
+            if i:
+                runs.append('<w:tab/>')
+            if part:
+                runs.append(f'<w:t xml:space="preserve">{xml_escape(part)}</w:t>')
+        return f'<w:p><w:r>{"".join(runs)}</w:r></w:p>'
+
+    @staticmethod
+    def write_docx(binary_stream, blocks):
+        """Scrive un .docx minimale ricostruendo un paragrafo per ogni riga non vuota"""
+        with zipfile.ZipFile(binary_stream, 'w', zipfile.ZIP_DEFLATED) as package:
+            package.writestr("[Content_Types].xml", ResultExporter.DOCX_CONTENT_TYPES)
+            package.writestr("_rels/.rels", ResultExporter.DOCX_RELATIONSHIPS)
+            with package.open("word/document.xml", 'w') as raw:
+                raw.write(ResultExporter.DOCX_DOCUMENT_START.encode('utf-8'))
+                for block in blocks:
+                    for line in (block or "").split('\n'):
+                        if line.strip():
+                            raw.write(ResultExporter._docx_paragraph(line).encode('utf-8'))
+                raw.write(ResultExporter.DOCX_DOCUMENT_END.encode('utf-8'))
+
+    @staticmethod
+    def write_jsonl(stream, results, source_blocks):
+        """Una riga JSON per blocco con modalità, indice, testo originale e risultato.
+
+        Per le modalità con un risultato per documento (riassunto) il testo originale è null.
+        Se i blocchi sorgente sono un Document, ogni riga riporta anche offset del blocco e, quando il
+        sorgente ha interruzioni di pagina, la sua pagina.
+        """
+        source_count = len(source_blocks)
+        document = source_blocks if isinstance(source_blocks, Document) else None
+        for option, blocks in results.items():
+            sources = iter(source_blocks) if len(blocks) == source_count else None
+            for index, result in enumerate(blocks):
+                record = {
+                    "modalita": option,
+                    "indice": index,
+                    "originale": next(sources) if sources else None,
+                    "risultato": result,
+                }
+                if document is not None and sources:
+                    # Senza interruzioni di pagina nel sorgente (testo, Word) la pagina non è nota
+                    if len(document.page_starts) > 1:
+                        record["pagina"] = document.block_page(index)
+                    record["inizio"], record["fine"] = document.block_span(index)
+                stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    @staticmethod
+    @Tracer.traced("esportazione.risultati")
+    def export(results, source_blocks, base_path, export_format):
+        """Esporta tutte le modalità e restituisce l'elenco dei file scritti"""
+        root, _ = os.path.splitext(base_path)
+        written = []
+
+        if export_format == "txt":
+            for option, blocks in results.items():
+                path = f"{root}_{option}.txt"
+                with open(path, 'w', encoding='utf-8', errors='replace') as f:
+                    ResultExporter.write_txt(f, blocks)
+                written.append(path)
+        elif export_format == "docx":
+            for option, blocks in results.items():
+                path = f"{root}_{option}.docx"
+                with open(path, 'wb') as f:
+                    ResultExporter.write_docx(f, blocks)
+                written.append(path)
+        elif export_format == "jsonl":
+            path = f"{root}.jsonl"
+            with open(path, 'w', encoding='utf-8', errors='replace') as f:
+                ResultExporter.write_jsonl(f, results, source_blocks)
+            written.append(path)
+        elif export_format == "zip":
+            path = f"{root}.zip"
+            name = os.path.basename(root)
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as bundle:
+                for option, blocks in results.items():
+                    with bundle.open(f"{name}_{option}.txt", 'w') as raw:
+                        with io.TextIOWrapper(raw, encoding='utf-8', errors='replace') as f:
+                            ResultExporter.write_txt(f, blocks)
+                    with bundle.open(f"{name}_{option}.docx", 'w') as raw:
+                        ResultExporter.write_docx(raw, blocks)
+                with bundle.open(f"{name}.jsonl", 'w') as raw:
+                    with io.TextIOWrapper(raw, encoding='utf-8', errors='replace') as f:
+                        ResultExporter.write_jsonl(f, results, source_blocks)
+            written.append(path)
+        else:
+            raise ValueError(f"Formato di esportazione non supportato: {export_format}")
+        return written
+
+class ExportThread(QThread):
+    """Thread per l'esportazione dei risultati senza bloccare l'interfaccia"""
+    exportFinished = pyqtSignal(list)
+    errorOccurred = pyqtSignal(str)
+
+    def __init__(self, results, source_blocks, base_path, export_format):
+        super().__init__()
+        self.results = results
+        self.source_blocks = source_blocks
+        self.base_path = base_path
+        self.export_format = export_format
+
+    def run(self):
+        try:
+            self.exportFinished.emit(
+                ResultExporter.export(self.results, self.source_blocks, self.base_path, self.export_format))
+        except Exception as e:
+            self.errorOccurred.emit(str(e))
+
+class ThemeStyles:
+    """Foglio di stile unico dell'applicazione, costruito una volta per tema e riutilizzato.
+
+    Gli stati dei widget (area di drop sotto trascinamento, tipo di stato, pulsante primario)
+    sono proprietà dinamiche selezionate nel foglio di stile: cambiarli richiede solo di
+    ricalcolare lo stile del widget interessato, non di ricostruire o riassegnare fogli di stile.
+    """
+    LIGHT = {
+        "surface": "#FFFFFF",
+        "text": "#333333",
+        "border": "#E0E0E0",
+        "scroll_track": "#F5F5F5",
+        "scroll_handle": "#CCCCCC",
+        "menu_bar": "#F5F5F5",
+        "tab": "#F5F5F5",
+        "tab_text": "#333333",
+        "tab_hover": "#E8F0FE",
+    }
+    DARK = {
+        "surface": "#2D2D30",
+        "text": "#FFFFFF",
+        "border": "#3F3F46",
+        "scroll_track": "#3F3F46",
+        "scroll_handle": "#686868",
+        "menu_bar": "#252525",
+        "tab": "#2D2D30",
+        "tab_text": "#CCCCCC",
+        "tab_hover": "#383838",
+    }
+    # Colori dell'indicatore di stato: sfondo, testo, bordo
+    STATUS_COLORS = {
+        "success": ("#E8F5E9", "#2E7D32", "#C8E6C9"),
+        "error": ("#FFEBEE", "#C62828", "#FFCDD2"),
+        "warning": ("#FFF8E1", "#F57F17", "#FFECB3"),
+        "info": ("#E1F5FE", "#0277BD", "#B3E5FC"),
+        "neutral": ("#F5F5F5", "#616161", "#E0E0E0"),
+    }
+    CHECK_ICON = ("data:image/svg+xml;base64,PHN2ZyB4bWxucz0iaHR0cDovL3d3dy53My5vcmcvMjAwMC9zdmciIHdpZHRoPSIxNiIgaGVpZ2h0"
+                  "PSIxNiIgdmlld0JveD0iMCAwIDI0IDI0IiBmaWxsPSJub25lIiBzdHJva2U9IiNGRkZGRkYiIHN0cm9rZS13aWR0aD0iMyIgc3Ryb2tl"
+                  "LWxpbmVjYXA9InJvdW5kIiBzdHJva2UtbGluZWpvaW49InJvdW5kIiBjbGFzcz0ibHVjaWRlIGx1Y2lkZS1jaGVjayI+PHBhdGggZD0i"
+                  "TTIwIDZMOSAxN2wtNS01Ii8+PC9zdmc+")
+    TEMPLATE = string.Template("""
+        ModernButton {
+            border-radius: 6px;
+            padding: 10px 20px;
+            font-family: 'Segoe UI';
+            font-weight: bold;
+            background-color: #FFFFFF;
+            color: #3D5AFE;
+            border: 1px solid #3D5AFE;
+        }
+        ModernButton:hover {
+            background-color: #F5F7FF;
+        }
+        ModernButton:pressed {
+            padding-top: 12px;
+            background-color: #E8F0FE;
+        }
+        ModernButton[primary="true"] {
+            background-color: #3D5AFE;
+            color: white;
+            border: none;
+        }
+        ModernButton[primary="true"]:hover {
+            background-color: #536DFE;
+        }
+        ModernButton[primary="true"]:pressed {
+            background-color: #304FFE;
+        }
+        ModernButton:disabled, ModernButton[primary="true"]:disabled {
+            background-color: #DDDDDD;
+            color: #999999;
+            border: none;
+        }
+        OptionCheckBox {
+            spacing: 8px;
+        }
+        OptionCheckBox::indicator {
+            width: 20px;
+            height: 20px;
+            border-radius: 4px;
+            border: 2px solid #C0C0C0;
+        }
+        OptionCheckBox::indicator:unchecked:hover {
+            border: 2px solid #3D5AFE;
+        }
+        OptionCheckBox::indicator:checked {
+            background-color: #3D5AFE;
+            border: 2px solid #3D5AFE;
+            image: url($check_icon);
+        }
+        ModernProgressBar {
+            border: none;
+            background-color: #F0F0F0;
+            border-radius: 3px;
+        }
+        ModernProgressBar::chunk {
+            background-color: #3D5AFE;
+            border-radius: 3px;
+        }
+        ModernTextEdit {
+            background-color: $surface;
+            color: $text;
+            border: 1px solid $border;
+            border-radius: 6px;
+            padding: 12px;
+            selection-background-color: #3D5AFE;
+            selection-color: white;
+        }
+        ModernTextEdit QScrollBar:vertical {
+            border: none;
+            background: $scroll_track;
+            width: 10px;
+            border-radius: 5px;
+            margin: 0px;
+        }
+        ModernTextEdit QScrollBar::handle:vertical {
+            background: $scroll_handle;
+            border-radius: 5px;
+            min-height: 20px;
+        }
+        ModernTextEdit QScrollBar::add-line:vertical, ModernTextEdit QScrollBar::sub-line:vertical {
+            border: none;
+            background: none;
+            height: 0px;
+        }
+        DropTextEdit {
+            border: 2px dashed #CCCCCC;
+        }
+        DropTextEdit[dragHover="true"] {
+            border: 2px dashed #3D5AFE;
+        }
+        ModernLineEdit {
+            background-color: $surface;
+            color: $text;
+            border: 1px solid $border;
+            border-radius: 6px;
+            padding: 8px 12px;
+            selection-background-color: #3D5AFE;
+            selection-color: white;
+        }
+        ModernCard {
+            background-color: $surface;
+            border: 1px solid $border;
+            border-radius: 8px;
+        }
+        ModernCard QLabel {
+            color: $text;
+        }
+        StatusIndicator {
+            border-radius: 14px;
+            padding: 2px 16px;
+        }
+        $status_rules
+        QMenuBar {
+            background-color: $menu_bar;
+            color: $text;
+        }
+        QMenuBar::item {
+            background-color: transparent;
+        }
+        QMenuBar::item:selected, QMenu::item:selected {
+            background-color: #3D5AFE;
+            color: #FFFFFF;
+        }
+        QMenu {
+            background-color: $surface;
+            color: $text;
+            border: 1px solid $border;
+        }
+        QTabWidget#outputTabs::pane {
+            border: none;
+            background: transparent;
+        }
+        QTabWidget#outputTabs QTabBar::tab {
+            background: $tab;
+            color: $tab_text;
+            border: 1px solid $border;
+            border-bottom: none;
+            border-top-left-radius: 4px;
+            border-top-right-radius: 4px;
+            padding: 8px 12px;
+            margin-right: 2px;
+        }
+        QTabWidget#outputTabs QTabBar::tab:selected {
+            background: #3D5AFE;
+            color: white;
+        }
+        QTabWidget#outputTabs QTabBar::tab:hover:!selected {
+            background: $tab_hover;
+        }
+    """)
+    _cache = {}
+
+    @staticmethod
+    def stylesheet(dark_mode=False):
+        """Foglio di stile completo per il tema, generato alla prima richiesta"""
+        sheet = ThemeStyles._cache.get(dark_mode)
+        if sheet is None:
+            status_rules = "".join(
+                f'StatusIndicator[stato="{status}"] {{ background-color: {background}; '
+                f'color: {color}; border: 1px solid {border}; }}\n'
+                for status, (background, color, border) in ThemeStyles.STATUS_COLORS.items())
+            sheet = ThemeStyles.TEMPLATE.substitute(ThemeStyles.DARK if dark_mode else ThemeStyles.LIGHT,
+                                                    check_icon=ThemeStyles.CHECK_ICON, status_rules=status_rules)
+            ThemeStyles._cache[dark_mode] = sheet
+        return sheet
+
+    @staticmethod
+    def set_state(widget, name, value):
+        """Cambia una proprietà dinamica e aggiorna lo stile del solo widget interessato"""
+        if widget.property(name) == value:
+            return
+        widget.setProperty(name, value)
+        widget.style().unpolish(widget)
+        widget.style().polish(widget)
+
 class ModernButton(QPushButton):
     """Pulsante con design moderno e responsivo"""
     def __init__(self, text, primary=False, icon=None):
@@ -342,58 +3331,8 @@ class ModernButton(QPushButton):
             self.setIcon(QIcon(icon))
             self.setIconSize(QSize(18, 18))
         
-        self.update_style()
-    
-    def update_style(self):
-        """Imposta lo stile basato sul tipo di pulsante"""
-        common_style = """
-            QPushButton {
-                border-radius: 6px;
-                padding: 10px 20px;
-                font-family: 'Segoe UI';
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                transition: background-color 0.3s;
-            }
-            QPushButton:pressed {
-                padding-top: 12px;
-            }
-            QPushButton:disabled {
-                background-color: #DDDDDD;
-                color: #999999;
-                border: none;
-            }
-        """
-        
-        if self.primary:
-            self.setStyleSheet(common_style + """
-                QPushButton {
-                    background-color: #3D5AFE;
-                    color: white;
-                    border: none;
-                }
-                QPushButton:hover {
-                    background-color: #536DFE;
-                }
-                QPushButton:pressed {
-                    background-color: #304FFE;
-                }
-            """)
-        else:
-            self.setStyleSheet(common_style + """
-                QPushButton {
-                    background-color: #FFFFFF;
-                    color: #3D5AFE;
-                    border: 1px solid #3D5AFE;
-                }
-                QPushButton:hover {
-                    background-color: #F5F7FF;
-                }
-                QPushButton:pressed {
-                    background-color: #E8F0FE;
-                }
-            """)
+        # Lo stile è nel foglio di stile dell'applicazione (ThemeStyles), selezionato dalla proprietà
+        self.setProperty("primary", primary)
 
 class OptionCheckBox(QCheckBox):
     """Checkbox per le opzioni di elaborazione con stile moderno"""
@@ -405,27 +3344,6 @@ class OptionCheckBox(QCheckBox):
         # Imposta il font
         font = QFont("Segoe UI", 10)
         self.setFont(font)
-        
-        # Stile moderno
-        self.setStyleSheet("""
-            QCheckBox {
-                spacing: 8px;
-            }
-            QCheckBox::indicator {
-                width: 20px;
-                height: 20px;
-                border-radius: 4px;
-                border: 2px solid #C0C0C0;
-            }
-            QCheckBox::indicator:unchecked:hover {
-                border: 2px solid #3D5AFE;
-            }
-            QCheckBox::indicator:checked {
-                background-color: #3D5AFE;
-                border: 2px solid #3D5AFE;
-                image: url(data:image/svg+xml;base64,PHN2ZyB4bWxucz0iaHR0cDovL3d3dy53My5vcmcvMjAwMC9zdmciIHdpZHRoPSIxNiIgaGVpZ2h0PSIxNiIgdmlld0JveD0iMCAwIDI0IDI0IiBmaWxsPSJub25lIiBzdHJva2U9IiNGRkZGRkYiIHN0cm9rZS13aWR0aD0iMyIgc3Ryb2tlLWxpbmVjYXA9InJvdW5kIiBzdHJva2UtbGluZWpvaW49InJvdW5kIiBjbGFzcz0ibHVjaWRlIGx1Y2lkZS1jaGVjayI+PHBhdGggZD0iTTIwIDZMOSAxN2wtNS01Ii8+PC9zdmc+);
-            }
-        """)
 
 class ModernProgressBar(QProgressBar):
     """Barra di progresso con stile moderno"""
@@ -434,138 +3352,51 @@ class ModernProgressBar(QProgressBar):
         self.setTextVisible(False)
         self.setMaximumHeight(6)
         self.setMinimumHeight(6)
-        
-        self.setStyleSheet("""
-            QProgressBar {
-                border: none;
-                background-color: #F0F0F0;
-                border-radius: 3px;
-            }
-            QProgressBar::chunk {
-                background-color: #3D5AFE;
-                border-radius: 3px;
-            }
-        """)
 
 class ModernTextEdit(QTextEdit):
     """Text edit con stile moderno e migliorato per la leggibilità"""
-    def __init__(self, placeholder="", dark_mode=False):
+    def __init__(self, placeholder=""):
         super().__init__()
         self.setPlaceholderText(placeholder)
         
-        # Imposta il font
+        # Imposta il font (colori e bordi vengono dal tema dell'applicazione)
         font = QFont("Segoe UI", 11)
         self.setFont(font)
-        
-        # Imposta lo stile di base
-        self.update_style(dark_mode)
-    
-    def update_style(self, dark_mode=False):
-        """Aggiorna lo stile in base al tema"""
-        if dark_mode:
-            self.setStyleSheet("""
-                QTextEdit {
-                    background-color: #2D2D30;
-                    color: #FFFFFF;
-                    border: 1px solid #3F3F46;
-                    border-radius: 6px;
-                    padding: 12px;
-                    selection-background-color: #3D5AFE;
-                    selection-color: white;
-                }
-                QScrollBar:vertical {
-                    border: none;
-                    background: #3F3F46;
-                    width: 10px;
-                    border-radius: 5px;
-                    margin: 0px;
-                }
-                QScrollBar::handle:vertical {
-                    background: #686868;
-                    border-radius: 5px;
-                    min-height: 20px;
-                }
-                QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {
-                    border: none;
-                    background: none;
-                    height: 0px;
-                }
-            """)
-        else:
-            self.setStyleSheet("""
-                QTextEdit {
-                    background-color: #FFFFFF;
-                    color: #333333;
-                    border: 1px solid #E0E0E0;
-                    border-radius: 6px;
-                    padding: 12px;
-                    selection-background-color: #3D5AFE;
-                    selection-color: white;
-                }
-                QScrollBar:vertical {
-                    border: none;
-                    background: #F5F5F5;
-                    width: 10px;
-                    border-radius: 5px;
-                    margin: 0px;
-                }
-                QScrollBar::handle:vertical {
-                    background: #CCCCCC;
-                    border-radius: 5px;
-                    min-height: 20px;
-                }
-                QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {
-                    border: none;
-                    background: none;
-                    height: 0px;
-                }
-            """)
 
 class DropTextEdit(ModernTextEdit):
     """Area di testo che accetta drag & drop di file"""
     textDropped = pyqtSignal(str)
     fileDropped = pyqtSignal(str)
     
-    def __init__(self, dark_mode=False):
-        super().__init__("Trascina qui i file (txt, docx, pdf) o incolla il testo...", dark_mode)
+    def __init__(self):
+        super().__init__("Trascina qui i file (txt, docx, pdf) o incolla il testo...")
         self.setAcceptDrops(True)
-        
-        # Migliora l'aspetto per area di drop
-        drop_style = """
-            QTextEdit {
-                border: 2px dashed #CCCCCC;
-            }
-        """
-        self.setStyleSheet(self.styleSheet() + drop_style)
+        # Bordo tratteggiato dell'area di drop, evidenziato durante il drag (vedi ThemeStyles)
+        self.setProperty("dragHover", False)
     
     def dragEnterEvent(self, event: QDragEnterEvent):
         if event.mimeData().hasUrls() or event.mimeData().hasText():
             # Cambia stile durante il drag
-            self.setStyleSheet(self.styleSheet().replace("2px dashed #CCCCCC", "2px dashed #3D5AFE"))
+            ThemeStyles.set_state(self, "dragHover", True)
             event.acceptProposedAction()
     
     def dragLeaveEvent(self, event):
         # Ripristina stile originale quando il drag esce
-        self.setStyleSheet(self.styleSheet().replace("2px dashed #3D5AFE", "2px dashed #CCCCCC"))
+        ThemeStyles.set_state(self, "dragHover", False)
         super().dragLeaveEvent(event)
     
     def dropEvent(self, event: QDropEvent):
         mime_data = event.mimeData()
         
         # Ripristina stile originale
-        self.setStyleSheet(self.styleSheet().replace("2px dashed #3D5AFE", "2px dashed #CCCCCC"))
+        ThemeStyles.set_state(self, "dragHover", False)
         
         if mime_data.hasUrls():
             for url in mime_data.urls():
                 file_path = url.toLocalFile()
                 if file_path:
+                    # Il caricamento (estrazione, OCR, file grandi) è gestito dalla finestra principale
                     self.fileDropped.emit(file_path)
-                    try:
-                        text = TextProcessor.extract_text_from_file(file_path)
-                        self.textDropped.emit(text)
-                        self.setPlainText(text)
-                    except Exception as e:
-                        QMessageBox.critical(self, "Errore", f"Impossibile leggere il file: {str(e)}")
         
         elif mime_data.hasText():
             self.setPlainText(mime_data.text())
@@ -573,48 +3404,18 @@ class DropTextEdit(ModernTextEdit):
 
 class ModernLineEdit(QLineEdit):
     """Campo di testo con stile moderno"""
-    def __init__(self, placeholder="", dark_mode=False):
+    def __init__(self, placeholder=""):
         super().__init__()
         self.setPlaceholderText(placeholder)
         
-        # Imposta il font
+        # Imposta il font (colori e bordi vengono dal tema dell'applicazione)
         font = QFont("Segoe UI", 11)
         self.setFont(font)
         self.setMinimumHeight(40)
-        
-        # Imposta lo stile di base
-        self.update_style(dark_mode)
-    
-    def update_style(self, dark_mode=False):
-        """Aggiorna lo stile in base al tema"""
-        if dark_mode:
-            self.setStyleSheet("""
-                QLineEdit {
-                    background-color: #2D2D30;
-                    color: #FFFFFF;
-                    border: 1px solid #3F3F46;
-                    border-radius: 6px;
-                    padding: 8px 12px;
-                    selection-background-color: #3D5AFE;
-                    selection-color: white;
-                }
-            """)
-        else:
-            self.setStyleSheet("""
-                QLineEdit {
-                    background-color: #FFFFFF;
-                    color: #333333;
-                    border: 1px solid #E0E0E0;
-                    border-radius: 6px;
-                    padding: 8px 12px;
-                    selection-background-color: #3D5AFE;
-                    selection-color: white;
-                }
-            """)
 
 class ModernCard(QFrame):
     """Card con stile moderno ed effetto di elevazione"""
-    def __init__(self, title="", dark_mode=False):
+    def __init__(self, title=""):
         super().__init__()
         
         # Titolo della card
@@ -631,33 +3432,7 @@ class ModernCard(QFrame):
             title_label.setFont(QFont("Segoe UI", 14, QFont.Weight.DemiBold))
             self.layout.addWidget(title_label)
         
-        # Applica stile
-        self.update_style(dark_mode)
-    
-    def update_style(self, dark_mode=False):
-        """Aggiorna lo stile in base al tema"""
-        if dark_mode:
-            self.setStyleSheet("""
-                ModernCard {
-                    background-color: #2D2D30;
-                    border: 1px solid #3F3F46;
-                    border-radius: 8px;
-                }
-                QLabel {
-                    color: #FFFFFF;
-                }
-            """)
-        else:
-            self.setStyleSheet("""
-                ModernCard {
-                    background-color: #FFFFFF;
-                    border: 1px solid #E0E0E0;
-                    border-radius: 8px;
-                }
-                QLabel {
-                    color: #333333;
-                }
-            """)
+        # Colori e bordi vengono dal tema dell'applicazione (ThemeStyles)
         
         # Applica effetto ombra
         shadow = QGraphicsDropShadowEffect()
@@ -679,53 +3454,9 @@ class StatusIndicator(QLabel):
     
     def update_style(self, status_type="info"):
         """Aggiorna lo stile in base al tipo di stato"""
-        base_style = """
-            QLabel {
-                border-radius: 14px;
-                padding: 2px 16px;
-            }
-        """
-        
-        if status_type == "success":
-            self.setStyleSheet(base_style + """
-                QLabel {
-                    background-color: #E8F5E9;
-                    color: #2E7D32;
-                    border: 1px solid #C8E6C9;
-                }
-            """)
-        elif status_type == "error":
-            self.setStyleSheet(base_style + """
-                QLabel {
-                    background-color: #FFEBEE;
-                    color: #C62828;
-                    border: 1px solid #FFCDD2;
-                }
-            """)
-        elif status_type == "warning":
-            self.setStyleSheet(base_style + """
-                QLabel {
-                    background-color: #FFF8E1;
-                    color: #F57F17;
-                    border: 1px solid #FFECB3;
-                }
-            """)
-        elif status_type == "info":
-            self.setStyleSheet(base_style + """
-                QLabel {
-                    background-color: #E1F5FE;
-                    color: #0277BD;
-                    border: 1px solid #B3E5FC;
-                }
-            """)
-        else:  # default/neutral
-            self.setStyleSheet(base_style + """
-                QLabel {
-                    background-color: #F5F5F5;
-                    color: #616161;
-                    border: 1px solid #E0E0E0;
-                }
-            """)
+        if status_type not in ThemeStyles.STATUS_COLORS:
+            status_type = "neutral"
+        ThemeStyles.set_state(self, "stato", status_type)
         
         # Anima il cambio di stato
         animation = QPropertyAnimation(self, b"geometry")
@@ -735,18 +3466,135 @@ class StatusIndicator(QLabel):
         animation.setEndValue(current_geometry)
         animation.start()
 
+class BlockOffsets:
+    """Posizione di ogni blocco nel testo di una tab, aggiornabile quando un blocco cambia lunghezza.
+
+    Albero di Fenwick sulle lunghezze dei blocchi (separatore compreso): inizio di un blocco, nuova
+    lunghezza di un blocco e ricerca del blocco in una posizione costano O(log n), qualunque sia la
+    lunghezza del testo. Le lunghezze sono in unità UTF-16, come le posizioni di QTextCursor.
+    """
+
+    def __init__(self, lengths):
+        self._lengths = array('q', lengths)
+        size = len(self._lengths)
+        tree = array('q', [0]) * (size + 1)
+        for i, length in enumerate(self._lengths, 1):
+            tree[i] += length
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def __len__(self):
+        return len(self._lengths)
+
+    @staticmethod
+    def text_length(text):
+        return len(text.encode('utf-16-le', errors='surrogatepass')) // 2
+
+    def length(self, index):
+        return self._lengths[index]
+
+    def start(self, index):
+        position = 0
+        while index > 0:
+            position += self._tree[index]
+            index -= index & -index
+        return position
+
+    def resize(self, index, length):
+        delta = length - self._lengths[index]
+        self._lengths[index] = length
+        index += 1
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def index_at(self, position):
+        """Indice del blocco che contiene la posizione"""
+        size = len(self._lengths)
+        index = 0
+        step = 1 << size.bit_length()
+        while step:
+            if index + step <= size and self._tree[index + step] <= position:
+                index += step
+                position -= self._tree[index]
+            step >>= 1
+        return min(index, size - 1)
+
 class MainWindow(QMainWindow):
     """Finestra principale dell'applicazione"""
+    # Attesa dopo l'ultima modifica del testo prima della preparazione speculativa
+    PREPARATION_DELAY_MS = 600
+    # Caratteri inseriti per volta quando i risultati sono scritti nelle tab
+    FILL_CHUNK_CHARS = 1 << 20
+    # Testo mostrato al posto dei blocchi non ancora elaborati
+    PENDING_PLACEHOLDER = "[in elaborazione…]"
+    
     def __init__(self):
         super().__init__()
         
         self.text_blocks = []
+        # Blocchi letti a flusso dal disco quando è aperto un file di testo molto grande
+        self.large_file_blocks = None
+        # Estrazione di un PDF in corso in background e pagine OCR già mostrate nell'editor
+        self.loading_pdf = False
+        self.ocr_partial_pages = 0
         self.processed_results = {}
+        # Blocchi e risultati dell'ultima elaborazione, per inviare di nuovo solo i blocchi modificati
+        self.last_document = None
+        self.block_results = {}
+        # Testi dei risultati della sessione, su disco con in memoria solo i più recenti
+        self.result_store = ResultStore()
+        # Preparazione speculativa: testo già diviso in blocchi mentre l'utente lo legge o lo modifica
+        self.prepared_text = None
+        self.prepared_document = None
+        self.preparation_thread = None
+        self.preparation_pending = False
+        # Thread di caricamento dei file e di esportazione, attesi alla chiusura della finestra
+        self.load_thread = None
+        self.large_file_thread = None
+        self.export_thread = None
+        self.preparation_timer = QTimer(self)
+        self.preparation_timer.setSingleShot(True)
+        self.preparation_timer.setInterval(self.PREPARATION_DELAY_MS)
+        self.preparation_timer.timeout.connect(self.start_preparation)
         self.dark_mode = False
         self.original_filename = ""
         self.prompts = default_prompts.copy()
+        self.routing = {option: dict(route) for option, route in default_routing.items()}
+        self.settings = default_settings.copy()
+        self.ocr_cache = None
+        self.update_ocr_cache()
+        self.extraction_cache = None
+        self.update_extraction_cache()
+        self.ocr_service = None
+        self.update_ocr_service()
+        
+        # Avanzamento aggiornato dai worker e letto dall'interfaccia a intervalli regolari
+        self.progress_tracker = ProgressTracker()
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setInterval(250)
+        self.progress_timer.timeout.connect(self.refresh_progress)
+        self.processing_options = []
+        self.api_thread = None
+        # Risultati parziali mostrati nelle tab, per modalità: (BlockOffsets, blocchi già mostrati con il
+        # risultato), oppure False quando la tab mostra già i risultati completi
+        self.partial_views = {}
+        
+        # Controllo periodico dei lavori batch, anche di quelli inviati in sessioni precedenti
+        self.batch_submit_thread = None
+        self.batch_poll_thread = None
+        self.batch_timer = QTimer(self)
+        self.batch_timer.setInterval(self.settings["batch_intervallo_s"] * 1000)
+        self.batch_timer.timeout.connect(self.check_batches)
         
         self.initUI()
+        self.update_theme()
+        
+        if BatchManager.pending_jobs():
+            self.batch_timer.start()
+            QTimer.singleShot(0, self.check_batches)
     
     def initUI(self):
         self.setWindowTitle("TextLab Pro")
@@ -773,6 +3621,11 @@ class MainWindow(QMainWindow):
         save_action.triggered.connect(self.save_result)
         file_menu.addAction(save_action)
         
+        export_action = QAction("Esporta Tutti i Risultati...", self)
+        export_action.setShortcut("Ctrl+Shift+S")
+        export_action.triggered.connect(self.export_all_results)
+        file_menu.addAction(export_action)
+        
         # Azioni del menu Vista
         toggle_theme_action = QAction("Modalità Scura", self)
         toggle_theme_action.setCheckable(True)
@@ -784,6 +3637,71 @@ class MainWindow(QMainWindow):
         edit_prompts_action.triggered.connect(self.open_prompt_settings)
         tools_menu.addAction(edit_prompts_action)
         
+        boilerplate_action = QAction("Rimuovi Intestazioni/Piè di Pagina Ripetuti", self)
+        boilerplate_action.setCheckable(True)
+        boilerplate_action.setChecked(self.settings["rimozione_boilerplate"])
+        boilerplate_action.triggered.connect(self.toggle_boilerplate_removal)
+        tools_menu.addAction(boilerplate_action)
+        
+        cleanup_action = QAction("Ripulisci il Testo dei PDF", self)
+        cleanup_action.setCheckable(True)
+        cleanup_action.setChecked(self.settings["pulizia_testo"])
+        cleanup_action.triggered.connect(self.toggle_text_cleanup)
+        tools_menu.addAction(cleanup_action)
+        
+        ocr_cache_action = QAction("Cache OCR su Disco", self)
+        ocr_cache_action.setCheckable(True)
+        ocr_cache_action.setChecked(self.settings["cache_ocr"])
+        ocr_cache_action.triggered.connect(self.toggle_ocr_cache)
+        tools_menu.addAction(ocr_cache_action)
+        
+        extraction_cache_action = QAction("Cache Documenti Aperti", self)
+        extraction_cache_action.setCheckable(True)
+        extraction_cache_action.setChecked(self.settings["cache_estrazione"])
+        extraction_cache_action.triggered.connect(self.toggle_extraction_cache)
+        tools_menu.addAction(extraction_cache_action)
+        
+        batch_action = QAction("Elabora come Batch (Asincrono)", self)
+        batch_action.triggered.connect(self.process_text_batch)
+        tools_menu.addAction(batch_action)
+        
+        check_batch_action = QAction("Controlla Batch in Corso", self)
+        check_batch_action.triggered.connect(self.check_batches)
+        tools_menu.addAction(check_batch_action)
+        
+        ocr_service_action = QAction("OCR in Processo Separato", self)
+        ocr_service_action.setCheckable(True)
+        ocr_service_action.setChecked(self.settings["ocr_processo_separato"])
+        ocr_service_action.triggered.connect(self.toggle_ocr_service)
+        tools_menu.addAction(ocr_service_action)
+        
+        hedging_action = QAction("Duplica le Richieste Più Lente", self)
+        hedging_action.setCheckable(True)
+        hedging_action.setChecked(self.settings["richieste_ridondanti"])
+        hedging_action.triggered.connect(self.toggle_hedging)
+        tools_menu.addAction(hedging_action)
+        
+        tracing_action = QAction("Tracciamento Pipeline", self)
+        tracing_action.setCheckable(True)
+        tracing_action.triggered.connect(self.toggle_tracing)
+        tools_menu.addAction(tracing_action)
+        
+        export_trace_action = QAction("Esporta Traccia...", self)
+        export_trace_action.triggered.connect(self.export_trace)
+        tools_menu.addAction(export_trace_action)
+        
+        # Sottomenu per il compromesso qualità/velocità dell'OCR
+        ocr_menu = tools_menu.addMenu("Qualità OCR")
+        ocr_preset_group = QActionGroup(self)
+        ocr_preset_group.setExclusive(True)
+        for preset_key, preset_label in (("veloce", "Veloce"), ("bilanciato", "Bilanciata"), ("qualita", "Massima qualità")):
+            preset_action = QAction(preset_label, self)
+            preset_action.setCheckable(True)
+            preset_action.setChecked(self.settings["ocr_preset"] == preset_key)
+            preset_action.triggered.connect(partial(self.set_ocr_preset, preset_key))
+            ocr_preset_group.addAction(preset_action)
+            ocr_menu.addAction(preset_action)
+        
         # Widget principale
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -880,6 +3798,7 @@ class MainWindow(QMainWindow):
         self.input_text = DropTextEdit()
         self.input_text.textDropped.connect(self.on_text_dropped)
         self.input_text.fileDropped.connect(self.on_file_dropped)
+        self.input_text.textChanged.connect(self.schedule_preparation)
         input_card.layout.addWidget(self.input_text)
         
         # Card di output con TabWidget per mostrare risultati multipli
@@ -887,30 +3806,11 @@ class MainWindow(QMainWindow):
         self.output_tabs = QTabWidget()
         self.output_tabs.setTabPosition(QTabWidget.TabPosition.North)
         self.output_tabs.setDocumentMode(True)
+        # La tab visibile riceve per prima i blocchi durante l'elaborazione
+        self.output_tabs.currentChanged.connect(self.update_processing_focus)
         
-        # Stile per i tab
-        self.output_tabs.setStyleSheet("""
-            QTabWidget::pane {
-                border: none;
-                background: transparent;
-            }
-            QTabBar::tab {
-                background: #F5F5F5;
-                border: 1px solid #E0E0E0;
-                border-bottom: none;
-                border-top-left-radius: 4px;
-                border-top-right-radius: 4px;
-                padding: 8px 12px;
-                margin-right: 2px;
-            }
-            QTabBar::tab:selected {
-                background: #3D5AFE;
-                color: white;
-            }
-            QTabBar::tab:hover:!selected {
-                background: #E8F0FE;
-            }
-        """)
+        # Stile dei tab nel foglio di stile dell'applicazione
+        self.output_tabs.setObjectName("outputTabs")
         
         # Tab predefinito
         default_tab = QWidget()
@@ -950,11 +3850,138 @@ class MainWindow(QMainWindow):
     
     def open_prompt_settings(self):
         """Apre la finestra di dialogo per modificare i prompt"""
-        dialog = PromptSettingsDialog(self.prompts, self)
+        dialog = PromptSettingsDialog(self.prompts, self, self.settings["istruzioni_comuni"], self.routing,
+                                      self.settings["pool_modelli"])
         if dialog.exec():
             self.prompts = dialog.get_updated_prompts()
+            self.routing = dialog.get_updated_routing()
+            self.settings["pool_modelli"] = dialog.get_updated_pools()
+            self.settings["istruzioni_comuni"] = dialog.get_shared_instructions()
             QMessageBox.information(self, "Prompt Aggiornati", "I prompt sono stati aggiornati con successo.")
     
+    def toggle_boilerplate_removal(self, checked):
+        """Attiva o disattiva la rimozione delle righe ripetute tra le pagine"""
+        self.settings["rimozione_boilerplate"] = checked
+    
+    def toggle_text_cleanup(self, checked):
+        """Attiva o disattiva la pulizia del testo estratto dai PDF"""
+        self.settings["pulizia_testo"] = checked
+    
+    def set_ocr_preset(self, preset_key, checked=True):
+        """Imposta il preset qualità/velocità usato per l'OCR"""
+        if checked:
+            self.settings["ocr_preset"] = preset_key
+    
+    def toggle_ocr_cache(self, checked):
+        """Attiva o disattiva la cache su disco delle pagine OCR"""
+        self.settings["cache_ocr"] = checked
+        self.update_ocr_cache()
+    
+    def update_ocr_cache(self):
+        """Crea la cache OCR in base alle impostazioni correnti"""
+        self.ocr_cache = None
+        if self.settings["cache_ocr"]:
+            try:
+                self.ocr_cache = OCRPageCache(os.path.join(app_data_dir, "ocr_cache"),
+                                              max_mb=self.settings["cache_ocr_mb"],
+                                              max_age_days=self.settings["cache_ocr_giorni"])
+            except OSError as e:
+                logger.warning(f"Cache OCR non disponibile: {str(e)}")
+    
+    def toggle_extraction_cache(self, checked):
+        """Attiva o disattiva la cache del testo estratto dai documenti"""
+        self.settings["cache_estrazione"] = checked
+        self.update_extraction_cache()
+    
+    def update_extraction_cache(self):
+        """Crea la cache di estrazione in base alle impostazioni correnti"""
+        self.extraction_cache = None
+        if self.settings["cache_estrazione"]:
+            try:
+                self.extraction_cache = ExtractionCache(max_mb=self.settings["cache_estrazione_mb"],
+                                                        max_age_days=self.settings["cache_estrazione_giorni"])
+            except OSError as e:
+                logger.warning(f"Cache di estrazione non disponibile: {str(e)}")
+    
+    def toggle_ocr_service(self, checked):
+        """Attiva o disattiva l'OCR in processi separati dalla GUI"""
+        self.settings["ocr_processo_separato"] = checked
+        self.update_ocr_service()
+    
+    def update_ocr_service(self):
+        """Crea o chiude il servizio OCR; i processi partono solo alla prima pagina da elaborare"""
+        if self.ocr_service is not None:
+            self.ocr_service.shutdown()
+            self.ocr_service = None
+        if self.settings["ocr_processo_separato"]:
+            self.ocr_service = OCRService(workers=self.settings["ocr_processi"],
+                                          max_pages=self.settings["ocr_pagine_per_processo"])
+    
+    def toggle_hedging(self, checked):
+        """Attiva o disattiva la copia delle richieste oltre il 95° percentile di latenza"""
+        self.settings["richieste_ridondanti"] = checked
+    
+    def toggle_tracing(self, checked):
+        """Avvia (azzerando la traccia precedente) o sospende il tracciamento della pipeline"""
+        if checked:
+            Tracer.start()
+            self.status_indicator.setText("Tracciamento attivo")
+        else:
+            Tracer.stop()
+            self.status_indicator.setText("Tracciamento sospeso")
+        self.status_indicator.update_style("info")
+    
+    def export_trace(self):
+        """Salva la traccia raccolta in JSON, da aprire in chrome://tracing o ui.perfetto.dev"""
+        file_path, _ = QFileDialog.getSaveFileName(self, "Esporta Traccia", "traccia.json",
+                                                   "Chrome trace / Perfetto (*.json)")
+        if not file_path:
+            return
+        try:
+            count = Tracer.export(file_path)
+            self.status_indicator.setText(f"Traccia esportata: {count} eventi")
+            self.status_indicator.update_style("success")
+        except OSError as e:
+            QMessageBox.critical(self, "Errore", f"Impossibile salvare la traccia: {str(e)}")
+    
+    def closeEvent(self, event):
+        """Chiude i processi OCR all'uscita"""
+        self.batch_timer.stop()
+        self.preparation_timer.stop()
+        # Caricamento (anche con l'OCR nei processi separati), esportazione dallo store dei risultati e
+        # lavori batch usano servizio OCR e store: vanno attesi prima di chiuderli, con i segnali
+        # bloccati perché i loro risultati non arrivino a una finestra già chiusa
+        for thread in (self.preparation_thread, self.load_thread, self.large_file_thread, self.export_thread,
+                       self.batch_submit_thread, self.batch_poll_thread):
+            if thread is not None and thread.isRunning():
+                thread.blockSignals(True)
+                thread.wait()
+        if self.api_thread is not None and self.api_thread.isRunning():
+            # Il worker scrive nello store dei risultati: va fermato prima di chiuderlo,
+            # senza che i suoi risultati arrivino poi a una finestra già chiusa
+            worker = self.api_thread.worker
+            worker.result.disconnect()
+            worker.finished.disconnect()
+            worker.cancel()
+            self.api_thread.wait()
+        if self.ocr_service is not None:
+            self.ocr_service.shutdown()
+        self.result_store.close()
+        super().closeEvent(event)
+    
+    def get_extraction_options(self):
+        """Restituisce le opzioni di estrazione in base alle impostazioni correnti"""
+        return {
+            "remove_boilerplate": self.settings["rimozione_boilerplate"],
+            "ocr_preset": self.settings["ocr_preset"],
+            "ocr_cache": self.ocr_cache,
+            "extraction_cache": self.extraction_cache,
+            "progress_tracker": self.progress_tracker,
+            "ocr_service": self.ocr_service,
+            "pdf_workers": self.settings["pdf_processi"],
+            "clean_text": self.settings["pulizia_testo"],
+        }
+    
     def toggle_theme(self, checked):
         """Alterna tra tema chiaro e scuro"""
         self.dark_mode = checked
@@ -979,121 +4006,11 @@ class MainWindow(QMainWindow):
             palette.setColor(QPalette.ColorRole.Link, QColor(42, 130, 218))
             palette.setColor(QPalette.ColorRole.Highlight, QColor(42, 130, 218))
             palette.setColor(QPalette.ColorRole.HighlightedText, QColor(255, 255, 255))
-            
-            # Stile menu
-            self.menuBar().setStyleSheet("""
-                QMenuBar {
-                    background-color: #252525;
-                    color: #FFFFFF;
-                }
-                QMenuBar::item {
-                    background-color: transparent;
-                }
-                QMenuBar::item:selected {
-                    background-color: #3D5AFE;
-                    color: #FFFFFF;
-                }
-                QMenu {
-                    background-color: #2D2D30;
-                    color: #FFFFFF;
-                    border: 1px solid #3F3F46;
-                }
-                QMenu::item:selected {
-                    background-color: #3D5AFE;
-                    color: #FFFFFF;
-                }
-            """)
-            
-            # Stile per i tab in modalità scura
-            self.output_tabs.setStyleSheet("""
-                QTabWidget::pane {
-                    border: none;
-                    background: transparent;
-                }
-                QTabBar::tab {
-                    background: #2D2D30;
-                    border: 1px solid #3F3F46;
-                    border-bottom: none;
-                    border-top-left-radius: 4px;
-                    border-top-right-radius: 4px;
-                    padding: 8px 12px;
-                    margin-right: 2px;
-                    color: #CCCCCC;
-                }
-                QTabBar::tab:selected {
-                    background: #3D5AFE;
-                    color: white;
-                }
-                QTabBar::tab:hover:!selected {
-                    background: #383838;
-                }
-            """)
-        else:
-            # Colori tema chiaro (default)
-            palette = QPalette()
-            
-            # Stile menu
-            self.menuBar().setStyleSheet("""
-                QMenuBar {
-                    background-color: #F5F5F5;
-                    color: #333333;
-                }
-                QMenuBar::item:selected {
-                    background-color: #3D5AFE;
-                    color: #FFFFFF;
-                }
-                QMenu {
-                    background-color: #FFFFFF;
-                    color: #333333;
-                    border: 1px solid #E0E0E0;
-                }
-                QMenu::item:selected {
-                    background-color: #3D5AFE;
-                    color: #FFFFFF;
-                }
-            """)
-            
-            # Stile per i tab in modalità chiara
-            self.output_tabs.setStyleSheet("""
-                QTabWidget::pane {
-                    border: none;
-                    background: transparent;
-                }
-                QTabBar::tab {
-                    background: #F5F5F5;
-                    border: 1px solid #E0E0E0;
-                    border-bottom: none;
-                    border-top-left-radius: 4px;
-                    border-top-right-radius: 4px;
-                    padding: 8px 12px;
-                    margin-right: 2px;
-                }
-                QTabBar::tab:selected {
-                    background: #3D5AFE;
-                    color: white;
-                }
-                QTabBar::tab:hover:!selected {
-                    background: #E8F0FE;
-                }
-            """)
         
-        # Applica la palette
+        # Applica la palette e il foglio di stile del tema (costruito una sola volta per tema):
+        # Qt aggiorna tutti i widget, comprese le tab dei risultati, in un solo passaggio
         QApplication.setPalette(palette)
-        
-        # Aggiorna i componenti con il tema
-        for widget in self.findChildren(ModernCard):
-            widget.update_style(self.dark_mode)
-        
-        self.input_text.update_style(self.dark_mode)
-        
-        # Aggiorna i widget di output in ciascuna tab
-        for i in range(self.output_tabs.count()):
-            tab = self.output_tabs.widget(i)
-            text_edit = tab.findChild(ModernTextEdit)
-            if text_edit:
-                text_edit.update_style(self.dark_mode)
-        
-        self.custom_prompt_edit.update_style(self.dark_mode)
+        QApplication.instance().setStyleSheet(ThemeStyles.stylesheet(self.dark_mode))
     
     def open_file(self):
         """Apre un file tramite dialogo"""
@@ -1115,12 +4032,21 @@ class MainWindow(QMainWindow):
             
             # Controlla se è un PDF per potenziale OCR
             _, ext = os.path.splitext(file_path)
-            if ext.lower() == '.pdf':
+            large_file_threshold = self.settings["soglia_file_grandi_mb"] * 1024 * 1024
+            if ext.lower() == '.txt' and os.path.getsize(file_path) > large_file_threshold:
+                self.load_large_text_file(file_path)
+            
+            elif ext.lower() == '.pdf':
                 # Mostra indicatore di lavoro in corso
                 self.status_indicator.setText("Analisi PDF in corso...")
                 self.status_indicator.update_style("info")
                 self.progress_bar.setVisible(True)
-                self.progress_bar.setRange(0, 0)  # Modalità indeterminata
+                self.progress_bar.setRange(0, 0)  # Modalità indeterminata finché non è noto il numero di pagine
+                self.progress_tracker.reset(ProgressTracker.STAGE_EXTRACTION)
+                self.progress_tracker.reset(ProgressTracker.STAGE_OCR)
+                self.loading_pdf = True
+                self.ocr_partial_pages = 0
+                self.progress_timer.start()
                 
                 # Aggiorna l'interfaccia per mostrare che l'elaborazione è in corso
                 QApplication.processEvents()
@@ -1130,27 +4056,28 @@ class MainWindow(QMainWindow):
                     resultReady = pyqtSignal(str)
                     errorOccurred = pyqtSignal(str)
                     
-                    def __init__(self, file_path):
+                    def __init__(self, file_path, extraction_options):
                         super().__init__()
                         self.file_path = file_path
+                        self.extraction_options = extraction_options
                     
                     def run(self):
                         try:
-                            text = TextProcessor.extract_text_from_file(self.file_path)
+                            text = TextProcessor.extract_text_from_file(self.file_path, **self.extraction_options)
                             self.resultReady.emit(text)
                         except Exception as e:
                             self.errorOccurred.emit(str(e))
                 
                 # Crea e avvia il thread
-                self.load_thread = FileLoadThread(file_path)
+                self.load_thread = FileLoadThread(file_path, self.get_extraction_options())
                 self.load_thread.resultReady.connect(self.on_file_loaded)
                 self.load_thread.errorOccurred.connect(self.on_file_error)
-                self.load_thread.finished.connect(lambda: self.progress_bar.setVisible(False))
+                self.load_thread.finished.connect(self.on_file_load_thread_finished)
                 self.load_thread.start()
                 
             else:
                 # Per altri formati, usa il metodo standard
-                text = TextProcessor.extract_text_from_file(file_path)
+                text = TextProcessor.extract_text_from_file(file_path, **self.get_extraction_options())
                 self.input_text.setPlainText(text)
                 self.on_text_dropped(text)
                 
@@ -1165,16 +4092,65 @@ class MainWindow(QMainWindow):
             self.progress_bar.setVisible(False)
             logger.error(f"Errore caricamento file: {error_msg}")
 
+    def load_large_text_file(self, file_path):
+        """Apre un file di testo molto grande a flusso: l'editor mostra solo un'anteprima"""
+        self.status_indicator.setText("Analisi file di grandi dimensioni...")
+        self.status_indicator.update_style("info")
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setRange(0, 0)  # Modalità indeterminata
+        
+        self.large_file_thread = LargeFileLoadThread(file_path)
+        self.large_file_thread.resultReady.connect(self.on_large_file_loaded)
+        self.large_file_thread.errorOccurred.connect(self.on_file_error)
+        self.large_file_thread.start()
+    
+    def on_large_file_loaded(self, blocks, preview):
+        """Mostra l'anteprima del file grande e abilita l'elaborazione dei blocchi dal disco"""
+        self.input_text.setPlainText(preview)
+        self.input_text.setReadOnly(True)
+        self.input_text.setAcceptDrops(True)
+        self.large_file_blocks = blocks
+        
+        self.progress_bar.setVisible(False)
+        self.process_button.setEnabled(len(blocks) > 0)
+        size_mb = blocks.large_file.size / (1024 * 1024)
+        self.status_indicator.setText(f"File grande ({size_mb:.0f} MB): anteprima, {len(blocks)} blocchi")
+        self.status_indicator.update_style("success")
+    
+    def clear_large_file(self):
+        """Esce dalla modalità file grande e torna al testo modificabile"""
+        if self.large_file_blocks is not None:
+            self.large_file_blocks = None
+            self.input_text.setReadOnly(False)
+            self.input_text.setAcceptDrops(True)
+    
+    def on_file_load_thread_finished(self):
+        """Ferma l'aggiornamento dell'avanzamento al termine del caricamento in background"""
+        self.loading_pdf = False
+        self.input_text.setReadOnly(False)
+        if not self.processing_options:
+            self.progress_timer.stop()
+            self.progress_bar.setVisible(False)
+    
     def on_file_loaded(self, text):
         """Gestisce il completamento del caricamento del file"""
+        # Il testo definitivo (ripulito e normalizzato) sostituisce le pagine OCR mostrate finora
+        self.loading_pdf = False
+        self.progress_tracker.take_partials(ProgressTracker.STAGE_OCR)
+        self.input_text.setReadOnly(False)
         self.input_text.setPlainText(text)
         self.on_text_dropped(text)
-        self.progress_bar.setVisible(False)
+        if not self.processing_options:
+            self.progress_bar.setVisible(False)
         self.status_indicator.setText("File caricato con successo")
         self.status_indicator.update_style("success")
 
     def on_file_error(self, error_msg):
         """Gestisce gli errori durante il caricamento del file"""
+        # Le pagine OCR già pronte restano nell'editor e tornano modificabili
+        self.append_ocr_pages()
+        self.loading_pdf = False
+        self.input_text.setReadOnly(False)
         QMessageBox.critical(self, "Errore", f"Impossibile leggere il file: {error_msg}")
         self.status_indicator.setText("Errore caricamento file")
         self.status_indicator.update_style("error")
@@ -1183,23 +4159,85 @@ class MainWindow(QMainWindow):
     
     def on_file_dropped(self, file_path):
         """Gestisce il file trascinato"""
-        self.original_filename = os.path.basename(file_path)
-        self.file_info_label.setText(f"File: {self.original_filename}")
+        self.process_file(file_path)
     
     def on_text_dropped(self, text):
         """Gestisce il testo caricato o incollato senza dividerlo in blocchi immediatamente"""
+        self.clear_large_file()
+        
         # Verifichiamo solo se c'è del testo valido per abilitare il pulsante
         if text and len(text.strip()) > 0:
-            self.process_button.setEnabled(True)
             word_count = len(re.findall(r'\w+', text))
             
             self.status_indicator.setText(f"Testo caricato, {word_count} parole")
             self.status_indicator.update_style("info")
+            if self.processing_options:
+                # Elaborazione in corso (ad esempio sulle pagine OCR parziali): pulsante e preparazione
+                # tornano disponibili in processing_finished
+                return
+            self.process_button.setEnabled(True)
+            self.start_preparation()
         else:
             self.process_button.setEnabled(False)
             self.status_indicator.setText("Nessun testo valido")
             self.status_indicator.update_style("warning")
     
+    def schedule_preparation(self):
+        """Prepara il testo poco dopo l'ultima modifica (le modifiche ravvicinate riavviano l'attesa)"""
+        if self.large_file_blocks is None and not self.loading_pdf:
+            self.preparation_timer.start()
+    
+    def start_preparation(self):
+        """Avvia in background la divisione in blocchi del testo corrente e l'apertura della connessione"""
+        self.preparation_timer.stop()
+        if self.large_file_blocks is not None or self.loading_pdf:
+            return
+        if self.preparation_thread is not None and self.preparation_thread.isRunning():
+            # Una preparazione alla volta: la successiva parte al termine con il testo più recente
+            self.preparation_pending = True
+            return
+        text = self.input_text.toPlainText()
+        if not text.strip() or text == self.prepared_text:
+            return
+        
+        self.preparation_thread = PreparationThread(text, self.last_document)
+        self.preparation_thread.prepared.connect(self.on_text_prepared)
+        self.preparation_thread.finished.connect(self.on_preparation_finished)
+        self.preparation_thread.start()
+    
+    def on_preparation_finished(self):
+        if self.preparation_pending:
+            self.preparation_pending = False
+            self.start_preparation()
+    
+    def on_text_prepared(self, text, document):
+        """Conserva il documento preparato e indica quanti blocchi hanno già un risultato"""
+        self.prepared_text = text
+        self.prepared_document = document
+        if self.processing_options or self.loading_pdf or self.large_file_blocks is not None:
+            return
+        
+        self.process_button.setEnabled(len(document) > 0)
+        selected_options = self.get_selected_options()
+        reused = self.count_reusable_results(document, selected_options)
+        status = f"Testo pronto, {len(document)} blocchi"
+        if reused:
+            status += f" · {reused} risultati già disponibili su {len(document) * len(selected_options)}"
+        self.status_indicator.setText(status)
+        self.status_indicator.update_style("info")
+    
+    def count_reusable_results(self, document, selected_options):
+        """Risultati dell'ultima elaborazione riutilizzabili per il documento e le modalità indicate"""
+        if not self.block_results:
+            return 0
+        block_keys = set(document.block_hashes())
+        router = ModelRouter(self.routing, self.settings["pool_modelli"])
+        return sum(len(block_keys & results.keys())
+                   for option, (signature, results) in self.block_results.items()
+                   if option in selected_options and signature == APIWorker.request_signature(
+                       self.prompts.get(option, "Elabora il testo"), self.settings["istruzioni_comuni"],
+                       router.route(option)))
+    
     def get_selected_options(self):
         """Ottiene le opzioni selezionate dall'utente"""
         selected_options = []
@@ -1233,15 +4271,48 @@ class MainWindow(QMainWindow):
             tab_layout.setContentsMargins(0, 0, 0, 0)
             
             # Crea un text edit per mostrare il risultato
-            text_edit = ModernTextEdit("Elaborazione in corso...", self.dark_mode)
+            text_edit = ModernTextEdit("Elaborazione in corso...")
             tab_layout.addWidget(text_edit)
             
             # Aggiungi la tab con nome capitalizzato
             display_name = option.capitalize()
             self.output_tabs.addTab(tab, display_name)
     
+    def prepare_text_blocks(self):
+        """Prepara i blocchi da elaborare; restituisce False e avvisa l'utente se non ce ne sono"""
+        if self.large_file_blocks is not None:
+            # File grande: i blocchi vengono letti dal disco direttamente dal worker
+            self.text_blocks = self.large_file_blocks
+        else:
+            # Ottieni il testo attuale dall'area di editing
+            current_text = self.input_text.toPlainText()
+            
+            # Verifica se c'è del testo da elaborare
+            if not current_text or not current_text.strip():
+                QMessageBox.warning(self, "Attenzione", "Nessun testo da elaborare.")
+                return False
+            
+            # Dividi il testo in blocchi mantenendo quelli dell'ultima elaborazione dove il testo non è cambiato,
+            # così dopo una modifica vengono inviati di nuovo solo i blocchi interessati.
+            # Il Document normalizza il testo una volta e viene condiviso da worker, tab ed esportazione;
+            # di solito è già pronto dalla preparazione speculativa
+            self.preparation_timer.stop()
+            if current_text == self.prepared_text:
+                self.text_blocks = self.prepared_document
+            else:
+                self.text_blocks = Document.from_text(current_text, previous=self.last_document)
+        
+        if not self.text_blocks:
+            QMessageBox.warning(self, "Attenzione", "Impossibile dividere il testo in blocchi validi.")
+            return False
+        return True
+    
     def process_text(self):
         """Elabora il testo corrente in base alle opzioni selezionate"""
+        if self.api_thread is not None and self.api_thread.isRunning():
+            # Un'elaborazione alla volta: il worker in corso scrive ancora nelle tab e nello store
+            return
+        
         # Ottieni le opzioni selezionate
         selected_options = self.get_selected_options()
         
@@ -1249,19 +4320,7 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Attenzione", "Seleziona almeno una modalità di elaborazione.")
             return
         
-        # Ottieni il testo attuale dall'area di editing
-        current_text = self.input_text.toPlainText()
-        
-        # Verifica se c'è del testo da elaborare
-        if not current_text or not current_text.strip():
-            QMessageBox.warning(self, "Attenzione", "Nessun testo da elaborare.")
-            return
-        
-        # Dividi il testo in blocchi
-        self.text_blocks = TextProcessor.split_into_blocks(current_text)
-        
-        if not self.text_blocks:
-            QMessageBox.warning(self, "Attenzione", "Impossibile dividere il testo in blocchi validi.")
+        if not self.prepare_text_blocks():
             return
         
         # Crea le tab per i risultati
@@ -1271,51 +4330,312 @@ class MainWindow(QMainWindow):
         block_count = len(self.text_blocks)
         options_count = len(selected_options)
         self.status_indicator.setText(f"Elaborazione di {block_count} blocchi con {options_count} modalità")
+        if self.large_file_blocks is None and self.block_results:
+            reused = self.count_reusable_results(self.text_blocks, selected_options)
+            logger.info(f"Elaborazione incrementale: {reused} risultati riutilizzati su "
+                        f"{block_count * options_count}")
         
         # Configura l'interfaccia per l'elaborazione
         self.process_button.setEnabled(False)
         self.progress_bar.setVisible(True)
         total_tasks = len(self.text_blocks) * len(selected_options)
-        self.progress_bar.setMaximum(total_tasks)
+        self.progress_bar.setRange(0, total_tasks)
         self.progress_bar.setValue(0)
         
         self.status_indicator.setText("Elaborazione in corso...")
         self.status_indicator.update_style("info")
         
+        self.processing_options = selected_options
+        self.partial_views = {}
+        self.progress_tracker.reset(ProgressTracker.STAGE_API)
+        self.progress_timer.start()
+        
         # Crea e avvia il thread per le chiamate API
-        self.api_thread = APIThread(self.text_blocks, selected_options, self.prompts)
-        self.api_thread.worker.progress.connect(self.update_progress)
+        self.api_thread = APIThread(self.text_blocks, selected_options, self.prompts, self.settings,
+                                    self.progress_tracker, self.block_results, self.routing, self.result_store)
         self.api_thread.worker.result.connect(self.display_results)
         self.api_thread.worker.finished.connect(self.processing_finished)
+        self.update_processing_focus()
         self.api_thread.start()
     
-    def update_progress(self, value):
-        """Aggiorna la barra di progresso"""
-        self.progress_bar.setValue(value)
-        total_tasks = len(self.text_blocks) * len(self.get_selected_options())
-        self.status_indicator.setText(f"Elaborazione: {value}/{total_tasks}")
+    def process_text_batch(self):
+        """Invia i blocchi come batch asincrono, per elaborazioni grandi che non richiedono attesa"""
+        selected_options = self.get_selected_options()
+        if not selected_options:
+            QMessageBox.warning(self, "Attenzione", "Seleziona almeno una modalità di elaborazione.")
+            return
+        if not self.prepare_text_blocks():
+            return
+        
+        self.status_indicator.setText("Invio del batch in corso...")
+        self.status_indicator.update_style("info")
+        self.batch_submit_thread = BatchSubmitThread(self.text_blocks, selected_options, self.prompts, self.routing,
+                                                     self.settings, self.original_filename)
+        self.batch_submit_thread.submitted.connect(self.on_batch_submitted)
+        self.batch_submit_thread.errorOccurred.connect(self.on_batch_error)
+        self.batch_submit_thread.start()
+    
+    def on_batch_submitted(self, job):
+        """Gestisce l'invio riuscito di un batch"""
+        self.status_indicator.setText(f"Batch inviato: {job['richieste']} richieste. "
+                                      f"I risultati saranno mostrati al completamento.")
+        self.status_indicator.update_style("success")
+        self.batch_timer.start()
+    
+    def check_batches(self):
+        """Interroga in background i lavori batch in corso"""
+        if self.batch_poll_thread is not None and self.batch_poll_thread.isRunning():
+            return
+        if self.processing_options:
+            # Elaborazione interattiva in corso: i batch conclusi sono raccolti al prossimo controllo
+            return
+        if not BatchManager.pending_jobs():
+            self.batch_timer.stop()
+            return
+        self.batch_poll_thread = BatchPollThread()
+        self.batch_poll_thread.batchCompleted.connect(self.on_batch_completed)
+        self.batch_poll_thread.errorOccurred.connect(self.on_batch_error)
+        self.batch_poll_thread.start()
+    
+    def on_batch_completed(self, job, results):
+        """Mostra i risultati di un batch concluso come quelli di un'elaborazione normale"""
+        if self.processing_options:
+            # Elaborazione iniziata durante il controllo: i risultati sono salvati nel lavoro
+            # e vengono mostrati al prossimo controllo
+            return
+        self.text_blocks = job["blocchi"]
+        if job.get("file_origine"):
+            self.original_filename = job["file_origine"]
+        self.create_output_tabs(job["modalita"])
+        self.display_results(results)
+        BatchManager.remove(job)
+        
+        errors = sum(1 for blocks in results.values() for block in blocks if block and block.startswith("Errore:"))
+        self.status_indicator.setText(f"Batch completato ({job['stato']})" +
+                                      (f" con {errors} errori" if errors else ""))
+        self.status_indicator.update_style("warning" if errors else "success")
+    
+    def on_batch_error(self, error_msg):
+        """Gestisce gli errori di invio o controllo dei batch"""
+        self.status_indicator.setText(f"Errore batch: {error_msg}")
+        self.status_indicator.update_style("error")
+    
+    def update_processing_focus(self, *args):
+        """Indica allo scheduler la modalità visibile e il blocco in cima alla vista"""
+        if not self.processing_options or self.api_thread is None or not self.api_thread.worker.is_scheduled:
+            return
+        tab_index = self.output_tabs.currentIndex()
+        if not 0 <= tab_index < len(self.processing_options):
+            return
+        option = self.processing_options[tab_index]
+        
+        block_index = 0
+        view = self.partial_views.get(option)
+        text_edit = self.output_tabs.widget(tab_index).findChild(ModernTextEdit)
+        if view and text_edit:
+            position = text_edit.cursorForPosition(QPoint(0, 0)).position()
+            block_index = view[0].index_at(position)
+        self.api_thread.worker.scheduler.set_focus(option, block_index)
+    
+    @Tracer.traced("gui.risultati_parziali")
+    def render_partial_results(self, api):
+        """Mostra nella tab visibile i blocchi già elaborati, senza spostare la posizione di lettura.
+
+        La tab viene scritta per intero solo la prima volta; poi ogni aggiornamento sostituisce il solo
+        segnaposto dei blocchi completati nel frattempo, con un costo che non dipende dalla lunghezza del testo.
+        """
+        worker = self.api_thread.worker
+        tab_index = self.output_tabs.currentIndex()
+        if not 0 <= tab_index < len(self.processing_options) or not worker.is_scheduled:
+            return
+        option = self.processing_options[tab_index]
+        done, _ = api["items"].get(option, (0, 0))
+        view = self.partial_views.get(option)
+        if option == "riassunto" or not done or view is False:
+            return
+        text_edit = self.output_tabs.widget(tab_index).findChild(ModernTextEdit)
+        if not text_edit:
+            return
+        
+        results = worker.results[option]
+        queue = worker.completed_indices[option]
+        scrollbar = text_edit.verticalScrollBar()
+        scroll_value = scrollbar.value()
+        if view is None:
+            # Prima visualizzazione: lo stato di tutti i blocchi viene letto ora, gli avvisi finora sono superati
+            queue.clear()
+            rendered = bytearray(len(results))
+            
+            def parts():
+                for index, result in enumerate(results):
+                    if result is None:
+                        yield self.PENDING_PLACEHOLDER
+                    else:
+                        rendered[index] = 1
+                        yield result
+            
+            lengths = self.fill_text_edit(text_edit, parts())
+            self.partial_views[option] = (BlockOffsets(length + 2 for length in lengths), rendered)
+        else:
+            offsets, rendered = view
+            changed = []
+            while queue:
+                index = queue.popleft()
+                if not rendered[index]:
+                    rendered[index] = 1
+                    changed.append(index)
+            if not changed:
+                return
+            document = text_edit.document()
+            document.setUndoRedoEnabled(False)
+            cursor = QTextCursor(document)
+            for index in changed:
+                result = results[index]
+                start = offsets.start(index)
+                cursor.setPosition(start)
+                cursor.setPosition(start + offsets.length(index) - 2, QTextCursor.MoveMode.KeepAnchor)
+                cursor.insertText(result)
+                offsets.resize(index, BlockOffsets.text_length(result) + 2)
+            document.setUndoRedoEnabled(True)
+        scrollbar.setValue(scroll_value)
+    
+    @classmethod
+    def fill_text_edit(cls, text_edit, parts):
+        """Scrive i testi nella casella separati da una riga vuota, a pezzi di circa FILL_CHUNK_CHARS caratteri.
+
+        I testi sono letti uno alla volta, senza costruire l'intero risultato come un'unica stringa.
+        Restituisce la lunghezza di ciascun testo nella casella (in unità UTF-16, come le posizioni di Qt).
+        """
+        document = text_edit.document()
+        # Senza cronologia di annullamento il documento non conserva una seconda copia del testo
+        document.setUndoRedoEnabled(False)
+        text_edit.clear()
+        cursor = QTextCursor(document)
+        lengths = array('q')
+        chunk = []
+        chunk_chars = 0
+        for part in parts:
+            if lengths:
+                chunk.append("\n\n")
+                chunk_chars += 2
+            lengths.append(BlockOffsets.text_length(part))
+            chunk.append(part)
+            chunk_chars += len(part)
+            if chunk_chars >= cls.FILL_CHUNK_CHARS:
+                cursor.insertText("".join(chunk))
+                chunk = []
+                chunk_chars = 0
+        if chunk:
+            cursor.insertText("".join(chunk))
+        document.setUndoRedoEnabled(True)
+        return lengths
+    
+    @Tracer.traced("gui.avanzamento")
+    def refresh_progress(self):
+        """Aggiorna barra, stato e titoli delle tab dallo snapshot dell'avanzamento.
+
+        Chiamato dal timer e non dai worker: il lavoro sull'interfaccia resta costante
+        qualunque sia la frequenza con cui i worker completano i blocchi.
+        """
+        stages = self.progress_tracker.snapshot()
+        api = stages.get(ProgressTracker.STAGE_API)
+        ocr = stages.get(ProgressTracker.STAGE_OCR)
+        self.append_ocr_pages()
+        
+        if self.processing_options and api:
+            self.render_partial_results(api)
+            self.update_processing_focus()
+            self.progress_bar.setRange(0, api["total"])
+            self.progress_bar.setValue(api["done"])
+            status = (f"Elaborazione: {api['done']}/{api['total']} · "
+                      f"residuo {ProgressTracker.format_eta(api['eta'])}")
+            
+            # Avanzamento per modalità nei titoli delle tab
+            for i, option in enumerate(self.processing_options):
+                done, total = api["items"].get(option, (0, 0))
+                title = f"{option.capitalize()} ({done}/{total})" if done < total else option.capitalize()
+                if self.output_tabs.tabText(i) != title:
+                    self.output_tabs.setTabText(i, title)
+        elif ocr and ocr["total"]:
+            self.progress_bar.setRange(0, ocr["total"])
+            self.progress_bar.setValue(ocr["done"])
+            # Pagina in lavorazione, velocità e tempo residuo
+            current_page = min(ocr["done"] + 1, ocr["total"])
+            rate = f"{ocr['rate']:.2f} pag/s" if ocr["rate"] else "– pag/s"
+            status = (f"OCR: pagina {current_page}/{ocr['total']} · {rate} · "
+                      f"residuo {ProgressTracker.format_eta(ocr['eta'])}")
+        else:
+            return
+        
+        if self.status_indicator.text() != status:
+            self.status_indicator.setText(status)
+        
+        # Dettaglio per fase ed elemento (file, modalità) nel tooltip
+        details = "\n".join(f"{stage} · {item}: {done}/{total}"
+                            for stage, info in stages.items()
+                            for item, (done, total) in info["items"].items())
+        if self.status_indicator.toolTip() != details:
+            self.status_indicator.setToolTip(details)
+    
+    @Tracer.traced("gui.pagine_ocr")
+    def append_ocr_pages(self):
+        """Aggiunge all'editor le pagine OCR pronte, per lavorare sul testo prima della fine dell'OCR.
+
+        Finché l'OCR è in corso l'editor è in sola lettura ma il testo si può già elaborare;
+        al termine viene sostituito dal testo definitivo (righe ripetute rimosse, normalizzato).
+        """
+        pages = self.progress_tracker.take_partials(ProgressTracker.STAGE_OCR)
+        if not pages or not self.loading_pdf:
+            return
+        # Pagine separate da un form feed come nel testo definitivo
+        text = '\n\f'.join(Document.normalize(page_text) for _, page_text in pages)
+        if self.ocr_partial_pages == 0:
+            self.clear_large_file()
+            self.input_text.setReadOnly(True)
+            self.input_text.setPlainText(text)
+        else:
+            cursor = QTextCursor(self.input_text.document())
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            cursor.insertText('\n\f' + text)
+        self.ocr_partial_pages += len(pages)
+        if not self.processing_options and text.strip():
+            self.process_button.setEnabled(True)
     
+    @Tracer.traced("gui.risultati")
     def display_results(self, results):
         """Visualizza i risultati dell'elaborazione in tab separate"""
         self.processed_results = results
+        # I risultati completi sostituiscono quelli parziali mostrati durante l'elaborazione
+        self.partial_views = {option: False for option in results}
         
         # Per ciascuna opzione elaborata
         for i, (option, blocks) in enumerate(results.items()):
-            # Unisci i blocchi elaborati
-            processed_text = "\n\n".join([block for block in blocks if block])
-            
-            # Trova la tab corrispondente e aggiorna il testo
+            # Trova la tab corrispondente e scrive i blocchi elaborati letti dallo store
             tab = self.output_tabs.widget(i)
             if tab:
                 text_edit = tab.findChild(ModernTextEdit)
                 if text_edit:
-                    text_edit.setPlainText(processed_text)
+                    self.fill_text_edit(text_edit, (block for block in blocks if block))
     
     def processing_finished(self):
         """Operazioni da eseguire al termine dell'elaborazione"""
-        self.progress_bar.setVisible(False)
+        self.refresh_progress()
+        self.processing_options = []
+        # Con l'OCR ancora in corso il timer continua a mostrarne l'avanzamento
+        if not self.loading_pdf:
+            self.progress_timer.stop()
+            self.progress_bar.setVisible(False)
         self.process_button.setEnabled(True)
         
+        # Conserva blocchi e risultati per la prossima elaborazione incrementale
+        worker = self.api_thread.worker
+        self.block_results = {**self.block_results, **worker.block_results}
+        self.last_document = self.text_blocks if isinstance(self.text_blocks, Document) else None
+        if self.prepared_document is not self.last_document:
+            # Testo modificato durante l'elaborazione: va preparato rispetto alla nuova divisione
+            self.prepared_text = None
+            self.schedule_preparation()
+        
         # Controlla se ci sono stati errori nell'elaborazione
         errors = 0
         for option, blocks in self.processed_results.items():
@@ -1327,6 +4647,13 @@ class MainWindow(QMainWindow):
         else:
             self.status_indicator.setText(f"Completato con {errors} errori")
             self.status_indicator.update_style("warning")
+        
+        # Token in cache e non in cache, per verificare il risparmio della cache dei prompt
+        if worker.token_usage.requests:
+            usage = worker.token_usage
+            self.status_indicator.setText(f"{self.status_indicator.text()} · "
+                                          f"{usage.cached_ratio:.0%} dei token prompt in cache")
+            self.status_indicator.setToolTip(f"{usage.summary()}\n{worker.hedger.summary()}")
     
     def save_result(self):
         """Salva il risultato dell'elaborazione corrente in un file"""
@@ -1361,10 +4688,7 @@ class MainWindow(QMainWindow):
             try:
                 # Usa codecs per una migliore gestione dell'encoding UTF-8
                 with codecs.open(file_path, 'w', encoding='utf-8', errors='replace') as file:
-                    content = text_edit.toPlainText()
-                    # Assicurati che il contenuto sia valido UTF-8 prima del salvataggio
-                    content = content.encode('utf-8', errors='replace').decode('utf-8')
-                    file.write(content)
+                    file.write(text_edit.toPlainText())
                 
                 self.status_indicator.setText(f"File salvato: {os.path.basename(file_path)}")
                 self.status_indicator.update_style("success")
@@ -1373,6 +4697,54 @@ class MainWindow(QMainWindow):
                 self.status_indicator.setText("Errore salvataggio")
                 self.status_indicator.update_style("error")
 
+    def export_all_results(self):
+        """Esporta in background i risultati di tutte le modalità nel formato scelto"""
+        if not any(self.processed_results.values()):
+            QMessageBox.warning(self, "Attenzione", "Nessun risultato da esportare.")
+            return
+        
+        suggested_name = ""
+        if self.original_filename:
+            name, _ = os.path.splitext(self.original_filename)
+            suggested_name = f"{name}_risultati"
+        
+        filters = {
+            "Documenti di testo, uno per modalità (*.txt)": "txt",
+            "Documenti Word, uno per modalità (*.docx)": "docx",
+            "JSON Lines con blocchi originali e risultati (*.jsonl)": "jsonl",
+            "Archivio ZIP con tutti i formati (*.zip)": "zip",
+        }
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self,
+            "Esporta Tutti i Risultati",
+            suggested_name,
+            ";;".join(filters)
+        )
+        if not file_path:
+            return
+        
+        export_format = filters.get(selected_filter, "txt")
+        self.status_indicator.setText("Esportazione in corso...")
+        self.status_indicator.update_style("info")
+        
+        self.export_thread = ExportThread(dict(self.processed_results), self.text_blocks, file_path, export_format)
+        self.export_thread.exportFinished.connect(self.on_export_finished)
+        self.export_thread.errorOccurred.connect(self.on_export_error)
+        self.export_thread.start()
+    
+    def on_export_finished(self, paths):
+        """Gestisce il completamento dell'esportazione"""
+        names = ", ".join(os.path.basename(path) for path in paths)
+        self.status_indicator.setText(f"Esportati {len(paths)} file")
+        self.status_indicator.setToolTip(names)
+        self.status_indicator.update_style("success")
+    
+    def on_export_error(self, error_msg):
+        """Gestisce gli errori durante l'esportazione"""
+        QMessageBox.critical(self, "Errore", f"Impossibile esportare i risultati: {error_msg}")
+        self.status_indicator.setText("Errore esportazione")
+        self.status_indicator.update_style("error")
+
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
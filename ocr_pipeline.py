@@ -0,0 +1,289 @@
+"""Pipeline OCR di una pagina: rasterizzazione, preparazione dell'immagine, cache e riconoscimento.
+
+Importata dall'applicazione e dai processi OCR di workers.py, che non caricano main.py: qui
+restano solo le dipendenze dell'OCR, senza l'interfaccia né il client OpenAI.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+import zlib
+from contextlib import nullcontext
+
+import numpy as np
+import PyPDF2
+from pdf2image import convert_from_path
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+class OCRPreprocessor:
+    """Preparazione delle pagine per l'OCR: risoluzione adattiva, scala di grigi, binarizzazione e raddrizzamento"""
+    # target_line_px: altezza desiderata delle righe di testo in pixel dopo la rasterizzazione
+    PRESETS = {
+        "veloce": {"target_line_px": 24, "min_dpi": 120, "max_dpi": 200, "binarize": True, "deskew": False},
+        "bilanciato": {"target_line_px": 32, "min_dpi": 150, "max_dpi": 300, "binarize": True, "deskew": True},
+        "qualita": {"target_line_px": 44, "min_dpi": 200, "max_dpi": 400, "binarize": False, "deskew": True},
+    }
+    # Risoluzione della pagina di prova usata per stimare l'altezza del testo
+    PROBE_DPI = 100
+    # Lato massimo della pagina rasterizzata, indipendentemente dal formato
+    MAX_PAGE_SIDE_PX = 5000
+    # Angoli (in gradi) provati per il raddrizzamento
+    MAX_SKEW_ANGLE = 5.0
+    SKEW_STEP = 0.5
+
+    @staticmethod
+    def otsu_threshold(gray):
+        """Soglia di Otsu per un'immagine in scala di grigi (array uint8)"""
+        hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+        total = gray.size
+        weight_bg = np.cumsum(hist)
+        weight_fg = total - weight_bg
+        cum_mean = np.cumsum(hist * np.arange(256))
+        valid = (weight_bg > 0) & (weight_fg > 0)
+        between = np.zeros(256)
+        between[valid] = (cum_mean[-1] * weight_bg[valid] / total - cum_mean[valid]) ** 2 / (
+            weight_bg[valid] * weight_fg[valid])
+        return int(np.argmax(between))
+
+    @staticmethod
+    def estimate_line_height(gray):
+        """Stima l'altezza mediana delle righe di testo (in pixel) dal profilo di proiezione orizzontale"""
+        ink = gray <= OCRPreprocessor.otsu_threshold(gray)
+        rows = ink.mean(axis=1) > 0.01
+        padded = np.concatenate(([False], rows, [False]))
+        edges = np.flatnonzero(padded[1:] != padded[:-1])
+        runs = edges[1::2] - edges[::2]
+        runs = runs[runs >= 3]
+        if len(runs) == 0:
+            return None
+        return float(np.median(runs))
+
+    @staticmethod
+    def estimate_dpi(file_path, total_pages, preset):
+        """Calcola la risoluzione di rasterizzazione dalla dimensione della pagina e del testo"""
+        # Usa una pagina centrale come campione: la prima è spesso una copertina
+        probe_page = total_pages // 2 + 1
+        probe = convert_from_path(file_path, dpi=OCRPreprocessor.PROBE_DPI, first_page=probe_page,
+                                  last_page=probe_page, grayscale=True)[0]
+        line_height = OCRPreprocessor.estimate_line_height(np.asarray(probe))
+
+        if line_height:
+            dpi = OCRPreprocessor.PROBE_DPI * preset["target_line_px"] / line_height
+        else:
+            dpi = preset["max_dpi"]
+        dpi = min(max(dpi, preset["min_dpi"]), preset["max_dpi"])
+
+        # Limita la dimensione in pixel per pagine di grande formato
+        page_inches = max(probe.size) / OCRPreprocessor.PROBE_DPI
+        dpi = min(dpi, OCRPreprocessor.MAX_PAGE_SIDE_PX / page_inches)
+        return int(round(dpi / 10.0) * 10)
+
+    @staticmethod
+    def estimate_skew(ink_img):
+        """Stima l'inclinazione (in gradi) massimizzando la varianza del profilo orizzontale"""
+        # Lavora su una versione ridotta per contenere i tempi
+        scale = min(1.0, 800 / max(ink_img.size))
+        small = ink_img.resize((max(1, int(ink_img.width * scale)), max(1, int(ink_img.height * scale))),
+                               Image.Resampling.NEAREST)
+        best_angle, best_score = 0.0, -1.0
+        for angle in np.arange(-OCRPreprocessor.MAX_SKEW_ANGLE,
+                               OCRPreprocessor.MAX_SKEW_ANGLE + OCRPreprocessor.SKEW_STEP,
+                               OCRPreprocessor.SKEW_STEP):
+            rotated = small.rotate(float(angle), resample=Image.Resampling.NEAREST, fillcolor=0)
+            score = float(np.var(np.asarray(rotated, dtype=np.float32).sum(axis=1)))
+            if score > best_score:
+                best_angle, best_score = float(angle), score
+        return best_angle
+
+    @staticmethod
+    def preprocess(img, preset):
+        """Converte la pagina in un array uint8 in scala di grigi pronto per easyOCR"""
+        gray_img = img.convert('L')
+        gray = np.asarray(gray_img)
+        threshold = OCRPreprocessor.otsu_threshold(gray)
+
+        if preset["deskew"]:
+            ink_img = Image.fromarray(np.where(gray <= threshold, 255, 0).astype(np.uint8))
+            angle = OCRPreprocessor.estimate_skew(ink_img)
+            if abs(angle) >= OCRPreprocessor.SKEW_STEP:
+                gray_img = gray_img.rotate(angle, resample=Image.Resampling.BILINEAR, expand=True, fillcolor=255)
+                gray = np.asarray(gray_img)
+
+        if preset["binarize"]:
+            gray = np.where(gray <= threshold, 0, 255).astype(np.uint8)
+        return gray
+
+
+class DiskCache:
+    """Cache su disco chiave -> testo, con eviction per età e per dimensione totale"""
+    SUFFIX = ".txt"
+
+    def __init__(self, cache_dir, max_mb=200, max_age_days=90):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_age = max_age_days * 24 * 3600
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _encode(self, text):
+        return text.encode('utf-8')
+
+    def _decode(self, data):
+        return data.decode('utf-8')
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}{self.SUFFIX}")
+
+    def get(self, key):
+        """Restituisce il testo in cache o None"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                text = self._decode(f.read())
+            # Aggiorna la data di modifica per l'eviction LRU
+            os.utime(path)
+            return text
+        except (OSError, ValueError, zlib.error):
+            return None
+
+    def put(self, key, text):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(self._encode(text))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Impossibile scrivere nella cache {self.cache_dir}: {str(e)}")
+
+    def prune(self):
+        """Elimina le voci più vecchie di max_age e poi le meno recenti oltre max_bytes"""
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(self.SUFFIX):
+                continue
+            stat = entry.stat()
+            if now - stat.st_mtime > self.max_age:
+                os.remove(entry.path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+
+class OCRPageCache(DiskCache):
+    """Cache su disco del testo OCR di ciascuna pagina.
+
+    La chiave combina l'impronta della pagina (content stream e immagini, oppure i pixel
+    rasterizzati), le lingue e il preset OCR: una nuova revisione del documento riesegue
+    l'OCR solo sulle pagine modificate.
+    """
+    # Da incrementare quando cambia la pipeline OCR, per invalidare le voci esistenti
+    VERSION = 1
+
+    @staticmethod
+    def _hash_xobjects(resources, digest, seen):
+        """Aggiunge all'impronta i dati (non decodificati) delle immagini e dei form della pagina"""
+        if resources is None:
+            return
+        xobjects = resources.get_object().get("/XObject")
+        if xobjects is None:
+            return
+        for name, ref in sorted(xobjects.get_object().items()):
+            obj = ref.get_object()
+            if id(obj) in seen:
+                continue
+            seen.add(id(obj))
+            digest.update(name.encode('utf-8'))
+            data = getattr(obj, "_data", None)
+            digest.update(data if data is not None else obj.get_data())
+            if obj.get("/Subtype") == "/Form":
+                OCRPageCache._hash_xobjects(obj.get("/Resources"), digest, seen)
+
+    @staticmethod
+    def _fingerprint_page(page):
+        digest = hashlib.sha256()
+        digest.update(repr([float(v) for v in page.mediabox]).encode('utf-8'))
+        digest.update(str(page.get("/Rotate", 0)).encode('utf-8'))
+        contents = page.get_contents()
+        if contents is not None:
+            digest.update(contents.get_data())
+        OCRPageCache._hash_xobjects(page.get("/Resources"), digest, set())
+        return digest.hexdigest()
+
+    @staticmethod
+    def page_fingerprints(file_path):
+        """Impronte delle pagine calcolate dal contenuto PDF, senza rasterizzare; None se non leggibile"""
+        try:
+            reader = PyPDF2.PdfReader(file_path)
+            return [OCRPageCache._fingerprint_page(page) for page in reader.pages]
+        except Exception as e:
+            logger.warning(f"Impossibile calcolare le impronte delle pagine: {str(e)}")
+            return None
+
+    @staticmethod
+    def image_fingerprint(img):
+        """Impronta di una pagina già rasterizzata"""
+        digest = hashlib.sha256()
+        digest.update(f"{img.mode}:{img.size}".encode('utf-8'))
+        digest.update(img.tobytes())
+        return digest.hexdigest()
+
+    def make_key(self, fingerprint, languages, preset):
+        settings = json.dumps({"languages": languages, "preset": preset, "version": self.VERSION}, sort_keys=True)
+        return hashlib.sha256(f"{fingerprint}:{settings}".encode('utf-8')).hexdigest()
+
+class PageOCR:
+    """OCR di una singola pagina, nel processo dell'applicazione o in un processo OCR"""
+
+    @staticmethod
+    def _no_span(name, **args):
+        return nullcontext()
+
+    @staticmethod
+    def recognize(job, get_reader, cache=None, span=None):
+        """OCR di una pagina descritta da un lavoro di TextProcessor.ocr_pages.
+
+        get_reader fornisce il lettore easyocr; span (come Tracer.span) registra le fasi nella traccia.
+        """
+        span = span or PageOCR._no_span
+        page_number = job["page_number"]
+        preset = OCRPreprocessor.PRESETS.get(job["preset"], OCRPreprocessor.PRESETS["bilanciato"])
+        logger.info(f"Elaborazione pagina {page_number}/{job['total_pages']}")
+        
+        # Rasterizza una pagina alla volta in scala di grigi per limitare la memoria
+        with span("ocr.rasterizzazione", pagina=page_number, dpi=job["dpi"]):
+            img = convert_from_path(job["file_path"], dpi=job["dpi"], first_page=page_number,
+                                    last_page=page_number, grayscale=True)[0]
+        
+        key = None
+        if cache is None and job.get("cache"):
+            cache = OCRPageCache(*job["cache"])
+        if cache is not None and job.get("cache"):
+            key = cache.make_key(OCRPageCache.image_fingerprint(img), job["languages"], preset)
+            cached_text = cache.get(key)
+            if cached_text is not None:
+                return cached_text
+        
+        img_np = OCRPreprocessor.preprocess(img, preset)
+        
+        # Estrai il testo
+        # detail=0 restituisce solo il testo senza coordinate
+        # paragraph=True raggruppa il testo in paragrafi
+        with span("ocr.riconoscimento", pagina=page_number):
+            results = get_reader().readtext(img_np, detail=0, paragraph=True)
+        
+        # Unisci i risultati (la normalizzazione avviene una volta sul testo completo)
+        page_text = '\n'.join(str(r) for r in results)
+        if key is not None:
+            cache.put(key, page_text)
+        return page_text
@@ -0,0 +1,134 @@
+"""Processi di lavoro di TextLab Pro: estrazione pdfminer per intervalli di pagine e OCR.
+
+Avviati come script (python workers.py pdf | python workers.py ocr <lingue>) da WorkerProcess in main.py.
+I processi avviati da multiprocessing con spawn rieseguono main.py, e con esso PyQt6, il client
+OpenAI ed easyocr/torch: secondi per ogni processo. Da qui ogni processo importa solo ciò che
+gli serve, pdfminer per l'estrazione e la pipeline OCR (ocr_pipeline.py) per l'OCR.
+"""
+import io
+import logging
+import os
+import sys
+from multiprocessing.connection import Listener
+
+from pdfminer.converter import PDFLayoutAnalyzer
+from pdfminer.high_level import extract_text as pdfminer_extract_text
+from pdfminer.layout import LAParams, LTChar, LTContainer
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+
+
+class PlainTextConverter(PDFLayoutAnalyzer):
+    """Testo delle pagine PDF nell'ordine del flusso dei contenuti, senza analisi del layout.
+
+    Nei documenti a colonna singola i caratteri arrivano già nell'ordine di lettura: basta andare a capo
+    quando cambia la linea di base e aggiungere uno spazio dove tra due caratteri c'è un salto orizzontale.
+    """
+    # Salti, in frazioni della dimensione del carattere, oltre i quali si va a capo o si aggiunge uno spazio
+    LINE_JUMP = 0.5
+    WORD_GAP = 0.1
+
+    def __init__(self, rsrcmgr, outfp):
+        super().__init__(rsrcmgr, pageno=1, laparams=None)
+        self.outfp = outfp
+
+    @staticmethod
+    def _chars(container):
+        for item in container:
+            if isinstance(item, LTChar):
+                yield item
+            elif isinstance(item, LTContainer):
+                yield from PlainTextConverter._chars(item)
+
+    def receive_layout(self, ltpage):
+        write = self.outfp.write
+        previous = None
+        previous_text = ""
+        for char in PlainTextConverter._chars(ltpage):
+            text = char.get_text()
+            if previous is not None:
+                size = max(previous.size, 1.0)
+                if abs(char.y0 - previous.y0) > size * PlainTextConverter.LINE_JUMP:
+                    write('\n')
+                elif (char.x0 - previous.x1 > size * PlainTextConverter.WORD_GAP
+                      and text != ' ' and previous_text != ' '):
+                    write(' ')
+            write(text)
+            previous, previous_text = char, text
+        # Come TextConverter: fine pagina con un form feed
+        write('\n\f')
+
+
+def extract_range(file_path, page_numbers, use_layout):
+    """Testo delle pagine indicate (tutte con None), con un form feed dopo ogni pagina"""
+    if use_layout:
+        return pdfminer_extract_text(file_path, page_numbers=page_numbers, laparams=LAParams(), codec='utf-8')
+
+    # extract_text di pdfminer usa LAParams() anche con laparams=None: senza analisi del layout
+    # l'interprete va guidato direttamente
+    output = io.StringIO()
+    resources = PDFResourceManager(caching=True)
+    device = PlainTextConverter(resources, output)
+    interpreter = PDFPageInterpreter(resources, device)
+    with open(file_path, 'rb') as f:
+        for page in PDFPage.get_pages(f, page_numbers, caching=True):
+            interpreter.process_page(page)
+    device.close()
+    return output.getvalue()
+
+
+def serve(handle):
+    """Lato processo del collegamento con WorkerProcess.
+
+    Legge la chiave di autenticazione da stdin, scrive su stdout l'indirizzo a cui collegarsi e poi
+    esegue i lavori ricevuti, (id, dati) -> (id, riuscito, risultato o errore), fino a None o alla chiusura.
+    """
+    authkey = bytes.fromhex(sys.stdin.readline().strip())
+    with Listener(authkey=authkey) as listener:
+        print(listener.address, flush=True)
+        conn = listener.accept()
+    # Da qui stdout non viene più letto: le stampe delle librerie vanno su stderr, senza riempire la pipe
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        job_id, job = message
+        try:
+            conn.send((job_id, True, handle(job)))
+        except Exception as e:
+            conn.send((job_id, False, str(e)))
+
+
+def main(kind, *args):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if kind == "pdf":
+        serve(lambda job: extract_range(job["file_path"], job["page_numbers"], job["use_layout"]))
+    elif kind == "ocr":
+        languages = args[0].split(',')
+        reader = None
+
+        def get_reader():
+            nonlocal reader
+            if reader is None:
+                import easyocr
+                reader = easyocr.Reader(languages, gpu=False)
+            return reader
+
+        def recognize(job):
+            # Solo i processi OCR caricano numpy, easyocr e torch, al primo lavoro: il collegamento
+            # con l'applicazione non li attende
+            from ocr_pipeline import PageOCR
+            return PageOCR.recognize(job, get_reader)
+
+        serve(recognize)
+    else:
+        raise SystemExit(f"Tipo di processo sconosciuto: {kind}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])